@@ -1,25 +1,119 @@
 import bitboard
 import copy
+import multiprocessing
+import os
 import sys
 import random
+import retrograde
+import syzygy
 import time
+import transposition
+from analysis import AnalysisCache
 from bitboard import BitBoard
+from boards import BOARDS, DEFAULT_BOARD
 from collections import defaultdict
-from threading import Thread
-from openings import OpeningTree
+from threading import Event
+from openings import BookLoader
+from profiling import PhaseProfiler, searchProfile
+from transposition import TranspositionTable
+from uci import SearchStopped, UciLoop, UciWriter, parsePosition, optionLine, \
+    parseSetOption, parseCheck, parseSpin, parseCombo, processPool
 
 ENGINE_NAME = "ALPHA_BETA"
 STARTING_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
 TEST_FEN = "8/1b6/p5R1/1p1kp3/3npq2/Q7/PP5P/5rNK w - - 6 38"
 ALIREZA = "../../books/lichess_alireza.alg"
+# Book moves are only played this many plies into the game.
+BOOK_PLIES = 12
+# Syzygy tables (see syzygy.py), also the SyzygyPath option. Positions with
+# syzygy.MAX_PIECES or fewer pieces are scored from the tables instead of
+# searched, and at the root only the moves keeping the best result are played.
+SYZYGY_PATH = "../../books/syzygy"
+# Tables built by retrograde.py, also the EndgamePath option. They hold the
+# distance to mate, so positions in them get exact mate scores.
+ENDGAME_PATH = "../../books/endgames"
 DEBUG = True
 USE_BOOK = True
 QUIESCE = False
+# Path to an nnue.py weight file. When set, the NNUE evaluator replaces the
+# PST evaluation.
+NNUE_FILE = None
+HASH_MB = 16
+# The persistent analysis store (see analysis.py), also the AnalysisFile and
+# AnalysisSize options. Finished searches are written to it, and it is read
+# at the root and, CACHE_PLIES deep, when the transposition table misses.
+ANALYSIS_FILE = None
+ANALYSIS_MB = 64
+CACHE_PLIES = 2
+MAX_QUIESCE_DEPTH = 6
+# Minimum time between the periodic info lines sent during a search.
+INFO_INTERVAL_MS = 1000
+# With a clock, each move gets 1/TIME_SLICE of the remaining time.
+TIME_SLICE = 30
+# Per-phase search profiling (see profiling.py), also the Profile and
+# ProfileFile options. With a file prefix, each search also runs under cProfile
+# and writes <prefix>-<n>.pstats and <prefix>-<n>.folded.
+PROFILE = os.environ.get("WALRUS_PROFILE", "") not in ("", "0")
+PROFILE_FILE = os.environ.get("WALRUS_PROFILE_FILE") or None
+BENCH_DEPTH = 2
+# Fixed positions for "bench", from openings to pawn endgames.
+BENCH_FENS = [
+              "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1",
+              "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 10",
+              "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 11",
+              "4rrk1/pp1n3p/3q2pQ/2p1pb2/2PP4/2P3N1/P2B2PP/4RRK1 b - - 7 19",
+              "rq3rk1/ppp2ppp/1bnpb3/3N2B1/3NP3/7P/PPPQ1PP1/2KR3R w - - 7 14",
+              "r1bq1r1k/1pp1n1pp/1p1p4/4p2Q/4Pp2/1BNP4/PPP2PPP/3R1RK1 w - - 2 14",
+              "r3r1k1/2p2ppp/p1p1bn2/8/1q2P3/2NPQN2/PPP3PP/R4RK1 b - - 2 15",
+              "r1bbk1nr/pp3p1p/2n5/1N4p1/2Np1B2/8/PPP2PPP/2KR1B1R w kq - 0 13",
+              "r1bq1rk1/ppp1nppp/4n3/3p3Q/3P4/1BP1B3/PP1N2PP/R4RK1 w - - 1 16",
+              "4r1k1/r1q2ppp/ppp2n2/4P3/5Rb1/1N1BQ3/PPP3PP/R5K1 w - - 1 17",
+              "2rqkb1r/ppp2p2/2npb1p1/1N1Nn2p/2P1PP2/8/PP2B1PP/R1BQK2R b KQ - 0 11",
+              "r1bq1r1k/b1p1npp1/p2p3p/1p6/3PP3/1B2NN2/PP3PPP/R2Q1RK1 w - - 1 16",
+              "3r1rk1/p5pp/bpp1pp2/8/q1PP1P2/b3P3/P2NQRPP/1R2B1K1 b - - 6 22",
+              "r1q2rk1/2p1bppp/2Pp4/p6b/Q1PNp3/4B3/PP1R1PPP/2K4R w - - 2 18",
+              "4k2r/1pb2ppp/1p2p3/1R1p4/3P4/2r1PN2/P4PPP/1R4K1 b - - 3 22",
+              "3q2k1/pb3p1p/4pbp1/2r5/PpN2N2/1P2P2P/5PP1/Q2R2K1 b - - 4 26",
+              "6k1/6p1/6Pp/ppp5/3pn2P/1P3K2/1PP2P2/8 b - - 0 1",
+              "3b4/5kp1/1p1p1p1p/pP1PpP1P/P1P1P3/3KN3/8/8 w - - 0 1",
+              "2K5/p7/7P/5pR1/8/5k2/r7/8 w - - 0 1",
+              "8/6pk/1p6/8/PP3p1p/5P2/4KP1q/3Q4 w - - 0 1",
+              "7k/3p2pp/4q3/8/4Q3/5Kp1/P6b/8 w - - 0 1",
+              "8/2p5/8/2kPKp1p/2p4P/2P5/3P4/8 w - - 0 1",
+              "8/1p3pp1/7p/5P1P/2k3P1/8/2K2P2/8 w - - 0 1",
+              "8/pp2r1k1/2p1p3/3pP2p/1P1P1P1P/P5KR/8/8 w - - 0 1",
+              "8/3p4/p1bk3p/Pp6/1Kp1PpPp/2P2P1P/2P5/5B2 b - - 0 1",
+              "5k2/7R/4P2p/5K2/p1r2P1p/8/8/8 b - - 0 1",
+              "6k1/6p1/P6p/r1N5/5p2/7P/1b3PP1/4R1K1 w - - 0 1",
+              "1r3k2/4q3/2Pp3b/3Bp3/2Q2p2/1p1P2P1/1P2KP2/3N4 w - - 0 1",
+              "6k1/4pp1p/3p2p1/P1pPb3/R7/1r2P1PP/3B1P2/6K1 w - - 0 1",
+              "8/3p3B/5p2/5P2/p7/PP5b/k7/6K1 w - - 0 1"]
+
+# (name, type, min, max) of the options advertised on "uci". Defaults are read
+# off the engine so they track the constants above.
+OPTIONS = [("Hash", "spin", 1, 4096),
+           ("Threads", "spin", 1, 256),
+           ("MultiPV", "spin", 1, 256),
+           ("OwnBook", "check", None, None),
+           ("BookFile", "string", None, None),
+           ("Quiesce", "check", None, None),
+           ("QuiesceDepth", "spin", 0, 64),
+           ("EvalFile", "string", None, None),
+           ("SyzygyPath", "string", None, None),
+           ("EndgamePath", "string", None, None),
+           ("AnalysisFile", "string", None, None),
+           ("AnalysisSize", "spin", 1, 65536),
+           ("Debug", "check", None, None),
+           ("Profile", "check", None, None),
+           ("ProfileFile", "string", None, None),
+           ("Board", "combo", list(BOARDS), None)]
 
 POS_INF = 1000000000
 NEG_INF = -1000000000
 WHITE_MATE = 1000000
 BLACK_MATE = -1000000
+# Tablebase wins score below mates and above any evaluation.
+TB_WIN = 100000
 
 PIECE_VALUES = {bitboard.PAWN:   100,
                 bitboard.KNIGHT: 320,
@@ -105,81 +199,285 @@ ENDGAME_TABLE = {bitboard.PAWN: PAWN_ENDGAME,
                bitboard.KING:   KING_ENDGAME}
 
 class AlphaBetaEngine:
-    def __init__(self):
+    def __init__(self, loadBook=True):
         self._options = defaultdict(str)
-        self._board = BitBoard(0)
+        # The board backend, see boards.py. NNUE and the endgame tables read
+        # BitBoard internals, so they're only used with "bitboard".
+        self._boardName = DEFAULT_BOARD
+        self._board = BOARDS[DEFAULT_BOARD].createFromFen(STARTING_FEN)
         self._maxDepth = 5 # in plies
-        self._table = {}
+        self._table = TranspositionTable(HASH_MB)
         self._moves = 0
+        # Search counters, reset per search and read by the info lines.
         self._nodes = 0
-        self._maxQuiesceDepth = 6
+        self._selDepth = 0
+        self._tbHits = 0
+        # Optional search limits from "go nodes/movetime" or searchLimited.
+        self._nodeLimit = None
+        self._deadline = None
+        self._searchStart = time.time()
+        self._lastInfo = self._searchStart
+        self._out = UciWriter()
+        self._maxQuiesceDepth = MAX_QUIESCE_DEPTH
+        self._quiesce = QUIESCE
+        self._debug = DEBUG
+        self._useBook = USE_BOOK
+        self._threads = 1
+        self._pool = None
+        self._multiPV = 1
+        self._pvIndex = 1
+        self._excludedRootMoves = set()
+        self._nnueFile = NNUE_FILE
+        # The position command last applied, to play only new moves.
+        self._positionFen = None
+        self._positionMoves = []
+        self._nnue = None
+        self._stop = Event()
+        self._profile = PROFILE
+        self._profileFile = PROFILE_FILE
+        self._profiler = None
+        self._searches = 0
+        if NNUE_FILE is not None:
+            self.loadNnue(NNUE_FILE)
+        self._bookFile = ALIREZA
+        self._bookLoader = None
+        if loadBook:
+            self.loadBook(ALIREZA if os.path.exists(ALIREZA) else "../" + ALIREZA)
+        self._syzygyPath = None
+        self._tablebase = None
+        syzygyPath = SYZYGY_PATH if os.path.exists(SYZYGY_PATH) else "../" + SYZYGY_PATH
+        if os.path.exists(syzygyPath):
+            self.loadTablebase(syzygyPath)
+        self._endgamePath = None
+        self._endgames = None
+        endgamePath = ENDGAME_PATH if os.path.exists(ENDGAME_PATH) else "../" + ENDGAME_PATH
+        if os.path.exists(endgamePath):
+            self.loadEndgames(endgamePath)
+        self._analysisMb = ANALYSIS_MB
+        self._analysis = None
+        # The depth of the last search's results, None if it was cut short.
+        self._searchedDepth = None
+        if ANALYSIS_FILE is not None:
+            self.loadAnalysis(ANALYSIS_FILE)
+
+    def needsBitBoard(self, option):
+        """ True, with a warning, if the board backend can't run |option|. """
+        if BOARDS[self._boardName] is BitBoard:
+            return False
+        print("info string {} needs Board bitboard".format(option))
+        return True
+
+    def loadNnue(self, file):
+        if self.needsBitBoard("EvalFile"):
+            self._nnueFile = None
+            return
+        from nnue import NnueEvaluator
+        self._nnue = NnueEvaluator.load(file)
+
+    def loadTablebase(self, path):
+        """ |path| is the SyzygyPath: directories separated by os.pathsep. """
+        if path and self.needsBitBoard("SyzygyPath"):
+            return
+        if self._tablebase is not None:
+            self._tablebase.close()
+        self._tablebase = syzygy.Tablebase(path) if path else None
+        self._syzygyPath = path if path else None
+
+    def loadEndgames(self, path):
+        if path and self.needsBitBoard("EndgamePath"):
+            return
+        if self._endgames is not None:
+            self._endgames.close()
+        self._endgames = retrograde.EndgameTables(path) if path else None
+        self._endgamePath = path if path else None
+
+    def loadAnalysis(self, path):
+        if self._analysis is not None:
+            self._analysis.close()
+        self._analysis = AnalysisCache(path, self._analysisMb) if path else None
+
+    def setBoard(self, name):
+        """ Switches the board backend, keeping the current position. """
+        self._boardName = name
+        self._board = BOARDS[name].createFromFen(self._board.toFen())
+        # The next "position" replays the game on the new backend.
+        self._positionFen = None
+        self._positionMoves = []
+        # Transposition keys differ between backends.
+        self._table.clear()
+        # The profiled phases do too.
+        self._profiler = None
+        if BOARDS[name] is not BitBoard:
+            self._nnue = None
+            self._nnueFile = None
+            self.loadTablebase(None)
+            self.loadEndgames(None)
+
+    def loadBook(self, file):
+        # The book loads in the background; getOpenings() waits for it.
+        self._bookLoader = BookLoader(file)
+        self._bookFile = file
+
+    def getOpenings(self):
+        """ The position-keyed opening book, or None without a usable one. """
+        if self._bookLoader is None:
+            return None
         try:
-            self._openings = OpeningTree.generateFromFile(ALIREZA)
-        except FileNotFoundError:
-            self._openings = OpeningTree.generateFromFile("../" + ALIREZA)
+            return self._bookLoader.getBook()
+        except (OSError, ValueError) as e:
+            print("info string could not load book {}: {}".format( \
+                self._bookLoader.getFile(), e))
+            self._bookLoader = None
+            return None
+
+    def getOption(self, name):
+        return {"Hash": self._table.getSizeMb(),
+                "Threads": self._threads,
+                "MultiPV": self._multiPV,
+                "OwnBook": self._useBook,
+                "BookFile": self._bookFile,
+                "Quiesce": self._quiesce,
+                "QuiesceDepth": self._maxQuiesceDepth,
+                "EvalFile": self._nnueFile,
+                "SyzygyPath": self._syzygyPath,
+                "EndgamePath": self._endgamePath,
+                "AnalysisFile": self._analysis.getPath() if self._analysis else None,
+                "AnalysisSize": self._analysisMb,
+                "Debug": self._debug,
+                "Profile": self._profile,
+                "ProfileFile": self._profileFile,
+                "Board": self._boardName}[name]
 
     def inputUCI(self):
         print("id name " + ENGINE_NAME)
         print("id author Walrus")
+        for name, kind, low, high in OPTIONS:
+            print(optionLine(name, kind, self.getOption(name), low, high))
         print("uciok")
 
     def setOptions(self, line):
-        print("unimplemented")
+        name, value = parseSetOption(line)
+        options = {o[0].lower(): o for o in OPTIONS}
+        if name is None or name.lower() not in options:
+            print("info string unknown option {}".format(name))
+            return
+        name, kind, low, high = options[name.lower()]
+        try:
+            if kind == "spin":
+                value = parseSpin(value, low, high)
+            elif kind == "check":
+                value = parseCheck(value)
+            elif kind == "combo":
+                value = parseCombo(value, low)
+            self.setOption(name, value)
+        except (ValueError, TypeError, OSError) as e:
+            print("info string bad value for {}: {}".format(name, e))
+
+    def setOption(self, name, value):
+        # Worker processes copy the search settings, so any change to them
+        # needs a fresh pool.
+        self.closePool()
+        if name == "Hash":
+            self._table.resize(value)
+        elif name == "Threads":
+            self._threads = value
+        elif name == "MultiPV":
+            self._multiPV = value
+        elif name == "OwnBook":
+            self._useBook = value
+        elif name == "BookFile":
+            self.loadBook(value)
+            # Surface a bad path here rather than on the next game.
+            self._bookLoader.getBook()
+        elif name == "Quiesce":
+            self._quiesce = value
+        elif name == "QuiesceDepth":
+            self._maxQuiesceDepth = value
+        elif name == "EvalFile":
+            self._nnueFile = value if value else None
+            self._nnue = None
+            if self._nnueFile is not None:
+                self.loadNnue(self._nnueFile)
+        elif name == "SyzygyPath":
+            self.loadTablebase(value)
+        elif name == "EndgamePath":
+            self.loadEndgames(value)
+        elif name == "AnalysisFile":
+            self.loadAnalysis(value)
+        elif name == "AnalysisSize":
+            self._analysisMb = value
+            if self._analysis is not None:
+                self._analysis.resize(value)
+        elif name == "Debug":
+            self._debug = value
+        elif name == "Profile":
+            self._profile = value
+        elif name == "ProfileFile":
+            self._profileFile = value if value else None
+        elif name == "Board":
+            self.setBoard(value)
 
     def isReady(self):
         print("readyok")
 
     def newGame(self):
-        # _bookMoves is a OpeningsTree node that is not None as long as there
-        # are still moves remaining.
-        self._bookMoves = self._openings
-        self._table = {}
+        self._table.clear()
         self._moves = 0
+        self._positionFen = None
+        self._positionMoves = []
 
     def printBookMoves(self):
         print("book moves (moves #{})".format(self._moves))
-        children = self._bookMoves.getChildren()
-        for c in children:
-            print("  {}: {}".format(c, children[c].getCount()))
+        book = self.getOpenings()
+        moves = book.getMoves(self._board) if book is not None else {}
+        for move, count in moves.items():
+            print("  {}: {}".format(move, count))
 
     def position(self, line):
-        words = line.split()
-        assert(words[0] == "position")
+        fen, moves = parsePosition(line)
+        if fen is None:
+            print("weird " + line)
+            return
 
-        if words[1] == "startpos":
-            self._bookMoves = self._openings
+        # GUIs resend the whole game every move. If this is the previous
+        # position plus some moves, only play the new ones.
+        knownMoves = len(self._positionMoves)
+        if fen == self._positionFen and moves[:knownMoves] == self._positionMoves:
+            moves = moves[knownMoves:]
+        else:
+            self._positionFen = fen
+            self._positionMoves = []
+            self._board = BOARDS[self._boardName].createFromFen(fen)
             self._moves = 0
-            self._board = BitBoard.createFromFen(STARTING_FEN)
             # if DEBUG:
             #     self.printBookMoves()
-            if len(words) > 2 and words[2] == "moves":
-                for move in words[3:]:
-                    self._board = self._board.makeMove(move)
-                    self._moves += 1
-                    if self._bookMoves is None:
-                        continue
-                    if move in self._bookMoves.getChildren():
-                        self._bookMoves = self._bookMoves.getChild(move)
-                        # if DEBUG:
-                        #     self.printBookMoves()
-                    else:
-                        self._bookMoves = None
-        elif words[1] == "fen":
-            self._bookMoves = None
-            self._board = BitBoard.createFromFen(" ".join(words[2:7]))
-        else:
-            print("weird " + words.join())
+        for move in moves:
+            self.playMove(move)
+
+    def playMove(self, move):
+        self._board = self._board.makeMove(move)
+        self._positionMoves.append(move)
+        self._moves += 1
 
     def go(self, args):
-        if USE_BOOK:
+        if self._useBook:
             bookMove = self.consultBook()
             if bookMove is not None:
-                print("bestmove " + bookMove)
+                self.sendBestMove(bookMove)
                 return
         self._nodes = 0
+        self.resetSearchStats()
+        self._nodeLimit = None
+        self._deadline = None
 
         # Time management
         self._maxDepth = 4
+        if "depth" in args:
+            self._maxDepth = int(args[args.index("depth") + 1])
+        if "nodes" in args:
+            self._nodeLimit = int(args[args.index("nodes") + 1])
+        if "movetime" in args:
+            self._deadline = time.time() + int(args[args.index("movetime") + 1]) / 1000
         if len(args) > 1:
             if args[1] == "infinite":
                 self._maxDepth = 4
@@ -188,6 +486,12 @@ class AlphaBetaEngine:
                 blackTime = int(args[4])
                 usTime = whiteTime if self._board.whiteToMove() else blackTime
                 opTime = blackTime if self._board.whiteToMove() else whiteTime
+                incKey = "winc" if self._board.whiteToMove() else "binc"
+                increment = int(args[args.index(incKey) + 1]) if incKey in args else 0
+                # Spend a slice of the clock plus most of the increment, so
+                # the search stops instead of losing on time.
+                self._deadline = time.time() + \
+                    min(usTime / TIME_SLICE + increment * 3 / 4, usTime / 2) / 1000
                 if usTime < 900000:
                     self._maxDepth = 4
                 # elif usTime >= opTime * 1.5:
@@ -205,44 +509,227 @@ class AlphaBetaEngine:
         elif len(moves) == 0:
             print("stale mate...??")
             return
-        bestPath, score, mateIn = self.search(self._board)
-        print("bestmove " + bestPath.split()[0])
+        if "infinite" not in args and "ponder" not in args:
+            cachedMove = self.analysisMove(self._board, moves)
+            if cachedMove is not None:
+                self.sendBestMove(cachedMove)
+                return
+        # With a node or time limit, deepen so that running out leaves the
+        # best move of the last finished depth instead of a half searched one.
+        self._searchedDepth = None
+        limited = self._deadline is not None or self._nodeLimit is not None
+        searchRoot = self.deepenRoot if limited else self.searchRoot
+        if self._profile or self._profileFile is not None:
+            results = self.profiledSearchRoot(searchRoot)
+        else:
+            results = searchRoot(self._board)
+        if not limited and not self._stop.is_set():
+            self._searchedDepth = self._maxDepth
+        if len(results) == 0:
+            # Stopped before the first root move was searched.
+            bestPath = BitBoard.moveStr(moves[0])
+        else:
+            bestPath, score, mateIn = results[0]
+            self.saveAnalysis(self._board, results[0])
+        if "infinite" in args or "ponder" in args:
+            # UCI: don't send bestmove for an infinite search until "stop".
+            self._out.flush()
+            self._stop.wait()
+        self.sendBestMove(bestPath.split()[0])
 
-    def run(self):
-        while True:
-            line = input()
-            if line == "uci":
-                self.inputUCI()
-            elif line.startswith("setoption"):
-                self.setOptions(line)
-            elif line.startswith("isready"):
-                self.isReady()
-            elif line.startswith("ucinewgame"):
-                self.newGame()
-            elif line.startswith("position"):
-                self.position(line)
-            elif line.startswith("go"):
-                self.go(line.split())
-            elif line.startswith("print"):
-                self._board.prettyPrint()
-                print(self._board.getLegalMoves())
-                print(AlphaBetaEngine.evaluatePosition(self._board))
-            elif line.startswith("end") or line.startswith("quit"):
-                print("goodbye")
+    def searchLimited(self, fen, depth=None, nodes=None, movetime=None):
+        """
+        Searches |fen| without going through UCI, deepening one ply at a time
+        up to |depth| (default: the usual search depth) and stopping early once
+        |nodes| nodes or |movetime| ms are spent. Returns one
+        (depth, path, score, mateIn, nodes, seconds) per finished iteration
+        (or the cut short first one); nodes and seconds are cumulative.
+        """
+        board = BOARDS[self._boardName].createFromFen(fen)
+        # The info lines read self._board; the game position comes back after,
+        # so a following incremental "position" still applies to it.
+        gameBoard = self._board
+        self._board = board
+        self._stop.clear()
+        self._nodes = 0
+        self.resetSearchStats()
+        self._nodeLimit = nodes
+        self._deadline = time.time() + movetime / 1000 if movetime is not None else None
+        iterations = []
+        try:
+            if len(board.getLegalMoves()) > 0:
+                for iteration, results, nodes, seconds in \
+                        self.deepen(board, depth if depth is not None else 4):
+                    path, score, mateIn = results[0]
+                    iterations.append((iteration, path, score, mateIn, nodes, seconds))
+        finally:
+            self._board = gameBoard
+            self._nodeLimit = None
+            self._deadline = None
+        return iterations
+
+    def deepen(self, board, maxDepth):
+        """
+        Searches |board| one ply deeper at a time, up to |maxDepth| or until
+        the search is stopped. Returns (depth, searchRoot results, nodes,
+        seconds) per finished iteration, or the cut short first one.
+        """
+        start = time.time()
+        iterations = []
+        for depth in range(1, maxDepth + 1):
+            self._maxDepth = depth
+            results = self.searchRoot(board)
+            if self._stop.is_set() and len(iterations) > 0:
+                # An unfinished iteration has only seen some root moves.
+                break
+            if len(results) > 0:
+                iterations.append((depth, results, self._nodes, time.time() - start))
+            if self._stop.is_set():
                 break
+        return iterations
+
+    def deepenRoot(self, board):
+        """ searchRoot's results from the deepest iteration deepen finished. """
+        iterations = self.deepen(board, self._maxDepth)
+        if len(iterations) > 0 and \
+                (iterations[-1][0] < self._maxDepth or not self._stop.is_set()):
+            self._searchedDepth = iterations[-1][0]
+        return iterations[-1][1] if len(iterations) > 0 else []
+
+    def analysisMove(self, board, moves):
+        """
+        The best move stored for |board| by an earlier search at least as
+        deep as this one, or None. Only a single PV can come from the store.
+        """
+        if self._analysis is None or self._multiPV > 1:
+            return None
+        row = self._analysis.probe(board)
+        if row is None:
+            return None
+        depth, score, mateIn, bound, path = row
+        move = path.split(" ", 1)[0]
+        if depth < self._maxDepth or bound != transposition.EXACT or \
+                move not in [BitBoard.moveStr(m) for m in moves]:
+            return None
+        self.printDebugInfo(score, mateIn - 1, path)
+        return move
+
+    def saveAnalysis(self, board, result):
+        """
+        Writes the root |result| of a finished search, and the entries the
+        transposition table holds along its PV, to the analysis store.
+        """
+        if self._analysis is None or self._searchedDepth is None:
+            return
+        path, score, mateIn = result
+        entries = [(board, self._searchedDepth, score, mateIn, transposition.EXACT, path)]
+        for moveString in path.split()[:-1]:
+            move = next((m for m in board.getLegalMoves() \
+                         if BitBoard.moveStr(m) == moveString), None)
+            if move is None:
+                break
+            board = board.makeMove(move)
+            entry = self._table.probe(board.positionKey())
+            if entry is not None and entry[5] != "":
+                entries.append((board,) + tuple(entry[1:]))
+        self._analysis.store(entries)
+
+    def bench(self, args=[]):
+        """
+        "bench [depth]": searches BENCH_FENS to a fixed depth with the book
+        off and a cleared hash table per position, then prints the total node
+        count (the search signature), time and nps. The node count only
+        changes when search or move generation does, given Threads 1.
+        """
+        depth = int(args[0]) if len(args) > 0 else BENCH_DEPTH
+        useBook, debug = self._useBook, self._debug
+        self._useBook = False
+        self._debug = False
+        nodes = 0
+        start = time.time()
+        for i, fen in enumerate(BENCH_FENS):
+            self.newGame()
+            self.searchLimited(fen, depth)
+            nodes += self._nodes
+            print("Position: {}/{} ({}) nodes {}".format(i + 1, len(BENCH_FENS), fen, self._nodes))
+            sys.stdout.flush()
+        elapsed = time.time() - start
+        self._useBook = useBook
+        self._debug = debug
+        self.newGame()
+        print("===========================")
+        print("Total time (ms) : {}".format(int(elapsed * 1000)))
+        print("Nodes searched  : {}".format(nodes))
+        print("Nodes/second    : {}".format(int(nodes / max(elapsed, 1e-9))))
+        return nodes
+
+    def profiledSearchRoot(self, searchRoot):
+        """ Runs |searchRoot|, reporting where the time went as info strings. """
+        if self._profiler is None:
+            self._profiler = PhaseProfiler(profilePhases(self._boardName))
+        self._searches += 1
+        with searchProfile(self._profiler, self._profileFile, self._searches) as files:
+            results = searchRoot(self._board)
+        for line in self._profiler.reportLines():
+            self._out.write("info string " + line)
+        for file in files:
+            self._out.write("info string profile written to " + file)
+        return results
+
+    def sendBestMove(self, move):
+        self._out.write("bestmove " + move)
+        self._out.flush()
+
+    def printBoard(self):
+        self._board.prettyPrint()
+        print(self._board.getLegalMoves())
+        if self._nnue is not None:
+            self._nnue.reset(self._board)
+        print(self.evaluate(self._board))
+
+    def run(self):
+        UciLoop(self).run()
 
     """ =============== Alpha Beta implementation ====================="""
     def consultBook(self):
-        if self._bookMoves is not None and self._moves < 12:
-            children = self._bookMoves.getChildren()
-            values = [c.getCount() for c in children.values()]
-            return random.choices(list(children.keys()), values)[0]
-        return None
-
-    def printDebugInfo(self, bestScore, start, bestMateIn, pv):
-        if not DEBUG:
+        # The book is keyed by position, so it works after "position fen" and
+        # across transpositions.
+        book = self.getOpenings()
+        if book is None or self._moves >= BOOK_PLIES:
+            return None
+        return book.chooseMove(self._board)
+
+    def resetSearchStats(self):
+        self._selDepth = 0
+        self._tbHits = 0
+        self._searchStart = time.time()
+        self._lastInfo = self._searchStart
+
+    def statsInfo(self):
+        """ The counters part of an info line. """
+        elapsedMs = int((time.time() - self._searchStart) * 1000)
+        return "seldepth {} nodes {} nps {} hashfull {} tbhits {} time {}".format( \
+            self._selDepth, self._nodes, self._nodes * 1000 // max(elapsedMs, 1), \
+            self._table.hashfull(), self._tbHits, elapsedMs)
+
+    def pollSearch(self):
+        """ Called from the hot path every 16 nodes: limits and periodic info. """
+        if (self._nodeLimit is not None and self._nodes >= self._nodeLimit) or \
+                (self._deadline is not None and time.time() >= self._deadline):
+            self._stop.set()
+        self.periodicInfo()
+
+    def periodicInfo(self):
+        """ Called from the hot path every few nodes; rate-limits itself. """
+        now = time.time()
+        if not self._debug or (now - self._lastInfo) * 1000 < INFO_INTERVAL_MS:
+            return
+        self._lastInfo = now
+        self._out.write("info depth {} {}".format(self._maxDepth, self.statsInfo()))
+
+    def printDebugInfo(self, bestScore, bestMateIn, pv):
+        if not self._debug or pv == "":
             return
-        elapsedMs = int((time.time() - start) * 1000)
         if (bestScore == WHITE_MATE and self._board.whiteToMove()) or \
             (bestScore == BLACK_MATE and not self._board.whiteToMove()):
             scoreInfo = "mate {}".format(int((bestMateIn+1)/2))
@@ -252,8 +739,8 @@ class AlphaBetaEngine:
             scoreInfo = "cp {}".format(\
                 bestScore * (1 if self._board.whiteToMove() else -1))
 
-        print("info depth {} score {} time {} nodes {} pv {}".format( \
-            self._maxDepth, scoreInfo, elapsedMs, self._nodes, pv), flush=True)
+        self._out.write("info depth {} multipv {} score {} {} pv {}".format( \
+            self._maxDepth, self._pvIndex, scoreInfo, self.statsInfo(), pv.strip()))
 
     def evaluatePosition(board):
         if board.isCheckMate():
@@ -280,9 +767,22 @@ class AlphaBetaEngine:
         # blackScore = sum([PIECE_VALUES[p] for p in blacks])
         return whiteScore - blackScore
 
+    def evaluate(self, board):
+        if self._nnue is None:
+            return AlphaBetaEngine.evaluatePosition(board)
+        if board.isCheckMate():
+            return BLACK_MATE if board.whiteToMove() else WHITE_MATE
+        return self._nnue.evaluate(board)
+
     def quiesce(self, board, alpha, beta, depth):
+        if self._stop.is_set():
+            raise SearchStopped()
         self._nodes += 1
-        eval = AlphaBetaEngine.evaluatePosition(board)
+        if depth > self._selDepth:
+            self._selDepth = depth
+        if self._nodes & 15 == 0:
+            self.pollSearch()
+        eval = self.evaluate(board)
         if depth == self._maxQuiesceDepth:
             return eval, POS_INF
         # Stand pat scores
@@ -306,7 +806,13 @@ class AlphaBetaEngine:
             if BitBoard.moveCaptureValue(move) < 0:
                 continue
             newBoard = board.makeMove(move)
-            score, mateIn = self.quiesce(newBoard, alpha, beta, depth+1)
+            if self._nnue is not None:
+                self._nnue.push(board, newBoard)
+            try:
+                score, mateIn = self.quiesce(newBoard, alpha, beta, depth+1)
+            finally:
+                if self._nnue is not None:
+                    self._nnue.pop()
             if board.whiteToMove():
                 if score >= beta:
                     return beta, POS_INF
@@ -324,22 +830,63 @@ class AlphaBetaEngine:
         return bestScore, bestMateIn + 1
 
     def search(self, board, alpha=NEG_INF, beta=POS_INF, depth=0):
+        if self._stop.is_set() and depth > 0:
+            raise SearchStopped()
         self._nodes += 1
+        if depth > self._selDepth:
+            self._selDepth = depth
+        if self._nodes & 15 == 0:
+            self.pollSearch()
         if board.isCheckMate():
             return "", (BLACK_MATE if board.whiteToMove() else WHITE_MATE), 1
         if len(board.getLegalMoves()) == 0:  # stalemate
             return "", 0, POS_INF
+        if depth > 0 and self._endgames is not None and \
+                syzygy.pieceCount(board) <= self._endgames.maxPieces:
+            hit = self._endgames.probe(board)
+            if hit is not None:
+                self._tbHits += 1
+                score, mateIn = self.endgameScore(board, *hit)
+                return "", score, mateIn
+        if depth > 0 and self._tablebase is not None and self._tablebase.canProbe(board):
+            wdl = self._tablebase.probeWdl(board)
+            if wdl is not None:
+                self._tbHits += 1
+                return "", self.tablebaseScore(board, wdl, depth), POS_INF
         if depth >= self._maxDepth:
             # Evaluate using quiescence
-            if QUIESCE:
+            if self._quiesce:
                 score, bestMateIn = self.quiesce(board, alpha, beta, depth)
                 return "", score, bestMateIn
             else:
-                score = AlphaBetaEngine.evaluatePosition(board)
+                score = self.evaluate(board)
                 return "", score, POS_INF
             # print("{}eval: {}".format("  " * depth, score))
             # return "", score, bestMateIn
 
+        # Transposition table: reuse results searched to at least this depth.
+        key = board.positionKey()
+        remaining = self._maxDepth - depth
+        ttMove = None
+        if depth > 0:
+            entry = self._table.probe(key)
+            if entry is None and self._analysis is not None and depth <= CACHE_PLIES:
+                # Near the root, fall back on earlier games' analysis.
+                row = self._analysis.probe(board)
+                if row is not None:
+                    entry = (key,) + tuple(row)
+                    self._table.store(*entry)
+            if entry is not None:
+                _, entryDepth, entryScore, entryMateIn, bound, entryPath = entry
+                if entryDepth >= remaining and \
+                        (bound == transposition.EXACT or \
+                        (bound == transposition.LOWER_BOUND and entryScore >= beta) or \
+                        (bound == transposition.UPPER_BOUND and entryScore <= alpha)):
+                    return entryPath, entryScore, entryMateIn
+                ttMove = entryPath.split(" ", 1)[0]
+        alphaOrig = alpha
+        betaOrig = beta
+
         bestPath = ""
         # THIS LINE IS A FUNDAMENTAL BUG. it should be:
         # bestScore = alpha if board.whiteToMove() else beta
@@ -348,16 +895,35 @@ class AlphaBetaEngine:
         bestScore = NEG_INF if board.whiteToMove() else POS_INF
         bestMateIn = POS_INF
         if depth == 0:
-            start = time.time()
+            if self._nnue is not None:
+                self._nnue.reset(board)
+        moves = board.getLegalMoves()
+        if ttMove:
+            # Try the best move from the last search of this position first.
+            moves = sorted(moves, key=lambda m: BitBoard.moveStr(m) != ttMove)
         i = 0
-        for move in board.getLegalMoves():
-            i += 1
+        for move in moves:
             moveString = BitBoard.moveStr(move)
-            if depth == 0:
-                print("info currmove {} currmovenumber {}".format(moveString, i), flush=True)
+            if depth == 0 and moveString in self._excludedRootMoves:
+                continue
+            i += 1
+            if depth == 0 and self._debug and time.time() - self._searchStart > 1:
+                # Only worth reporting once the search takes a while.
+                self._out.write("info currmove {} currmovenumber {}".format(moveString, i))
 
             newBoard = board.makeMove(move)
-            path, score, mateIn = self.search(newBoard, alpha, beta, depth + 1)
+            if self._nnue is not None:
+                self._nnue.push(board, newBoard)
+            try:
+                path, score, mateIn = self.search(newBoard, alpha, beta, depth + 1)
+            except SearchStopped:
+                if depth > 0:
+                    raise
+                # Keep the best move among the root moves fully searched.
+                break
+            finally:
+                if self._nnue is not None:
+                    self._nnue.pop()
 
             if board.whiteToMove() and ((score > alpha) or \
                 (mateIn < bestMateIn and score == WHITE_MATE)):
@@ -366,7 +932,7 @@ class AlphaBetaEngine:
                 bestMateIn = mateIn
                 alpha = score
                 if depth == 0:
-                    self.printDebugInfo(score, start, mateIn, bestPath)
+                    self.printDebugInfo(score, mateIn, bestPath)
             elif (not board.whiteToMove()) and ((score < beta) or \
                 (mateIn < bestMateIn and score == BLACK_MATE)):
                 bestScore = score
@@ -374,7 +940,7 @@ class AlphaBetaEngine:
                 bestMateIn = mateIn
                 beta = score
                 if depth == 0:
-                    self.printDebugInfo(score, start, mateIn, bestPath)
+                    self.printDebugInfo(score, mateIn, bestPath)
             if alpha > beta:
                 # if DEBUG:
                 # print("{}{}: alpha {} > beta {}: pruning {} other branches".format(\
@@ -383,12 +949,196 @@ class AlphaBetaEngine:
                 break
 
         if depth == 0:
-            self.printDebugInfo(bestScore, \
-                start, bestMateIn, bestPath)
+            self.printDebugInfo(bestScore, bestMateIn, bestPath)
+        else:
+            if bestScore <= alphaOrig:
+                bound = transposition.UPPER_BOUND
+            elif bestScore >= betaOrig:
+                bound = transposition.LOWER_BOUND
+            else:
+                bound = transposition.EXACT
+            self._table.store(key, remaining, bestScore, bestMateIn + 1, bound, bestPath)
         return bestPath, bestScore, bestMateIn + 1
 
+    def tablebaseScore(self, board, wdl, depth):
+        """ A syzygy result for the side to move as a search score. """
+        score = {syzygy.WIN: TB_WIN - depth, syzygy.CURSED_WIN: 1, syzygy.DRAW: 0, \
+                 syzygy.BLESSED_LOSS: -1, syzygy.LOSS: depth - TB_WIN}[wdl]
+        return score if board.whiteToMove() else -score
+
+    def endgameScore(self, board, result, plies):
+        """ A retrograde table result as a search (score, mateIn). """
+        if result == retrograde.DRAW:
+            return 0, POS_INF
+        # The side to move wins or loses; mateIn counts the mated position.
+        whiteWins = (result == retrograde.WIN) == bool(board.whiteToMove())
+        return (WHITE_MATE if whiteWins else BLACK_MATE), plies + 1
+
+    def tablebaseRootFilter(self, board):
+        """
+        The root moves the tables rule out: those that throw away the best
+        result and, when winning with DTZ tables, those that don't make the
+        quickest progress to the next capture or pawn move.
+        """
+        if self._tablebase is None or not self._tablebase.canProbe(board):
+            return set()
+        ranked = self._tablebase.rankRootMoves(board)
+        if ranked is None or len(ranked) == 0:
+            return set()
+        _, bestWdl, bestDtz = ranked[0]
+        keep = [move for move, wdl, dtz in ranked if wdl == bestWdl and \
+                (bestWdl <= syzygy.DRAW or dtz == bestDtz)]
+        return set(BitBoard.moveStr(move) for move, _, _ in ranked if move not in keep)
+
+    def searchRoot(self, board):
+        """
+        Returns [(path, score, mateIn)] for the MultiPV best root moves, best
+        first. With more than one thread the root moves are split across a
+        process pool, otherwise each extra PV is a search excluding the moves
+        already reported.
+        """
+        if self._threads > 1:
+            return self.searchParallel(board)
+        results = []
+        tablebaseExcluded = self.tablebaseRootFilter(board)
+        self._excludedRootMoves = set(tablebaseExcluded)
+        numMoves = len(board.getLegalMoves()) - len(tablebaseExcluded)
+        for pv in range(min(self._multiPV, numMoves)):
+            self._pvIndex = pv + 1
+            path, score, mateIn = self.search(board)
+            if path == "":
+                break
+            results.append((path, score, mateIn))
+            self._excludedRootMoves.add(path.split()[0])
+            if self._stop.is_set():
+                break
+        self._excludedRootMoves = set()
+        self._pvIndex = 1
+        return results
+
+    def getPool(self):
+        if self._pool is None:
+            settings = (self._table.getSizeMb(), self._quiesce, \
+                        self._maxQuiesceDepth, self._nnueFile, self._syzygyPath, \
+                        self._endgamePath, self._boardName, \
+                        self._analysis.getPath() if self._analysis else None)
+            self._pool = processPool(self._threads, initSearchWorker, (settings,))
+        return self._pool
+
+    def closePool(self):
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool = None
+
+    def searchParallel(self, board):
+        """
+        Searches every root move with a full window on its own worker. Each
+        result is exact, which also makes MultiPV free.
+        """
+        pool = self.getPool()
+        tablebaseExcluded = self.tablebaseRootFilter(board)
+        tasks = [(board.toFen(), BitBoard.moveStr(m), self._maxDepth) \
+                 for m in board.getLegalMoves() if BitBoard.moveStr(m) not in tablebaseExcluded]
+        us = 1 if board.whiteToMove() else -1
+        def rank(result):
+            _, score, mateIn = result
+            score *= us
+            # Prefer quicker mates and slower losses.
+            return score, (-mateIn if score == WHITE_MATE else \
+                           mateIn if score == BLACK_MATE else 0)
+
+        results = []
+        best = None
+        it = pool.imap_unordered(searchRootMove, tasks)
+        while len(results) < len(tasks):
+            try:
+                path, score, mateIn, nodes, selDepth, tbHits = it.next(timeout=0.005)
+            except multiprocessing.TimeoutError:
+                # The workers can't see the limits; only this loop polls them.
+                self.pollSearch()
+                if self._stop.is_set():
+                    self.closePool()
+                    break
+                continue
+            # Fold the worker's counters into this search's info lines.
+            self._nodes += nodes
+            self._selDepth = max(self._selDepth, selDepth)
+            self._tbHits += tbHits
+            results.append((path, score, mateIn))
+            if best is None or rank(results[-1]) > rank(best):
+                best = results[-1]
+                self.printDebugInfo(score, mateIn, path)
+        results.sort(key=rank, reverse=True)
+        for pv, (path, score, mateIn) in enumerate(results[:self._multiPV]):
+            self._pvIndex = pv + 1
+            self.printDebugInfo(score, mateIn, path)
+        self._pvIndex = 1
+        return results[:self._multiPV]
+
+
+# The functions the Profile option counts: per board backend, its move
+# generation, legality check, makeMove and mate test, then the search's own.
+BOARD_PROFILE_PHASES = {"bitboard": ["computeLegalMoves", "kingCheckAnalysis", \
+                                     "makeMove", "isCheckMate"],
+                        "array": ["computeLegalMoves", "isKingSafeAfterMove", \
+                                  "makeMove", "isCheckMate"],
+                        "mailbox": ["getLegalMoves", "isKingSafeAfterMove", \
+                                    "makeMove", "isCheckMate"]}
+SEARCH_PROFILE_PHASES = [(AlphaBetaEngine, "evaluatePosition"),
+                         (AlphaBetaEngine, "quiesce"),
+                         (TranspositionTable, "probe"),
+                         (TranspositionTable, "store")]
+
+def profilePhases(boardName):
+    """ The (owner, name) phases to profile a search on |boardName|. """
+    board = BOARDS[boardName]
+    return [(board, name) for name in BOARD_PROFILE_PHASES[boardName]] + \
+        SEARCH_PROFILE_PHASES
+
+""" =============== Root splitting workers ====================="""
+_workerEngine = None
+
+def initSearchWorker(settings):
+    global _workerEngine
+    hashMb, quiesce, maxQuiesceDepth, nnueFile, syzygyPath, endgamePath, \
+        boardName, analysisPath = settings
+    _workerEngine = AlphaBetaEngine(loadBook=False)
+    _workerEngine.setBoard(boardName)
+    # Workers share the GUI's stdout; only the main process reports.
+    _workerEngine._debug = False
+    _workerEngine._table.resize(hashMb)
+    _workerEngine._quiesce = quiesce
+    _workerEngine._maxQuiesceDepth = maxQuiesceDepth
+    if nnueFile is not None:
+        _workerEngine.loadNnue(nnueFile)
+    _workerEngine.loadTablebase(syzygyPath)
+    _workerEngine.loadEndgames(endgamePath)
+    # Workers only read the analysis store; the main process writes it.
+    _workerEngine.loadAnalysis(analysisPath)
+
+def searchRootMove(task):
+    """
+    Searches one root move; returns (path, score, mateIn, nodes, seldepth,
+    tbhits), the counters being this search's.
+    """
+    fen, move, maxDepth = task
+    engine = _workerEngine
+    engine._maxDepth = maxDepth
+    engine._nodes = 0
+    engine._selDepth = 0
+    engine._tbHits = 0
+    board = BOARDS[engine._boardName].createFromFen(fen).makeMove(move)
+    if engine._nnue is not None:
+        engine._nnue.reset(board)
+    path, score, mateIn = engine.search(board, NEG_INF, POS_INF, 1)
+    return move + " " + path, score, mateIn, engine._nodes, engine._selDepth, engine._tbHits
+
 
 if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "bench":
+        # python alphabeta_bot.py bench [depth]
+        AlphaBetaEngine(loadBook=False).bench(sys.argv[2:])
+        sys.exit(0)
     engine = AlphaBetaEngine()
     engine.run()
     # Scenarios to improve on:
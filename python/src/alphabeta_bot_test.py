@@ -0,0 +1,138 @@
+import contextlib
+import io
+import time
+import unittest
+from alphabeta_bot import AlphaBetaEngine
+from bitboard import BitBoard, STARTING_FEN
+from boards import BOARDS
+
+class RecordingWriter:
+    """ Stands in for the engine's UciWriter, keeping the lines it gets. """
+    def __init__(self):
+        self.lines = []
+
+    def write(self, line):
+        self.lines.append(line)
+
+    def flush(self):
+        pass
+
+
+def createEngine():
+    engine = AlphaBetaEngine(loadBook=False)
+    engine._useBook = False
+    engine._debug = False
+    engine._out = RecordingWriter()
+    return engine
+
+class TestAlphaBeta(unittest.TestCase):
+    def test_setOptions(self):
+        engine = createEngine()
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            engine.setOptions("setoption name hash value 0")
+            engine.setOptions("setoption name MultiPV value 3")
+            engine.setOptions("setoption name Board value Mailbox")
+            engine.setOptions("setoption name Board value hex")
+            engine.setOptions("setoption name Threads value many")
+            engine.setOptions("setoption name Contempt value 10")
+        self.assertEqual(engine.getOption("Hash"), 1)
+        self.assertEqual(engine.getOption("MultiPV"), 3)
+        self.assertEqual(engine.getOption("Board"), "mailbox")
+        self.assertEqual(engine.getOption("Threads"), 1)
+        self.assertEqual(output.getvalue().splitlines(), \
+            ["info string bad value for Board: expected one of bitboard, array, mailbox",
+             "info string bad value for Threads: invalid literal for int() with base 10: 'many'",
+             "info string unknown option Contempt"])
+
+    def test_incrementalPosition(self):
+        engine = createEngine()
+        played = []
+        playMove = engine.playMove
+        engine.playMove = lambda move: (played.append(move), playMove(move))
+        engine.position("position startpos moves e2e4 e7e5")
+        engine.position("position startpos moves e2e4 e7e5 g1f3 b8c6")
+        self.assertEqual(played, ["e2e4", "e7e5", "g1f3", "b8c6"])
+        expected = BitBoard.createFromFen(STARTING_FEN)
+        for move in played:
+            expected = expected.makeMove(move)
+        self.assertEqual(engine._board.toFen(), expected.toFen())
+        # Another game, or a fen, starts over.
+        engine.position("position startpos moves d2d4")
+        self.assertEqual(played[4:], ["d2d4"])
+        fen = "8/8/8/4k3/8/8/8/4K2Q w - - 0 1"
+        engine.position("position fen {} moves h1h5 e5e4".format(fen))
+        engine.position("position fen {} moves h1h5 e5e4 h5g4".format(fen))
+        self.assertEqual(played[5:], ["h1h5", "e5e4", "h5g4"])
+        self.assertEqual(engine._board.toFen().split()[0], "8/8/8/8/4k1Q1/8/8/4K3")
+        engine.newGame()
+        engine.position("position fen {} moves h1h5".format(fen))
+        self.assertEqual(played[8:], ["h1h5"])
+
+    def test_profileBoards(self):
+        engine = createEngine()
+        engine.setOption("Profile", True)
+        for name in BOARDS:
+            engine.setOption("Board", name)
+            engine._out = RecordingWriter()
+            engine.position("position startpos moves e2e4")
+            engine.go(["go", "depth", "2"])
+            report = " ".join(engine._out.lines)
+            self.assertIn("makeMove", report, name)
+            self.assertIn("isCheckMate", report, name)
+
+    def test_searchLimitedKeepsPosition(self):
+        engine = createEngine()
+        engine.position("position startpos moves e2e4")
+        iterations = engine.searchLimited("6k1/5ppp/8/8/8/8/8/R5K1 w - - 0 1", depth=1)
+        self.assertEqual(iterations[-1][1].split()[0], "a1a8")
+        engine.position("position startpos moves e2e4 e7e5")
+        expected = BitBoard.createFromFen(STARTING_FEN).makeMove("e2e4").makeMove("e7e5")
+        self.assertEqual(engine._board.toFen(), expected.toFen())
+
+    def test_statsSpanIterations(self):
+        engine = createEngine()
+        engine._debug = True
+        resets = []
+        resetSearchStats = engine.resetSearchStats
+        engine.resetSearchStats = lambda: (resets.append(1), resetSearchStats())
+        engine.position("position startpos moves e2e4")
+        with contextlib.redirect_stdout(io.StringIO()):
+            engine.go(["go", "depth", "3", "nodes", "100000"])
+        self.assertEqual(len(resets), 1)
+        infos = [line.split() for line in engine._out.lines if line.startswith("info depth")]
+        self.assertGreater(len(infos), 2)
+        nodes = [int(info[info.index("nodes") + 1]) for info in infos]
+        times = [int(info[info.index("time") + 1]) for info in infos]
+        self.assertEqual(nodes, sorted(nodes))
+        self.assertEqual(times, sorted(times))
+        engine.searchLimited(STARTING_FEN, depth=2)
+        self.assertEqual(len(resets), 2)
+
+    def test_parallelInfo(self):
+        engine = createEngine()
+        engine._debug = True
+        engine.setOption("Threads", 2)
+        try:
+            engine.position("position startpos moves e2e4")
+            engine.go(["go", "depth", "2"])
+        finally:
+            engine.closePool()
+        info = engine._out.lines[-2].split()
+        self.assertEqual(info[info.index("seldepth") + 1], "2")
+        self.assertEqual(int(info[info.index("nodes") + 1]), engine._nodes)
+        self.assertGreater(engine._nodes, 20)
+
+    def test_parallelMovetime(self):
+        engine = createEngine()
+        engine.setOption("Threads", 2)
+        try:
+            start = time.time()
+            engine.go(["go", "depth", "6", "movetime", "300"])
+            self.assertLess(time.time() - start, 10)
+            self.assertTrue(engine._out.lines[-1].startswith("bestmove "))
+        finally:
+            engine.closePool()
+
+if __name__ == "__main__":
+    unittest.main()
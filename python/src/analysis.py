@@ -0,0 +1,92 @@
+"""
+Persistent analysis store: search results that outlive the game and the
+process, so the positions we keep reaching (the same openings, the same book
+exits) aren't searched from scratch every time.
+
+Entries are keyed by the Polyglot hash (the same on every board backend) and
+hold the transposition table's (depth, score, mateIn, bound, path). They live
+in an SQLite file in WAL mode, so any number of engine processes can read it
+while one writes; writers wait up to BUSY_TIMEOUT for each other. The store
+is bounded: past its size, the least recently used entries are evicted.
+Reads only note what they used; the "last used" times go out with the next
+write, so probing never takes the write lock.
+"""
+import sqlite3
+import time
+from boards import zobristHash
+
+# Rough size of one row with its index entries, to turn MB into rows.
+ROW_BYTES = 160
+BUSY_TIMEOUT = 5.0
+# Evict down to this fraction of the capacity, so it's not every write.
+EVICT_TO = 0.9
+
+def signedKey(key):
+    """ A 64-bit hash as SQLite's signed INTEGER. """
+    return key - (1 << 64) if key >= 1 << 63 else key
+
+
+class AnalysisCache:
+    def __init__(self, path, sizeMb=64):
+        self._path = path
+        # The UCI loop searches on its worker thread; calls never overlap.
+        self._db = sqlite3.connect(path, timeout=BUSY_TIMEOUT, check_same_thread=False)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        with self._db:
+            self._db.execute("CREATE TABLE IF NOT EXISTS analysis (key INTEGER PRIMARY KEY, "
+                             "depth INTEGER, score INTEGER, mateIn INTEGER, bound INTEGER, "
+                             "path TEXT, used REAL)")
+            self._db.execute("CREATE INDEX IF NOT EXISTS analysis_used ON analysis (used)")
+        self._used = set()
+        self.hits = 0
+        self.resize(sizeMb)
+
+    def getPath(self):
+        return self._path
+
+    def getSizeMb(self):
+        return self._sizeMb
+
+    def resize(self, sizeMb):
+        self._sizeMb = sizeMb
+        self._capacity = max(1, int(sizeMb * 1024 * 1024 / ROW_BYTES))
+
+    def __len__(self):
+        return self._db.execute("SELECT COUNT(*) FROM analysis").fetchone()[0]
+
+    def probe(self, board):
+        """ Returns (depth, score, mateIn, bound, path) for |board| or None. """
+        key = signedKey(zobristHash(board))
+        row = self._db.execute("SELECT depth, score, mateIn, bound, path FROM analysis "
+                               "WHERE key = ?", (key,)).fetchone()
+        if row is not None:
+            self.hits += 1
+            self._used.add(key)
+        return row
+
+    def store(self, entries):
+        """
+        Writes [(board, depth, score, mateIn, bound, path)] in one transaction.
+        An entry searched deeper than the new one is kept.
+        """
+        now = time.time()
+        rows = [(signedKey(zobristHash(board)), depth, score, mateIn, bound, path, now) \
+                for board, depth, score, mateIn, bound, path in entries]
+        with self._db:
+            self._db.executemany(
+                "INSERT INTO analysis VALUES (?, ?, ?, ?, ?, ?, ?) ON CONFLICT (key) DO "
+                "UPDATE SET depth = excluded.depth, score = excluded.score, "
+                "mateIn = excluded.mateIn, bound = excluded.bound, path = excluded.path, "
+                "used = excluded.used WHERE excluded.depth >= analysis.depth", rows)
+            self._db.executemany("UPDATE analysis SET used = ? WHERE key = ?", \
+                [(now, key) for key in self._used])
+            self._used = set()
+            count = self._db.execute("SELECT COUNT(*) FROM analysis").fetchone()[0]
+            if count > self._capacity:
+                keep = max(1, int(self._capacity * EVICT_TO))
+                self._db.execute("DELETE FROM analysis WHERE key IN (SELECT key FROM "
+                    "analysis ORDER BY used LIMIT ?)", (count - keep,))
+
+    def close(self):
+        self._db.close()
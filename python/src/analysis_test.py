@@ -0,0 +1,26 @@
+import os
+import tempfile
+import unittest
+from analysis import AnalysisCache
+from bitboard import BitBoard, STARTING_FEN
+from boards import BOARDS
+from fuzz_board import START_FENS
+
+class TestAnalysisCache(unittest.TestCase):
+    def test_analysisCache(self):
+        with tempfile.TemporaryDirectory() as directory:
+            cache = AnalysisCache(os.path.join(directory, "analysis.db"))
+            start = BitBoard.createFromFen(STARTING_FEN)
+            cache.store([(start, 3, 20, 11, 0, "e2e4 e7e5")])
+            cache.store([(start, 2, 10, 11, 0, "d2d4 d7d5")])
+            # The deeper entry stays, and every backend finds it.
+            for board in BOARDS.values():
+                self.assertEqual(cache.probe(board.createFromFen(STARTING_FEN)), \
+                    (3, 20, 11, 0, "e2e4 e7e5"))
+            cache.resize(0)
+            cache.store([(BitBoard.createFromFen(fen), 1, 0, 1, 0, "") for fen in START_FENS])
+            self.assertEqual(len(cache), 1)
+            cache.close()
+
+if __name__ == "__main__":
+    unittest.main()
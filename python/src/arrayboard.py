@@ -1,27 +1,25 @@
 """
-Chess board implemented using a simple 2D array of strings. Very efficient. I
-know...
-
-Benchmarks:
- - PC (Ryzen 5 3600 @ 3.6 GHz, 16GB RAM)
-    boardInitialization: 12.857µs
-    startposMoves(50):    3.023ms
-    startposMoves(100):   6.035ms
-    computeLegalMoves():  5.236µs
-
- - Lenovo P1G4 (i7-11850H, 32GB RAM)
-    boardInitialization: 10.040400000434602µs
-    startposMoves(50): 2.1606331000002683ms
-    startposMoves(100): 4.414085200001864ms
+Chess board implemented using a simple flat array of 64 one-character strings,
+a8 first and h1 last, " " for an empty square. It is slow next to BitBoard,
+but it's easy to read, so it serves as the reference we cross-check BitBoard
+against (see boards.py and fuzz_board.py).
+
+Moves are BitBoard move ints. makeMove() returns a new board (a shallow copy
+of the 64 squares), and pushMove()/popMove() make and unmake a move in place,
+which is what the legality checks use, so nothing is deep copied anywhere.
+
+python benchmark_board.py --board array times it on your machine.
 """
-from copy import deepcopy
+from bitboard import BitBoard, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, \
+    PIECE_STRING, DEST_SQ, PROMO_PIECE, MOVE_SQ_MASK, MOVE_PIECE_MASK, \
+    CAPTURE, CASTLE, PROMOTION
 
 BOARD_SIZE = 8
+BOARD_SQUARES = BOARD_SIZE * BOARD_SIZE
 ROOK_DIRS = [(-1,0),(1,0),(0,-1),(0,1)]
 BISHOP_DIRS = [(-1,-1),(-1,1),(1,-1),(1,1)]
 KNIGHT_DIRS = [(-2,-1),(-2,1),(2,-1),(2,1),(-1,-2),(-1,2),(1,-2),(1,2)]
 ROYAL_DIRS = [(-1,-1),(-1,0),(-1,1),(0,-1),(0,1),(1,-1),(1,0),(1,1)]
-CASTLE_MOVES = {"e1g1":(7,7), "e8g8":(0,7), "e1c1":(7,0), "e8c8":(0,0)}
 
 def colToFile(colNum):
     col = int(colNum) if type(colNum) == str else colNum
@@ -46,28 +44,91 @@ def outOfBounds(coord):
     return coord[0] < 0 or coord[0] > 7 or coord[1] < 0 or coord[1] > 7
 
 def findPiece(piece, board):
+    return board.index(piece) if piece in board else None
+
+def squareRays(directions):
+    """ For every square, the squares along each direction, nearest first. """
+    rays = []
+    for square in range(BOARD_SQUARES):
+        squareRays = []
+        for d in directions:
+            ray = []
+            tmp = (square // 8 + d[0], square % 8 + d[1])
+            while not outOfBounds(tmp):
+                ray.append(tmp[0] * 8 + tmp[1])
+                tmp = (tmp[0] + d[0], tmp[1] + d[1])
+            if len(ray) > 0:
+                squareRays.append(ray)
+        rays.append(squareRays)
+    return rays
+
+def squareSteps(directions):
+    """ For every square, the squares one step away in each direction. """
+    return [[ray[0] for ray in rays] for rays in squareRays(directions)]
+
+def fenRows(squares):
+    """ The board part of a FEN from 64 piece letters, " " for empty. """
+    rows = []
     for r in range(BOARD_SIZE):
-        for c in range(BOARD_SIZE):
-            if board[r][c] == piece:
-                return (r,c)
+        row = ""
+        empties = 0
+        for piece in squares[r * 8:r * 8 + 8]:
+            if piece == " ":
+                empties += 1
+                continue
+            row += (str(empties) if empties else "") + piece
+            empties = 0
+        rows.append(row + (str(empties) if empties else ""))
+    return "/".join(rows)
+
+SQUARE_NAMES = [coordToAlgebraic((s // 8, s % 8)) for s in range(BOARD_SQUARES)]
+SQUARES = {name: s for s, name in enumerate(SQUARE_NAMES)}
+ROOK_RAYS = squareRays(ROOK_DIRS)
+BISHOP_RAYS = squareRays(BISHOP_DIRS)
+ROYAL_RAYS = squareRays(ROYAL_DIRS)
+KNIGHT_STEPS = squareSteps(KNIGHT_DIRS)
+KING_STEPS = squareSteps(ROYAL_DIRS)
+# The squares a white (black) pawn on each square captures on.
+WHITE_PAWN_TAKES = squareSteps([(-1,-1),(-1,1)])
+BLACK_PAWN_TAKES = squareSteps([(1,-1),(1,1)])
+
+# Piece letter to BitBoard piece: 8 for white | PAWN..KING.
+PIECE_CODES = {" ": 0}
+PIECE_CODES.update({PIECE_STRING[k]: k for k in range(PAWN, KING + 1)})
+PIECE_CODES.update({PIECE_STRING[k].upper(): 8 | k for k in range(PAWN, KING + 1)})
+PROMOTIONS = [QUEEN, ROOK, BISHOP, KNIGHT]
+
+# King destination when castling: (rook from, rook to).
+CASTLE_ROOKS = {62:(63,61), 6:(7,5), 58:(56,59), 2:(0,3)}
+# Castle right: (king from, king to, squares that must be empty, squares not
+# attacked).
+CASTLES = {"K":(60, 62, [61,62], [60,61,62]), "Q":(60, 58, [57,58,59], [58,59,60]),
+           "k":(4, 6, [5,6], [4,5,6]), "q":(4, 2, [1,2,3], [2,3,4])}
+# Castle rights as BitBoard's castle bits.
+CASTLE_BITS = {"k": 1, "q": 2, "K": 4, "Q": 8}
+# Moving from or capturing on a rook's home square loses that castle.
+ROOK_CASTLES = {63:"K", 56:"Q", 7:"k", 0:"q"}
 
 class Array2DBoard():
     def __init__(self, board, whiteToPlay, castles, enpassant):
         """
         Params:
+            board: a list of the 64 squares, a8 to h1, with the FEN letter of
+                   the piece on each, or " ".
             castles: a 0-4 length string matching the FEN specs.
             enpassant: a 2 length string of the algebraic square that a pawn
                        is allowed to en passant on to, if any are. If not, then
                        simply should be empty.
         """
         assert(isinstance(board, list))
-        assert(len(board) == BOARD_SIZE)
-        assert(len(board[0]) == BOARD_SIZE)
+        assert(len(board) == BOARD_SQUARES)
         self.board = board
         self.whiteToPlay = whiteToPlay
         self.castles = castles
         self.enpassant = enpassant
         self.legalMoves = None
+        # What popMove() needs to take back each pushMove().
+        self._undo = []
 
     def isOpponentPiece(self, piece):
         return piece.isupper() != self.whiteToPlay
@@ -75,232 +136,281 @@ class Array2DBoard():
     def createFromFen(fen):
         fenArr = fen.split(" ")
         whiteToPlay = True if fenArr[1] == "w" else False
-        board = [[" " for _ in range(BOARD_SIZE)] for _ in range(BOARD_SIZE)]
-        rows = fenArr[0].split("/")
-        for r in range(len(rows)):
-            empties = 0
-            for c in range(len(rows[r])):
-                if rows[r][c].isdigit():
-                    for cp in range(int(rows[r][c])):
-                        board[r][c + empties + cp] = " "
-                    empties += int(rows[r][c]) - 1
-                    continue
-                board[r][c + empties] = rows[r][c]
-        castles = fenArr[2]
-        enpassant = fenArr[3]
+        board = []
+        for c in fenArr[0].replace("/", ""):
+            board += [" "] * int(c) if c.isdigit() else [c]
+        # "-" means no castles or no en passant square; store those as "".
+        castles = fenArr[2].replace("-", "")
+        enpassant = fenArr[3].replace("-", "")
         return Array2DBoard(board, whiteToPlay, castles, enpassant)
 
-    def castleLogic(self, move, piece, board):
-        newCastles = self.castles
-        if piece.lower() == "k":
-            if move in CASTLE_MOVES.keys():
-                rook = CASTLE_MOVES[move]
-                board[rook[0]][rook[1]] = " "
-                newFile = 5 if rook[1] == 7 else 3
-                board[rook[0]][newFile] = "R" if self.whiteToPlay else "r"
-            # Even if not castling, moving king cancels all castle possibility.
-            newCastles = newCastles.replace("K" if self.whiteToPlay else "k", "")
-            newCastles = newCastles.replace("Q" if self.whiteToPlay else "q", "")
-
-        # If our rook moves, remove that castle possibility
-        if piece.lower() == "r":
-            if move[0] == "a":
-                newCastles = newCastles.replace("Q" if self.whiteToPlay else "q", "")
-            elif move[0] == "h":
-                newCastles = newCastles.replace("K" if self.whiteToPlay else "k", "")
-
-        # If we just took on a starting rook square, remove opponent's castle possibility
-        oppRank = "8" if self.whiteToPlay else "1"
-        if move[3] == oppRank:
-            if move[2] == "h":
-                newCastles = newCastles.replace("k" if self.whiteToPlay else "K", "")
-            elif move[2] == "a":
-                newCastles = newCastles.replace("q" if self.whiteToPlay else "Q", "")
-        return newCastles
+    def moveStr(move):
+        return BitBoard.moveStr(move)
+
+    """ ============= Board protocol (see boards.py) ======================= """
+    def toFen(self):
+        castles = "".join(c for c in "KQkq" if c in self.castles)
+        return "{} {} {} {} 0 1".format(fenRows(self.board), \
+            "w" if self.whiteToPlay else "b", castles or "-", self.enpassant or "-")
+
+    def copy(self):
+        """ The same position, without the move history or cached moves. """
+        return Array2DBoard(self.board[:], self.whiteToPlay, self.castles, self.enpassant)
+
+    def whiteToMove(self):
+        return self.whiteToPlay
 
+    def pieceAt(self, index):
+        return PIECE_CODES[self.board[index]]
+
+    def getCastles(self):
+        return sum(CASTLE_BITS[c] for c in self.castles)
+
+    def getEnpassant(self):
+        return SQUARES[self.enpassant] if self.enpassant else 0
+
+    def positionKey(self):
+        return ("".join(self.board), self.whiteToPlay, self.getCastles(), self.enpassant)
+
+    def activePieces(self):
+        whitePieces = []
+        blackPieces = []
+        for square, piece in enumerate(self.board):
+            if piece == " ":
+                continue
+            pieces = whitePieces if piece.isupper() else blackPieces
+            pieces.append((PIECE_CODES[piece] & 7, square))
+        return (whitePieces, blackPieces)
+
+    def isCheck(self):
+        return self.isSquareAttacked(findPiece("K" if self.whiteToPlay else "k", self.board))
+
+    """ ============= Making moves ========================================= """
     def makeMove(self, move):
         """
-        |move| should be a string of length 4 or 5 representing the piece to be
-        moved and its end location.
+        |move| is a move int, or a uci string of length 4 or 5 representing
+        the piece to be moved and its end location.
             <init file><init rank><dest file><dest rank>
+        Returns the new board; this one is left as it is.
         """
-        assert(type(move) == str)
-        assert(len(move) >= 4 and len(move) <= 5)
+        newBoard = self.copy()
+        newBoard.applyMove(move)
+        return newBoard
+
+    def pushMove(self, move):
+        """ Makes |move| on this board. popMove() takes it back. """
+        self._undo.append(self.applyMove(move))
+
+    def popMove(self):
+        origin, dest, piece, captured, capturedSquare, rook, castles, enpassant, \
+            legalMoves = self._undo.pop()
+        board = self.board
+        board[dest] = " "
+        board[capturedSquare] = captured
+        board[origin] = piece
+        if rook is not None:
+            rookFrom, rookTo = rook
+            board[rookFrom] = board[rookTo]
+            board[rookTo] = " "
+        self.whiteToPlay = not self.whiteToPlay
+        self.castles = castles
+        self.enpassant = enpassant
+        self.legalMoves = legalMoves
+
+    def applyMove(self, move):
+        """ Makes |move| in place, and returns what it takes to undo it. """
+        if isinstance(move, str):
+            assert(len(move) >= 4 and len(move) <= 5)
+            origin = SQUARES[move[0:2]]
+            dest = SQUARES[move[2:4]]
+            promo = PIECE_CODES[move[4]] if len(move) == 5 else 0
+        else:
+            origin = move & MOVE_SQ_MASK
+            dest = (move >> DEST_SQ) & MOVE_SQ_MASK
+            promo = (move >> PROMO_PIECE) & MOVE_PIECE_MASK
 
-        newBoard = deepcopy(self.board)
-        origin = algebraicToCoord(move[0:2])
-        piece = newBoard[origin[0]][origin[1]]
+        board = self.board
+        piece = board[origin]
 
         # Right now, keep the legality checks simple and just trust in the GUI
         # to send us legal moves only.
         if piece == " " or piece.isupper() != self.whiteToPlay:
-            print("Illegal move: " + move)
+            print("Illegal move: " + (move if isinstance(move, str) else BitBoard.moveStr(move)))
             self.prettyPrint()
-        newBoard[origin[0]][origin[1]] = " "
-
-        newCastles = self.castleLogic(move, piece, newBoard)
-
-        # Pawn promotion logic
-        if piece.lower() == "p" and move[3] in "18":
-            if len(move) == 5:
-                piece = move[4].upper() if self.whiteToPlay else move[4].lower()
-            else:
-                piece = "Q" if self.whiteToPlay else "q"
-
-        # En passant logic
-        dest = algebraicToCoord(move[2:4])
-        if piece.lower() == "p" and move[2:4] == self.enpassant: # Capture
-            # captured piece is on same rank as origin, and same file as dest.
-            captured = algebraicToCoord(move[2] + move[1])
-            newBoard[captured[0]][captured[1]] = " "
+
+        captured = board[dest]
+        capturedSquare = dest
+        rook = None
+        newPiece = piece
         newEnpassant = ""
-        if piece.lower() == "p" and move[1] in "27" and move[3] in "45":
-            epRank = "3" if self.whiteToPlay else "6"
-            newEnpassant = move[0] + epRank
+        kind = piece.lower()
+        if kind == "p":
+            if SQUARE_NAMES[dest] == self.enpassant:
+                # captured piece is on same rank as origin, and same file as dest.
+                capturedSquare = origin - origin % 8 + dest % 8
+                captured = board[capturedSquare]
+                board[capturedSquare] = " "
+            elif abs(dest - origin) == 16:
+                newEnpassant = SQUARE_NAMES[(origin + dest) // 2]
+            # Pawn promotion logic
+            if dest < 8 or dest >= 56:
+                promotion = PIECE_STRING[promo if promo else QUEEN]
+                newPiece = promotion.upper() if self.whiteToPlay else promotion
+        elif kind == "k" and abs(dest - origin) == 2:
+            rook = CASTLE_ROOKS[dest]
+            board[rook[1]] = board[rook[0]]
+            board[rook[0]] = " "
+        board[origin] = " "
+        board[dest] = newPiece
+
+        castles = self.castles
+        if len(castles) > 0:
+            # Even if not castling, moving king cancels all castle possibility.
+            if kind == "k":
+                castles = castles.replace("K" if self.whiteToPlay else "k", "")
+                castles = castles.replace("Q" if self.whiteToPlay else "q", "")
+            castles = castles.replace(ROOK_CASTLES.get(origin, "-"), "")
+            castles = castles.replace(ROOK_CASTLES.get(dest, "-"), "")
+
+        undo = (origin, dest, piece, captured, capturedSquare, rook, self.castles, \
+                self.enpassant, self.legalMoves)
+        self.whiteToPlay = not self.whiteToPlay
+        self.castles = castles
+        self.enpassant = newEnpassant
+        self.legalMoves = None
+        return undo
 
-        newBoard[dest[0]][dest[1]] = piece
-        return Array2DBoard(newBoard, not self.whiteToPlay, newCastles, newEnpassant)
+    """ ============= Legal moves ========================================== """
+    def legalMovesForLinearMover(self, piece, square, rays):
+        moves = []
+        white = piece.isupper()
+        srcPiece = PIECE_CODES[piece]
+        board = self.board
+        for ray in rays[square]:
+            for tmp in ray:
+                target = board[tmp]
+                if target == " ":
+                    moves.append(BitBoard.constructMove(square, tmp, srcPiece))
+                    continue
+                if target.isupper() != white:
+                    moves.append(BitBoard.constructMove(square, tmp, srcPiece, \
+                        PIECE_CODES[target], CAPTURE))
+                break
+        return moves
 
-    def legalMovesForLinearMover(self, piece, coord, directions):
+    def legalMovesForStepper(self, piece, square, steps):
         moves = []
-        init = coordToAlgebraic((coord[0], coord[1]))
-        for d in directions:
-            tmp = (coord[0] + d[0], coord[1] + d[1])
-            while not outOfBounds(tmp) and self.board[tmp[0]][tmp[1]] == " ":
-                moves.append(init + coordToAlgebraic(tmp))
-                tmp = (tmp[0] + d[0], tmp[1] + d[1])
-            if not outOfBounds(tmp) and areEnemies(self.board[tmp[0]][tmp[1]], piece):
-                moves.append(init + coordToAlgebraic(tmp))
+        white = piece.isupper()
+        srcPiece = PIECE_CODES[piece]
+        for tmp in steps[square]:
+            target = self.board[tmp]
+            if target == " ":
+                moves.append(BitBoard.constructMove(square, tmp, srcPiece))
+            elif target.isupper() != white:
+                moves.append(BitBoard.constructMove(square, tmp, srcPiece, \
+                    PIECE_CODES[target], CAPTURE))
         return moves
 
-    def legalMovesForPawn(self, piece, coord):
+    def legalMovesForPawn(self, piece, square):
         moves = []
-        init = coordToAlgebraic((coord[0], coord[1]))
-        forward = -1 if self.whiteToPlay else 1
+        forward = -8 if self.whiteToPlay else 8
+        takes = WHITE_PAWN_TAKES if self.whiteToPlay else BLACK_PAWN_TAKES
 
         # Diagonal take logic
-        diagonalTakes = [(coord[0] + forward, coord[1] - 1), \
-                         (coord[0] + forward, coord[1] + 1)]
-        for diag in diagonalTakes:
-            if outOfBounds(diag):
-                continue
-            destPiece = self.board[diag[0]][diag[1]]
+        for diag in takes[square]:
+            destPiece = self.board[diag]
             if destPiece != " " and areEnemies(piece, destPiece):
-                if diag[0] in [0, 7]:  # pawn promotion
-                    [moves.append(init + coordToAlgebraic(diag) + p) for p in "qrbn"]
+                if diag < 8 or diag >= 56:  # pawn promotion
+                    moves += [BitBoard.constructMove(square, diag, PAWN, \
+                        PIECE_CODES[destPiece], CAPTURE | PROMOTION, p) for p in PROMOTIONS]
                 else:
-                    moves.append(init + coordToAlgebraic(diag))
-                continue
-            enPassant = coordToAlgebraic(diag)
-            if enPassant == self.enpassant:
-                moves.append(init + self.enpassant)
+                    moves.append(BitBoard.constructMove(square, diag, PAWN, \
+                        PIECE_CODES[destPiece], CAPTURE))
+            elif SQUARE_NAMES[diag] == self.enpassant:
+                moves.append(BitBoard.constructMove(square, diag, PAWN, PAWN, CAPTURE))
 
         # Single step forward logic
-        oneStep = (coord[0] + forward, coord[1])
-        if outOfBounds(oneStep) or self.board[oneStep[0]][oneStep[1]] != " ":
+        oneStep = square + forward
+        if oneStep < 0 or oneStep >= BOARD_SQUARES or self.board[oneStep] != " ":
             return moves
-        if oneStep[0] in [0, 7]: # pawn promotion
-            [moves.append(init + coordToAlgebraic(oneStep) + p) for p in "qrbn"]
+        if oneStep < 8 or oneStep >= 56: # pawn promotion
+            moves += [BitBoard.constructMove(square, oneStep, PAWN, 0, PROMOTION, p) \
+                for p in PROMOTIONS]
         else:
-            moves.append(init + coordToAlgebraic(oneStep))
+            moves.append(BitBoard.constructMove(square, oneStep, PAWN))
 
         # Double step forward logic
         baseRow = 6 if self.whiteToPlay else 1
-        if coord[0] != baseRow:
+        if square // 8 != baseRow:
             return moves
-        doubleStep = (coord[0] + forward * 2, coord[1])
-        if self.board[doubleStep[0]][doubleStep[1]] == " ":
-            moves.append(init + coordToAlgebraic(doubleStep))
+        doubleStep = oneStep + forward
+        if self.board[doubleStep] == " ":
+            moves.append(BitBoard.constructMove(square, doubleStep, PAWN))
         return moves
 
-
-    def legalMovesForPiece(self, piece, coord):
-        init = coordToAlgebraic((coord[0], coord[1]))
-        if piece.lower() == "p": # Pawns
-            return self.legalMovesForPawn(piece, coord)
-        elif piece.lower() == "r": # Rooks
-            return self.legalMovesForLinearMover(piece, coord, ROOK_DIRS)
-        elif piece.lower() == "b": # Bishops
-            return self.legalMovesForLinearMover(piece, coord, BISHOP_DIRS)
-        elif piece.lower() == "n": # Knights
-            moves = []
-            for d in KNIGHT_DIRS:
-                tmp = (coord[0] + d[0], coord[1] + d[1])
-                if outOfBounds(tmp):
-                    continue
-                targetPiece = self.board[tmp[0]][tmp[1]]
-                if targetPiece == " " or areEnemies(targetPiece, piece):
-                    moves.append(init + coordToAlgebraic(tmp))
-            return moves
-        elif piece.lower() == "q":  # Queens
-            return self.legalMovesForLinearMover(piece, coord, ROYAL_DIRS)
-        elif piece.lower() == "k":  # Kings
-            moves = []
-            for d in ROYAL_DIRS:
-                tmp = (coord[0] + d[0], coord[1] + d[1])
-                if outOfBounds(tmp):
-                    continue
-                targetPiece = self.board[tmp[0]][tmp[1]]
-                if targetPiece == " " or areEnemies(targetPiece, piece):
-                    moves.append(init + coordToAlgebraic(tmp))
-            return moves
+    def legalMovesForPiece(self, piece, square):
+        """ The pseudo-legal moves, which may leave our king in check. """
+        kind = piece.lower()
+        if kind == "p": # Pawns
+            return self.legalMovesForPawn(piece, square)
+        elif kind == "r": # Rooks
+            return self.legalMovesForLinearMover(piece, square, ROOK_RAYS)
+        elif kind == "b": # Bishops
+            return self.legalMovesForLinearMover(piece, square, BISHOP_RAYS)
+        elif kind == "n": # Knights
+            return self.legalMovesForStepper(piece, square, KNIGHT_STEPS)
+        elif kind == "q":  # Queens
+            return self.legalMovesForLinearMover(piece, square, ROYAL_RAYS)
+        elif kind == "k":  # Kings
+            return self.legalMovesForStepper(piece, square, KING_STEPS)
         raise Exception("unknown piece on the board: " + piece)
 
-    def isSquareAttackedByPiece(self, board, coord, directions, pieces):
-        # multiStep means that |pieces| can move multiple tiles in one move. All
-        # except the King, Pawns and Knights are regarded as multistep.
-        multiStep = any([p in pieces for p in "rbq"])
-
-        for d in directions:
-            tmp = (coord[0] + d[0], coord[1] + d[1])
-            while multiStep and not outOfBounds(tmp) and board[tmp[0]][tmp[1]] == " ":
-                tmp = (tmp[0] + d[0], tmp[1] + d[1])
-            if outOfBounds(tmp):
-                continue
-            piece = board[tmp[0]][tmp[1]]
-            if piece.lower() in pieces and self.isOpponentPiece(piece):
-                return True
+    def isSquareAttackedByPiece(self, square, rays, pieces):
+        """ Is a piece in |pieces| the first one along any of |rays|? """
+        board = self.board
+        for ray in rays[square]:
+            for tmp in ray:
+                if board[tmp] != " ":
+                    if board[tmp] in pieces:
+                        return True
+                    break
         return False
 
-    def isSquareAttacked(self, board, coord):
-        # Check for enemy knights
-        if self.isSquareAttackedByPiece(board, coord, KNIGHT_DIRS, "n") or \
-                self.isSquareAttackedByPiece(board, coord, ROOK_DIRS, "rq") or \
-                self.isSquareAttackedByPiece(board, coord, BISHOP_DIRS, "bq") or \
-                self.isSquareAttackedByPiece(board, coord, ROYAL_DIRS, "k"):
+    def isSquareAttacked(self, square, byWhite=None):
+        """ By the side not to move, unless |byWhite| says otherwise. """
+        if byWhite is None:
+            byWhite = not self.whiteToPlay
+        board = self.board
+        knight, bishop, rook, queen, king, pawn = "NBRQKP" if byWhite else "nbrqkp"
+        # A white pawn attacks us from where a black pawn here would take.
+        pawnTakes = BLACK_PAWN_TAKES if byWhite else WHITE_PAWN_TAKES
+        if any(board[tmp] == pawn for tmp in pawnTakes[square]) or \
+                any(board[tmp] == knight for tmp in KNIGHT_STEPS[square]) or \
+                any(board[tmp] == king for tmp in KING_STEPS[square]):
             return True
-        # Check for enemy pawns
-        forward = -1 if self.whiteToPlay else 1
-        diagonalTakes = [(coord[0] + forward, coord[1] + 1), \
-                        (coord[0] + forward, coord[1] - 1)]
-        for diag in diagonalTakes:
-            if outOfBounds(diag):
-                continue
-            piece = board[diag[0]][diag[1]]
-            if piece.lower() == "p" and self.isOpponentPiece(piece):
-                return True
-        return False
+        return self.isSquareAttackedByPiece(square, ROOK_RAYS, rook + queen) or \
+            self.isSquareAttackedByPiece(square, BISHOP_RAYS, bishop + queen)
 
     def isKingSafeAfterMove(self, move):
         king = "K" if self.whiteToPlay else "k"
-        newBoard = self.makeMove(move).board
-        return not self.isSquareAttacked(newBoard, findPiece(king, newBoard))
+        self.pushMove(move)
+        # The opponent is to move now.
+        safe = not self.isSquareAttacked(findPiece(king, self.board), self.whiteToPlay)
+        self.popMove()
+        return safe
 
     def legalCastleMoves(self):
-        legalCastles = {"Q":"e1c1", "K":"e1g1", "q":"e8c8", "k":"e8g8"}
         moves = []
         for c in self.castles:
             if self.isOpponentPiece(c):
                 continue
-            row = 7 if self.whiteToPlay else 0
+            origin, dest, empties, unattacked = CASTLES[c]
             # if the squares between the king and rook are empty
-            empties = [5,6] if c.lower() == "k" else [1,2,3]
-            unattacked = [4,5,6] if c.lower() == "k" else [2,3,4]
-            if any([self.board[row][col] != " " for col in empties]):
+            if any([self.board[s] != " " for s in empties]):
                 continue
-            if any([self.isSquareAttacked(self.board, (row, col)) for col in unattacked]):
+            if any([self.isSquareAttacked(s) for s in unattacked]):
                 continue
-            moves.append(legalCastles[c])
+            moves.append(BitBoard.constructMove(origin, dest, KING, 0, CASTLE))
         return moves
 
     def getLegalMoves(self):
@@ -313,28 +423,22 @@ class Array2DBoard():
         if self.legalMoves is not None:
             return
         allPieces = []
-        for r in range(len(self.board)):
-            for c in range(len(self.board[r])):
-                piece = self.board[r][c]
-                if piece == " ":
-                    continue
-                if piece.isupper() and self.whiteToPlay:
-                    allPieces.append((piece, r, c))
-                elif piece.islower() and not self.whiteToPlay:
-                    allPieces.append((piece, r, c))
+        for square, piece in enumerate(self.board):
+            if piece == " ":
+                continue
+            if piece.isupper() == self.whiteToPlay:
+                allPieces.append((piece, square))
         legalMoves = []
-        for piece, r, c in allPieces:
+        for piece, square in allPieces:
             legalMoves += filter(self.isKingSafeAfterMove, \
-                            self.legalMovesForPiece(piece, (r, c)))
+                            self.legalMovesForPiece(piece, square))
         legalMoves += self.legalCastleMoves()
         self.legalMoves = legalMoves
 
     def isCheckMate(self):
-        king = "K" if self.whiteToPlay else "k"
-        return len(self.legalMoves) == 0 and \
-            self.isSquareAttacked(self.board, findPiece(king, self.board))
+        return len(self.getLegalMoves()) == 0 and self.isCheck()
 
     def prettyPrint(self):
         print(" _ _ _ _ _ _ _ _")
-        for row in self.board:
-            print ("|" + "|".join(row) + "|")
+        for r in range(BOARD_SIZE):
+            print ("|" + "|".join(self.board[r * 8:r * 8 + 8]) + "|")
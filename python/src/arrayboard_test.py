@@ -0,0 +1,20 @@
+import unittest
+from arrayboard import Array2DBoard
+from perft import PERFT_SUITE
+
+class TestArray2DBoard(unittest.TestCase):
+    def test_arrayPushPop(self):
+        for _, fen, _ in PERFT_SUITE:
+            board = Array2DBoard.createFromFen(fen)
+            before = (board.board[:], board.whiteToPlay, board.castles, board.enpassant)
+            for move in board.getLegalMoves():
+                after = board.makeMove(move)
+                board.pushMove(move)
+                self.assertEqual((board.board, board.castles, board.enpassant), \
+                    (after.board, after.castles, after.enpassant), move)
+                board.popMove()
+                self.assertEqual((board.board, board.whiteToPlay, board.castles, \
+                    board.enpassant), before, move)
+
+if __name__ == "__main__":
+    unittest.main()
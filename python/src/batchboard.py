@@ -0,0 +1,532 @@
+"""
+Batch move generation: many independent positions at once, for book building,
+data generation and perft at scale, where one Python board at a time is the
+bottleneck.
+
+BoardBatch holds N positions as NumPy uint64 piece sets, one per (colour,
+piece type), bit i being BitBoard's square i (a8 = 0). Attack sets, legal
+moves and legal move counts for all N come out of whole-array shifts and
+masks; sliders use Kogge-Stone occluded fills, so a ray costs three
+shift-and-mask steps however long it is. Moves are generated pseudo-legally,
+then every candidate is made on its occupancy at once and kept if its own king
+is not attacked afterwards, which covers pins, en passant discoveries and king
+moves alike. makeMoves() builds the batch of all the children, which is all
+perft needs.
+
+    python batchboard.py bench [--positions 20000] [--scalar 500] [--seed 1]
+    python batchboard.py perft [--depth 3] [--fen "<fen>"]
+
+"bench" plays random games to collect positions, then reports positions/sec
+for the batch against every scalar backend (boards.BOARDS), checking that the
+legal move counts agree. "perft" runs the perft suite (or one FEN) as a
+single batch. Needs NumPy 2 (np.bitwise_count).
+"""
+import argparse
+import random
+import sys
+import time
+
+import numpy as np
+
+from bitboard import PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, PIECE_STRING, \
+    SRC_PIECE, DEST_SQ, DEST_PIECE, PROMO_PIECE, MOVE_META, CAPTURE, CASTLE, PROMOTION
+from boards import BOARDS
+
+BLACK = 0
+WHITE = 1
+NUM_TYPES = KING + 1
+# Positions per sub-batch in perft, to bound memory.
+CHUNK = 20000
+
+ZERO = np.uint64(0)
+ONE = np.uint64(1)
+def bitMask(squares):
+    return np.uint64(sum(1 << s for s in squares))
+
+FULL = bitMask(range(64))
+NOT_A = bitMask(s for s in range(64) if s % 8 != 0)
+NOT_H = bitMask(s for s in range(64) if s % 8 != 7)
+NOT_AB = bitMask(s for s in range(64) if s % 8 > 1)
+NOT_GH = bitMask(s for s in range(64) if s % 8 < 6)
+RANK_6 = bitMask(range(16, 24))
+RANK_3 = bitMask(range(40, 48))
+SQUARE_BITS = np.array([1 << s for s in range(64)], dtype=np.uint64)
+
+# (square delta, squares a step may land on without wrapping around a file).
+NORTH, SOUTH, EAST, WEST = (-8, FULL), (8, FULL), (1, NOT_A), (-1, NOT_H)
+NORTH_EAST, NORTH_WEST, SOUTH_EAST, SOUTH_WEST = (-7, NOT_A), (-9, NOT_H), (9, NOT_A), (7, NOT_H)
+ROOK_DIRECTIONS = [NORTH, SOUTH, EAST, WEST]
+BISHOP_DIRECTIONS = [NORTH_EAST, NORTH_WEST, SOUTH_EAST, SOUTH_WEST]
+KNIGHT_JUMPS = [(-17, NOT_H), (-15, NOT_A), (-10, NOT_GH), (-6, NOT_AB),
+                (6, NOT_GH), (10, NOT_AB), (15, NOT_H), (17, NOT_A)]
+PROMOTIONS = np.array([QUEEN, ROOK, BISHOP, KNIGHT], dtype=np.int64)
+
+# (castle bit, side, king from, king to, rook from, rook to, squares that
+# must be empty, squares not attacked), with BitBoard's castle bits.
+CASTLES = [(4, WHITE, 60, 62, 63, 61, bitMask([61, 62]), bitMask([60, 61, 62])),
+           (8, WHITE, 60, 58, 56, 59, bitMask([57, 58, 59]), bitMask([58, 59, 60])),
+           (1, BLACK, 4, 6, 7, 5, bitMask([5, 6]), bitMask([4, 5, 6])),
+           (2, BLACK, 4, 2, 0, 3, bitMask([1, 2, 3]), bitMask([2, 3, 4]))]
+CASTLE_LETTERS = [(4, "K"), (8, "Q"), (1, "k"), (2, "q")]
+
+def castleKeeps():
+    """ The castle rights kept when a move leaves or lands on each square. """
+    keeps = np.full(64, 15, dtype=np.uint8)
+    for square, lost in ((60, 12), (4, 3), (63, 4), (56, 8), (7, 1), (0, 2)):
+        keeps[square] = 15 ^ lost
+    return keeps
+
+CASTLE_KEEPS = castleKeeps()
+
+
+""" ============= Set operations ========================================= """
+def shift(sets, delta):
+    return sets << np.uint64(delta) if delta > 0 else sets >> np.uint64(-delta)
+
+def step(sets, direction):
+    delta, mask = direction
+    return shift(sets, delta) & mask
+
+def slide(sets, empty, direction):
+    """ The squares |sets| attack along |direction| through |empty| squares. """
+    delta, mask = direction
+    empty = empty & mask
+    sets = sets | (empty & shift(sets, delta))
+    empty = empty & shift(empty, delta)
+    sets = sets | (empty & shift(sets, 2 * delta))
+    empty = empty & shift(empty, 2 * delta)
+    sets = sets | (empty & shift(sets, 4 * delta))
+    return step(sets, direction)
+
+def knightAttacks(sets):
+    attacks = np.zeros_like(sets)
+    for jump in KNIGHT_JUMPS:
+        attacks |= step(sets, jump)
+    return attacks
+
+def kingAttacks(sets):
+    attacks = np.zeros_like(sets)
+    for direction in ROOK_DIRECTIONS + BISHOP_DIRECTIONS:
+        attacks |= step(sets, direction)
+    return attacks
+
+def pawnAttacks(sets, white):
+    """ |white| is a bool array: which way each position's pawns take. """
+    whites = np.where(white, sets, ZERO)
+    blacks = sets ^ whites
+    return step(whites, NORTH_EAST) | step(whites, NORTH_WEST) | \
+        step(blacks, SOUTH_EAST) | step(blacks, SOUTH_WEST)
+
+def attackSets(pieces, white, occupied):
+    """
+    Every square attacked by |pieces|, a (NUM_TYPES, N) array of piece sets
+    whose colour is |white|, with |occupied| blocking the sliders.
+    """
+    empty = ~occupied
+    attacks = pawnAttacks(pieces[PAWN], white) | knightAttacks(pieces[KNIGHT]) | \
+        kingAttacks(pieces[KING])
+    rooks = pieces[ROOK] | pieces[QUEEN]
+    bishops = pieces[BISHOP] | pieces[QUEEN]
+    for direction in ROOK_DIRECTIONS:
+        attacks |= slide(rooks, empty, direction)
+    for direction in BISHOP_DIRECTIONS:
+        attacks |= slide(bishops, empty, direction)
+    return attacks
+
+def bitSquares(sets):
+    """ (index, square) of every set bit of the uint64 array |sets|. """
+    index = np.nonzero(sets)[0]
+    bits = sets[index]
+    indices, squares = [], []
+    while len(bits):
+        lsb = bits & (~bits + ONE)
+        indices.append(index)
+        squares.append(np.bitwise_count(lsb - ONE).astype(np.int64))
+        bits = bits ^ lsb
+        left = bits != 0
+        index, bits = index[left], bits[left]
+    if not indices:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64)
+    return np.concatenate(indices), np.concatenate(squares)
+
+
+class BoardBatch:
+    def __init__(self, pieces, white, castles, enpassant):
+        """
+        Params:
+            pieces: uint64 array of shape (2, NUM_TYPES, N), the set of squares
+                    each (colour, piece type) is on; type 0 is unused.
+            white: bool array, whether white is to move.
+            castles: uint8 array of BitBoard's castle bits.
+            enpassant: int64 array, the en passant square or 0 if none.
+        """
+        self.pieces = pieces
+        self.white = white
+        self.castles = castles
+        self.enpassant = enpassant
+        self._moves = None
+
+    def createFromFens(fens):
+        types = {PIECE_STRING[t]: t for t in range(PAWN, KING + 1)}
+        pieces, white, castles, enpassant = [], [], [], []
+        for fen in fens:
+            fenArr = fen.split(" ")
+            sets = [[0] * NUM_TYPES, [0] * NUM_TYPES]
+            square = 0
+            for c in fenArr[0].replace("/", ""):
+                if c.isdigit():
+                    square += int(c)
+                    continue
+                sets[c.isupper()][types[c.lower()]] |= 1 << square
+                square += 1
+            pieces.append(sets)
+            white.append(fenArr[1] == "w")
+            castles.append(sum(bit for bit, c in CASTLE_LETTERS if c in fenArr[2]))
+            ep = fenArr[3]
+            enpassant.append((8 - int(ep[1])) * 8 + "abcdefgh".index(ep[0]) if ep != "-" else 0)
+        return BoardBatch(np.array(pieces, dtype=np.uint64).reshape(-1, 2, NUM_TYPES).transpose(1, 2, 0).copy(), \
+            np.array(white, dtype=bool), np.array(castles, dtype=np.uint8), \
+            np.array(enpassant, dtype=np.int64))
+
+    def fromBoards(boards):
+        """ A batch of any boards.BOARDS boards. """
+        return BoardBatch.createFromFens([board.toFen() for board in boards])
+
+    def __len__(self):
+        return len(self.white)
+
+    def select(self, indices):
+        """ The batch of the positions at |indices|, a slice or an index array. """
+        return BoardBatch(self.pieces[:, :, indices], self.white[indices], \
+            self.castles[indices], self.enpassant[indices])
+
+    def toFen(self, i):
+        letters = [" "] * 64
+        for colour in (BLACK, WHITE):
+            for t in range(PAWN, KING + 1):
+                bits = int(self.pieces[colour, t, i])
+                while bits:
+                    lsb = bits & -bits
+                    letters[lsb.bit_length() - 1] = \
+                        PIECE_STRING[t].upper() if colour == WHITE else PIECE_STRING[t]
+                    bits ^= lsb
+        rows = []
+        for r in range(8):
+            row = ""
+            empties = 0
+            for piece in letters[r * 8:r * 8 + 8]:
+                if piece == " ":
+                    empties += 1
+                    continue
+                row += (str(empties) if empties else "") + piece
+                empties = 0
+            rows.append(row + (str(empties) if empties else ""))
+        castles = "".join(c for bit, c in CASTLE_LETTERS if self.castles[i] & bit)
+        ep = int(self.enpassant[i])
+        enpassant = "abcdefgh"[ep % 8] + str(8 - ep // 8) if ep else "-"
+        return "{} {} {} {} 0 1".format("/".join(rows), "w" if self.white[i] else "b", \
+            castles or "-", enpassant)
+
+    """ ============= Attacks ============================================== """
+    def sides(self):
+        """ ((NUM_TYPES, N) piece sets of the side to move, same for the other side). """
+        index = np.arange(len(self))
+        us = self.white.astype(np.intp)
+        return self.pieces[us, :, index].T, self.pieces[1 - us, :, index].T
+
+    def occupied(self, colour=None):
+        pieces = self.pieces if colour is None else self.pieces[colour]
+        return np.bitwise_or.reduce(pieces.reshape(-1, len(self)), axis=0)
+
+    def attacks(self, white):
+        """ The squares attacked by white (black) pieces in every position. """
+        colour = WHITE if white else BLACK
+        return attackSets(self.pieces[colour], np.full(len(self), bool(white)), self.occupied())
+
+    def isCheck(self):
+        ours, theirs = self.sides()
+        return (attackSets(theirs, ~self.white, self.occupied()) & ours[KING]) != 0
+
+    """ ============= Legal moves ========================================== """
+    def pseudoLegalTargets(self, ours, theirs, occupied):
+        """
+        [(target sets, square delta)]: each entry's set bits are squares one
+        kind of piece can move to, from |delta| squares back.
+        """
+        own = np.bitwise_or.reduce(ours[1:], axis=0)
+        enemy = np.bitwise_or.reduce(theirs[1:], axis=0)
+        empty = ~occupied
+        targets = []
+
+        # Sliders step along each direction until blocked.
+        rooks = ours[ROOK] | ours[QUEEN]
+        bishops = ours[BISHOP] | ours[QUEEN]
+        for movers, directions in ((rooks, ROOK_DIRECTIONS), (bishops, BISHOP_DIRECTIONS)):
+            for direction in directions:
+                sets = movers
+                targets.append((step(ours[KING], direction) & ~own, direction[0]))
+                for distance in range(1, 8):
+                    sets = step(sets, direction)
+                    targets.append((sets & ~own, direction[0] * distance))
+                    sets &= empty
+                    if not sets.any():
+                        break
+        for jump in KNIGHT_JUMPS:
+            targets.append((step(ours[KNIGHT], jump) & ~own, jump[0]))
+
+        whites = np.where(self.white, ours[PAWN], ZERO)
+        blacks = ours[PAWN] ^ whites
+        takeable = enemy | np.where(self.enpassant != 0, SQUARE_BITS[self.enpassant], ZERO)
+        single = step(whites, NORTH) & empty
+        targets += [(single, -8), (step(single & RANK_3, NORTH) & empty, -16),
+                    (step(whites, NORTH_EAST) & takeable, -7),
+                    (step(whites, NORTH_WEST) & takeable, -9)]
+        single = step(blacks, SOUTH) & empty
+        targets += [(single, 8), (step(single & RANK_6, SOUTH) & empty, 16),
+                    (step(blacks, SOUTH_EAST) & takeable, 9),
+                    (step(blacks, SOUTH_WEST) & takeable, 7)]
+        return targets
+
+    def castleMoves(self, ours, theirs, occupied):
+        """ (positions, king from, king to) of the legal castles. """
+        attacked = attackSets(theirs, ~self.white, occupied)
+        positions, origins, dests = [], [], []
+        for bit, side, origin, dest, _, _, empties, unattacked in CASTLES:
+            legal = ((self.castles & bit) != 0) & (self.white == (side == WHITE)) & \
+                ((occupied & empties) == 0) & ((attacked & unattacked) == 0) & \
+                ((ours[KING] & SQUARE_BITS[origin]) != 0)
+            index = np.nonzero(legal)[0]
+            positions.append(index)
+            origins.append(np.full(len(index), origin))
+            dests.append(np.full(len(index), dest))
+        return np.concatenate(positions), np.concatenate(origins), np.concatenate(dests)
+
+    def generate(self):
+        """
+        The legal moves of every position, as a dict of arrays indexed by move:
+        pos, src, dest, kind (the piece type moved), captured (type, 0 for
+        none), capturedSquare, promo and castle. Sorted by position.
+        """
+        if self._moves is not None:
+            return self._moves
+        ours, theirs = self.sides()
+        occupied = self.occupied()
+
+        targets = self.pseudoLegalTargets(ours, theirs, occupied)
+        deltas = np.array([delta for _, delta in targets], dtype=np.int64)
+        flat, dest = bitSquares(np.concatenate([sets for sets, _ in targets]))
+        n = len(self)
+        pos = flat % n
+        src = dest - deltas[flat // n]
+        srcBits = SQUARE_BITS[src]
+        destBits = SQUARE_BITS[dest]
+
+        kind = np.zeros(len(pos), dtype=np.int64)
+        captured = np.zeros(len(pos), dtype=np.int64)
+        for t in range(PAWN, KING + 1):
+            kind[(ours[t][pos] & srcBits) != 0] = t
+            captured[(theirs[t][pos] & destBits) != 0] = t
+        enpassant = (kind == PAWN) & (dest == self.enpassant[pos]) & (self.enpassant[pos] != 0)
+        captured[enpassant] = PAWN
+        capturedSquare = np.where(enpassant, dest + np.where(self.white[pos], 8, -8), dest)
+
+        # Make every candidate on the occupancy, and keep it unless it leaves
+        # its own king attacked.
+        capturedBits = np.where(captured != 0, SQUARE_BITS[capturedSquare], ZERO)
+        afterOccupied = (occupied[pos] & ~srcBits & ~capturedBits) | destBits
+        king = np.where(kind == KING, destBits, ours[KING][pos])
+        enemy = theirs[:, pos] & ~capturedBits
+        attacked = (pawnAttacks(king, self.white[pos]) & enemy[PAWN]) | \
+            (knightAttacks(king) & enemy[KNIGHT]) | (kingAttacks(king) & enemy[KING])
+        empty = ~afterOccupied
+        for sliders, directions in ((enemy[ROOK] | enemy[QUEEN], ROOK_DIRECTIONS), \
+                                    (enemy[BISHOP] | enemy[QUEEN], BISHOP_DIRECTIONS)):
+            for direction in directions:
+                attacked |= slide(king, empty, direction) & sliders
+        legal = attacked == 0
+        pos, src, dest, kind, captured, capturedSquare = pos[legal], src[legal], \
+            dest[legal], kind[legal], captured[legal], capturedSquare[legal]
+
+        # Promotions become four moves each.
+        promoting = (kind == PAWN) & ((dest < 8) | (dest >= 56))
+        repeats = np.where(promoting, len(PROMOTIONS), 1)
+        promo = np.zeros(int(repeats.sum()), dtype=np.int64)
+        starts = np.cumsum(repeats) - repeats
+        for i, piece in enumerate(PROMOTIONS):
+            promo[starts[promoting] + i] = piece
+        pos, src, dest, kind, captured, capturedSquare = [np.repeat(a, repeats) \
+            for a in (pos, src, dest, kind, captured, capturedSquare)]
+
+        castlePos, castleSrc, castleDest = self.castleMoves(ours, theirs, occupied)
+        castling = len(castlePos)
+        moves = {"pos": np.concatenate([pos, castlePos]),
+                 "src": np.concatenate([src, castleSrc]),
+                 "dest": np.concatenate([dest, castleDest]),
+                 "kind": np.concatenate([kind, np.full(castling, KING)]),
+                 "captured": np.concatenate([captured, np.zeros(castling, dtype=np.int64)]),
+                 "capturedSquare": np.concatenate([capturedSquare, castleDest]),
+                 "promo": np.concatenate([promo, np.zeros(castling, dtype=np.int64)]),
+                 "castle": np.concatenate([np.zeros(len(pos), dtype=bool), \
+                                           np.ones(castling, dtype=bool)])}
+        order = np.argsort(moves["pos"], kind="stable")
+        self._moves = {name: values[order] for name, values in moves.items()}
+        return self._moves
+
+    def legalMoveCounts(self):
+        return np.bincount(self.generate()["pos"], minlength=len(self))
+
+    def legalMoves(self):
+        """
+        (positions, moves): for each legal move, the index of its position and
+        the move as a BitBoard move int (see boards.py), sorted by position.
+        """
+        m = self.generate()
+        meta = np.where(m["captured"] != 0, CAPTURE, 0) | \
+            np.where(m["promo"] != 0, PROMOTION, 0) | np.where(m["castle"], CASTLE, 0)
+        moves = meta << MOVE_META | m["promo"] << PROMO_PIECE | \
+            m["captured"] << DEST_PIECE | m["kind"] << SRC_PIECE | \
+            m["dest"] << DEST_SQ | m["src"]
+        return m["pos"], moves
+
+    def movesOf(self, i):
+        """ The legal moves of position |i| as a list of BitBoard move ints. """
+        positions, moves = self.legalMoves()
+        start, end = np.searchsorted(positions, [i, i + 1])
+        return [int(move) for move in moves[start:end]]
+
+    """ ============= Making moves ========================================= """
+    def makeMoves(self):
+        """
+        (parents, children): the batch of every legal move made, and the index
+        of the position each child came from.
+        """
+        m = self.generate()
+        pos, src, dest, kind = m["pos"], m["src"], m["dest"], m["kind"]
+        index = np.arange(len(pos))
+        us = self.white[pos].astype(np.intp)
+        them = 1 - us
+        pieces = self.pieces[:, :, pos]
+        srcBits = SQUARE_BITS[src]
+        destBits = SQUARE_BITS[dest]
+
+        # Type 0 is unused, so clearing "no capture" there is harmless.
+        pieces[them, m["captured"], index] &= ~SQUARE_BITS[m["capturedSquare"]]
+        pieces[us, kind, index] &= ~srcBits
+        pieces[us, np.where(m["promo"] != 0, m["promo"], kind), index] |= destBits
+        castling = np.nonzero(m["castle"])[0]
+        for _, _, _, kingTo, rookFrom, rookTo, _, _ in CASTLES:
+            rooks = castling[dest[castling] == kingTo]
+            pieces[us[rooks], ROOK, rooks] ^= SQUARE_BITS[rookFrom] | SQUARE_BITS[rookTo]
+
+        castles = self.castles[pos] & CASTLE_KEEPS[src] & CASTLE_KEEPS[dest]
+        double = (kind == PAWN) & (np.abs(dest - src) == 16)
+        enpassant = np.where(double, (src + dest) // 2, 0)
+        return pos, BoardBatch(pieces, ~self.white[pos], castles, enpassant)
+
+    def perft(self, depth, chunk=CHUNK):
+        """ The leaf count under each position, |chunk| positions at a time. """
+        if len(self) > chunk:
+            return np.concatenate([self.select(slice(i, i + chunk)).perft(depth, chunk) \
+                for i in range(0, len(self), chunk)])
+        if depth == 0:
+            return np.ones(len(self), dtype=np.int64)
+        if depth == 1:
+            return self.legalMoveCounts()
+        parents, children = self.makeMoves()
+        self._moves = None
+        counts = children.perft(depth - 1, chunk)
+        return np.bincount(parents, weights=counts, minlength=len(self)).astype(np.int64)
+
+
+""" ============= Tools ==================================================== """
+def randomPositions(count, seed):
+    """ FENs from random games, from the start position and the perft suite. """
+    from fuzz_board import START_FENS
+    rng = random.Random(seed)
+    boardType = BOARDS["mailbox"]
+    fens = []
+    while len(fens) < count:
+        board = boardType.createFromFen(START_FENS[len(fens) % len(START_FENS)])
+        for _ in range(rng.randint(0, 80)):
+            moves = board.getLegalMoves()
+            if not moves:
+                break
+            board.pushMove(rng.choice(moves))
+        fens.append(board.toFen())
+    return fens
+
+def bench(positions, scalar, seed):
+    fens = randomPositions(positions, seed)
+    print("{} positions from random games".format(len(fens)))
+
+    start = time.perf_counter()
+    batch = BoardBatch.createFromFens(fens)
+    loaded = time.perf_counter()
+    counts = batch.legalMoveCounts()
+    counted = time.perf_counter()
+    batch.attacks(True), batch.attacks(False)
+    attacked = time.perf_counter()
+    total = counts.sum()
+    print("{:<24} {:>14} {:>10}".format("", "positions/s", "ms"))
+    for name, seconds in [("batch createFromFens", loaded - start),
+                          ("batch legal moves", counted - loaded),
+                          ("batch attack sets", attacked - counted),
+                          ("batch total", attacked - start)]:
+        print("{:<24} {:>14.0f} {:>10.1f}".format(name, len(fens) / seconds, seconds * 1e3))
+
+    sample = fens[:scalar]
+    for name, boardType in BOARDS.items():
+        start = time.perf_counter()
+        scalarCounts = [len(boardType.createFromFen(fen).getLegalMoves()) for fen in sample]
+        seconds = time.perf_counter() - start
+        print("{:<24} {:>14.0f} {:>10.1f}".format("scalar " + name, len(sample) / seconds, \
+            seconds * 1e3))
+        if scalarCounts != counts[:len(sample)].tolist():
+            bad = next(i for i, c in enumerate(scalarCounts) if c != counts[i])
+            print("MISMATCH on {}: {} has {} moves, the batch {}".format( \
+                sample[bad], name, scalarCounts[bad], counts[bad]))
+            return False
+    print("{} legal moves; the counts agree on the first {} positions".format(total, len(sample)))
+    return True
+
+def perftSuite(depth, fen):
+    from perft import PERFT_SUITE
+    suite = [("fen", fen, None)] if fen else \
+        [(name, fen, counts) for name, fen, counts in PERFT_SUITE if len(counts) >= depth]
+    start = time.perf_counter()
+    counts = BoardBatch.createFromFens([fen for _, fen, _ in suite]).perft(depth)
+    seconds = time.perf_counter() - start
+    passed = True
+    for (name, _, expected), count in zip(suite, counts):
+        ok = expected is None or count == expected[depth - 1]
+        passed &= ok
+        print("{:<24} {:>10} {}".format(name, count, "yes" if ok else \
+            "NO, expected {}".format(expected[depth - 1])))
+    print("{} nodes in {:.2f}s, {:.0f} nodes/s".format(counts.sum(), seconds, \
+        counts.sum() / seconds))
+    return passed
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, \
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    benchParser = subparsers.add_parser("bench")
+    benchParser.add_argument("--positions", type=int, default=20000)
+    benchParser.add_argument("--scalar", type=int, default=500, \
+        help="positions timed on each scalar backend")
+    benchParser.add_argument("--seed", type=int, default=1)
+    perftParser = subparsers.add_parser("perft")
+    perftParser.add_argument("--depth", type=int, default=3)
+    perftParser.add_argument("--fen", default=None)
+    args = parser.parse_args()
+
+    if args.command == "bench":
+        passed = bench(args.positions, args.scalar, args.seed)
+    else:
+        passed = perftSuite(args.depth, args.fen)
+    sys.exit(0 if passed else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,19 @@
+import unittest
+from batchboard import BoardBatch
+from bitboard import BitBoard
+from boards import moveKey
+from perft import PERFT_SUITE
+
+class TestBoardBatch(unittest.TestCase):
+    def test_boardBatch(self):
+        fens = [fen for _, fen, _ in PERFT_SUITE]
+        batch = BoardBatch.createFromFens(fens)
+        self.assertEqual(batch.perft(2).tolist(), [counts[1] for _, _, counts in PERFT_SUITE])
+        for i, fen in enumerate(fens):
+            board = BitBoard.createFromFen(fen)
+            self.assertEqual(batch.toFen(i), board.toFen())
+            self.assertEqual(sorted(moveKey(m) for m in batch.movesOf(i)), \
+                sorted(moveKey(m) for m in board.getLegalMoves()), fen)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,60 +1,183 @@
-import timeit
-from arrayboard import Array2DBoard
-from bitboard import BitBoard
+"""
+Micro-benchmarks for the board backends: FEN parsing, makeMove, legal move
+generation, attack queries, evaluation and perft.
 
-STARTING_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+Every benchmark runs on every backend that supports it. Each is warmed up,
+then timed over several trials, and we report the median (and best) time per
+operation, and rank the backends side by side on each benchmark. Results can
+be saved as JSON and compared against a saved baseline; anything slower than
+the baseline by more than --threshold is flagged as a regression, and the
+exit status is 1.
 
-def benchmark(board):
-    moves50 = "h2h3 a7a6 e2e3 h7h5 d1e2 d7d6 e2h5 b7b6 h5d1 c8g4 f1d3 c7c5 f2f4 h8h5 h3g4 g7g5 e1f1 f8g7 h1h4 g7h8 f4g5 d8d7 g4h5 f7f5 h4h2 a8a7 d1g4 b8c6 c2c3 a7a8 d3c4 c6b4 c4e6 e8f8 d2d3 f8e8 e6f5 d7c6 g1f3 c6d5 g4f4 d5d4 f5h3 e7e6 b1d2 b4d5 h2h1 c5c4 f4f8 e8f8 f1g1 a6a5 a2a4 d5c3 g2g3 c4d3 h3f5 f8e7 f5h7 d4a4 g1f2 e7d8 h1f1 c3a2 b2b4 b6b5 f1e1 e6e5 f3d4 a4c2 e1f1 c2b3 g3g4 b3d5 h7e4 a5b4 e4h1 h8f6 d2b3 d8d7 h1d5 a8a5 f2g3 a2c1 g3h2 a5a8 f1h1 f6d8 h2g2 d8g5 h1e1 g5h6 a1a8 c1e2 d4e6 g8f6 a8a5 f6e8 e1d1".split()
-    moves100 = "h2h3 a7a6 e2e3 h7h5 d1e2 d7d6 e2h5 b7b6 h5d1 c8g4 f1d3 c7c5 f2f4 h8h5 h3g4 g7g5 e1f1 f8g7 h1h4 g7h8 f4g5 d8d7 g4h5 f7f5 h4h2 a8a7 d1g4 b8c6 c2c3 a7a8 d3c4 c6b4 c4e6 e8f8 d2d3 f8e8 e6f5 d7c6 g1f3 c6d5 g4f4 d5d4 f5h3 e7e6 b1d2 b4d5 h2h1 c5c4 f4f8 e8f8 f1g1 a6a5 a2a4 d5c3 g2g3 c4d3 h3f5 f8e7 f5h7 d4a4 g1f2 e7d8 h1f1 c3a2 b2b4 b6b5 f1e1 e6e5 f3d4 a4c2 e1f1 c2b3 g3g4 b3d5 h7e4 a5b4 e4h1 h8f6 d2b3 d8d7 h1d5 a8a5 f2g3 a2c1 g3h2 a5a8 f1h1 f6d8 h2g2 d8g5 h1e1 g5h6 a1a8 c1e2 d4e6 g8f6 a8a5 f6e8 e1d1 d3d2 d1g1 e2c1 g2f1 d2d1n d5a8 e5e4 f1g2 d6d5 g1e1 d7c8 g2g1 h6f4 a8d5 c8b8 d5e4 d1e3 e1d1 f4c7 h5h6 c7a5 b3a1 e8d6 e4c6 e3f5 d1f1 c1d3 g4g5 f5d4 e6c7 d6e8 f1f3 d4c2 c6d7 c2e1 f3d3 e8d6 c7b5 e1c2 d3f3 d6b5 d7b5 a5d8 g1h1 d8a5 f3g3 c2d4 g3h3 b8c8 g5g6 a5b6 h3b3 d4c6 b3d3 c6e7 d3d2 c8c7 d2f2 e7c6 f2f8 b6e3 f8f3 e3g1 f3g3 g1c5 h1h2 c6d4 g3e3 d4f5 h6h7 c5e7 b5d3 f5d4 h7h8b e7g5 e3e8 d4c2 e8g8 b4b3 g8a8 c7b6 h8f6 g5d2 a8a3 b6c5 a3a6 b3b2 h2g3 c2a3 a6b6 b2b1r d3f5 b1b5 g3h2 b5b4 f6h4 c5d5 h2g3 b4b5 f5h3".split()
+    python benchmark_board.py [--board all] [--trials 5] [--warmup 1]
+                              [--json out.json] [--baseline base.json]
+                              [--threshold 0.10]
+"""
+import argparse
+import json
+import platform
+import statistics
+import sys
+import time
+from alphabeta_bot import AlphaBetaEngine
+from bitboard import BitBoard, STARTING_FEN, TRICKY_FEN, KING
+from boards import BOARDS
+from perft import Perft
 
-    def perft(board, depth, maxDepth):
-        if depth == maxDepth:
-            return 1
+# A long random game, so makeMove sees captures, castles and promotions.
+GAME_MOVES = "h2h3 a7a6 e2e3 h7h5 d1e2 d7d6 e2h5 b7b6 h5d1 c8g4 f1d3 c7c5 f2f4 h8h5 h3g4 g7g5 e1f1 f8g7 h1h4 g7h8 f4g5 d8d7 g4h5 f7f5 h4h2 a8a7 d1g4 b8c6 c2c3 a7a8 d3c4 c6b4 c4e6 e8f8 d2d3 f8e8 e6f5 d7c6 g1f3 c6d5 g4f4 d5d4 f5h3 e7e6 b1d2 b4d5 h2h1 c5c4 f4f8 e8f8 f1g1 a6a5 a2a4 d5c3 g2g3 c4d3 h3f5 f8e7 f5h7 d4a4 g1f2 e7d8 h1f1 c3a2 b2b4 b6b5 f1e1 e6e5 f3d4 a4c2 e1f1 c2b3 g3g4 b3d5 h7e4 a5b4 e4h1 h8f6 d2b3 d8d7 h1d5 a8a5 f2g3 a2c1 g3h2 a5a8 f1h1 f6d8 h2g2 d8g5 h1e1 g5h6 a1a8 c1e2 d4e6 g8f6 a8a5 f6e8 e1d1 d3d2 d1g1 e2c1 g2f1 d2d1n d5a8 e5e4 f1g2 d6d5 g1e1 d7c8 g2g1 h6f4 a8d5 c8b8 d5e4 d1e3 e1d1 f4c7 h5h6 c7a5 b3a1 e8d6 e4c6 e3f5 d1f1 c1d3 g4g5 f5d4 e6c7 d6e8 f1f3 d4c2 c6d7 c2e1 f3d3 e8d6 c7b5 e1c2 d3f3 d6b5 d7b5 a5d8 g1h1 d8a5 f3g3 c2d4 g3h3 b8c8 g5g6 a5b6 h3b3 d4c6 b3d3 c6e7 d3d2 c8c7 d2f2 e7c6 f2f8 b6e3 f8f3 e3g1 f3g3 g1c5 h1h2 c6d4 g3e3 d4f5 h6h7 c5e7 b5d3 f5d4 h7h8b e7g5 e3e8 d4c2 e8g8 b4b3 g8a8 c7b6 h8f6 g5d2 a8a3 b6c5 a3a6 b3b2 h2g3 c2a3 a6b6 b2b1r d3f5 b1b5 g3h2 b5b4 f6h4 c5d5 h2g3 b4b5 f5h3".split()
+MOVES_99 = "q2Q3r/n6R/kpB1N1K1/p1p1Bppp/1PN3P1/1n1pp1b1/P1PPPP1P/r5Rb w - - 0 1"
+DEFAULT_THRESHOLD = 0.10
 
-        if depth == 0:
-            print("Perft performance test")
 
-        nodes = 0
-        for move in board.getLegalMoves():
-            newBoard = board.makeMove(move)
-            nodes += perft(newBoard, depth + 1, maxDepth)
-        if depth == 0:
-            print("  Depth: " + str(depth))
-            print("  Nodes: " + str(nodes))
-        return nodes
+def fresh(board):
+    """ A copy without cached legal moves, so each call pays for them. """
+    return board.copy()
 
-    def boardInitialization(boardType):
-        board = boardType.createFromFen(STARTING_FEN)
+def attackQueries(board):
+    """
+    Is each of the 64 squares attacked by the side not to move? Attack
+    queries aren't part of the board protocol, so this one is per backend.
+    """
+    if isinstance(board, BitBoard):
+        king = KING | board.sideToMove()
+        return lambda: [board.isSquareAttacked(i, king) for i in range(64)]
+    return lambda: [board.isSquareAttacked(i) for i in range(64)]
 
-    def startposMoves(moves, board):
-        for move in moves:
+
+""" Each benchmark takes a board class and returns (function, ops per call),
+or None if the backend can't run it. """
+def benchFen(boardType):
+    return (lambda: boardType.createFromFen(MOVES_99)), 1
+
+def benchMakeMove(boardType):
+    start = boardType.createFromFen(STARTING_FEN)
+    def replay():
+        board = start
+        for move in GAME_MOVES:
             board = board.makeMove(move)
-        return board
+    return replay, len(GAME_MOVES)
+
+def benchLegalMoves(boardType):
+    board = boardType.createFromFen(MOVES_99)
+    return (lambda: fresh(board).getLegalMoves()), 1
+
+def benchAttacks(boardType):
+    return attackQueries(boardType.createFromFen(TRICKY_FEN)), 64
+
+def benchEvaluate(boardType):
+    board = boardType.createFromFen(TRICKY_FEN)
+    return (lambda: AlphaBetaEngine.evaluatePosition(fresh(board))), 1
+
+def benchPerft(boardType):
+    board = boardType.createFromFen(TRICKY_FEN)
+    return (lambda: Perft().count(fresh(board), 2)), 2123
+
+# (name, benchmark, calls per trial)
+BENCHMARKS = [("fen", benchFen, 1000),
+              ("makeMove", benchMakeMove, 5),
+              ("legalMoves", benchLegalMoves, 50),
+              ("attacks", benchAttacks, 20),
+              ("evaluate", benchEvaluate, 50),
+              ("perft", benchPerft, 1)]
+
+
+def timeTrials(function, number, trials, warmup):
+    """ Seconds per call for each trial. """
+    for _ in range(warmup):
+        function()
+    times = []
+    for _ in range(trials):
+        start = time.perf_counter()
+        for _ in range(number):
+            function()
+        times.append((time.perf_counter() - start) / number)
+    return times
+
+def runBenchmarks(boardNames, trials, warmup):
+    """ {"<board>/<benchmark>": result} with times in µs per operation. """
+    results = {}
+    for boardName in boardNames:
+        for name, benchmark, number in BENCHMARKS:
+            setup = benchmark(BOARDS[boardName])
+            if setup is None:
+                continue
+            function, ops = setup
+            times = [t / ops * 1e6 for t in timeTrials(function, number, trials, warmup)]
+            results[boardName + "/" + name] = {"median": statistics.median(times), \
+                "min": min(times), "trials": times, "ops": ops, "calls": number}
+    return results
+
+def compare(results, baseline, threshold):
+    """ {key: (ratio, verdict)} for the benchmarks found in both. """
+    verdicts = {}
+    for key, result in results.items():
+        if key not in baseline:
+            continue
+        ratio = result["median"] / baseline[key]["median"]
+        verdict = "REGRESSION" if ratio > 1 + threshold else \
+                  "faster" if ratio < 1 - threshold else "ok"
+        verdicts[key] = (ratio, verdict)
+    return verdicts
+
+def printResults(results, verdicts):
+    print("{:<22} {:>12} {:>12} {:>8} {:>10} {:>11}".format( \
+        "benchmark", "median µs", "min µs", "spread", "vs base", ""))
+    for key, r in results.items():
+        spread = (max(r["trials"]) - r["min"]) / r["median"] * 100
+        ratio, verdict = verdicts.get(key, (None, ""))
+        print("{:<22} {:>12.3f} {:>12.3f} {:>7.1f}% {:>10} {:>11}".format( \
+            key, r["median"], r["min"], spread, \
+            "{:+.1f}%".format((ratio - 1) * 100) if ratio is not None else "-", verdict))
+
+
+def printRanking(results):
+    """ For each benchmark, the backends from fastest to slowest. """
+    byBenchmark = {}
+    for key, r in results.items():
+        boardName, name = key.split("/")
+        byBenchmark.setdefault(name, []).append((r["median"], boardName))
+    print("{:<22} {}".format("fastest", "(time relative to the fastest backend)"))
+    for name, times in byBenchmark.items():
+        times.sort()
+        print("{:<22} {}".format(name, "  ".join("{} {:.2f}x".format(boardName, \
+            median / times[0][0]) for median, boardName in times)))
 
-    def computeLegalMoves(board):
-        board.getLegalMoves()
 
-    test1 = timeit.timeit("boardInitialization(type(board))", globals=locals(), number=1000)
-    test2 = timeit.timeit("startposMoves(moves50, board)", globals=locals(), number=1000)
-    test3 = timeit.timeit("startposMoves(moves100, board)",globals=locals(), number=1000)
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, \
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--board", choices=list(BOARDS) + ["all"], default="all")
+    parser.add_argument("--trials", type=int, default=5)
+    parser.add_argument("--warmup", type=int, default=1)
+    parser.add_argument("--json", default=None, help="write the results here")
+    parser.add_argument("--baseline", default=None, help="results JSON to compare with")
+    parser.add_argument("--threshold", type=float, default=DEFAULT_THRESHOLD, \
+        help="slowdown flagged as a regression, as a fraction")
+    args = parser.parse_args()
 
-    MOVES_99 = "q2Q3r/n6R/kpB1N1K1/p1p1Bppp/1PN3P1/1n1pp1b1/P1PPPP1P/r5Rb w - - 0 1"
-    board = type(board).createFromFen(MOVES_99)
-    test4 = timeit.timeit("computeLegalMoves(board)",globals=locals(), number=1000)
-    test5 = timeit.timeit("perft(board, 0, 3)",globals=locals(), number=1)
+    boards = list(BOARDS) if args.board == "all" else [args.board]
+    results = runBenchmarks(boards, args.trials, args.warmup)
+    verdicts = {}
+    if args.baseline:
+        with open(args.baseline) as f:
+            verdicts = compare(results, json.load(f)["results"], args.threshold)
+    printResults(results, verdicts)
+    if len(boards) > 1:
+        print()
+        printRanking(results)
 
-    print(type(board))
-    print("    boardInitialization: {:.3f}µs".format(test1 * 1000))
-    print("    startposMoves(50):    {:.3f}ms".format(test2))
-    print("    startposMoves(100):   {:.3f}ms".format(test3))
-    print("    computeLegalMoves():  {:.3f}µs".format(test4 * 1000))
-    print("    perft(3):             {:.3f}s".format(test5))
-    print()
+    if args.json:
+        with open(args.json, "w") as f:
+            json.dump({"python": sys.version.split()[0], "platform": platform.platform(), \
+                "time": time.strftime("%Y-%m-%dT%H:%M:%S"), "trials": args.trials, \
+                "results": results}, f, indent=2)
+    regressions = [k for k, (_, v) in verdicts.items() if v == "REGRESSION"]
+    if regressions:
+        print("{} regression(s) beyond {:.0f}%: {}".format( \
+            len(regressions), args.threshold * 100, ", ".join(regressions)))
+        sys.exit(1)
 
 
 if __name__ == '__main__':
-    arrayBoard = Array2DBoard.createFromFen(STARTING_FEN)
-    bitboard = BitBoard.createFromFen(STARTING_FEN)
-    benchmark(arrayBoard)
-    benchmark(bitboard)
+    main()
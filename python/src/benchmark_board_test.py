@@ -0,0 +1,31 @@
+import unittest
+from benchmark_board import BENCHMARKS, compare, timeTrials
+from boards import BOARDS
+
+class TestBenchmarkBoard(unittest.TestCase):
+    def test_benchmarksRun(self):
+        for boardName, boardType in BOARDS.items():
+            for name, benchmark, _ in BENCHMARKS:
+                setup = benchmark(boardType)
+                if setup is not None:
+                    function, ops = setup
+                    function()
+                    self.assertGreater(ops, 0, boardName + "/" + name)
+
+    def test_timeTrials(self):
+        calls = []
+        times = timeTrials(lambda: calls.append(1), 3, 4, 2)
+        self.assertEqual(len(times), 4)
+        self.assertEqual(len(calls), 2 + 3 * 4)
+
+    def test_compare(self):
+        baseline = {"bitboard/fen": {"median": 10.0}, "bitboard/perft": {"median": 10.0},
+                    "array/fen": {"median": 10.0}}
+        results = {"bitboard/fen": {"median": 11.5}, "bitboard/perft": {"median": 8.0},
+                   "array/fen": {"median": 10.5}, "mailbox/fen": {"median": 1.0}}
+        self.assertEqual(compare(results, baseline, 0.10), \
+            {"bitboard/fen": (1.15, "REGRESSION"), "bitboard/perft": (0.8, "faster"),
+             "array/fen": (1.05, "ok")})
+
+if __name__ == "__main__":
+    unittest.main()
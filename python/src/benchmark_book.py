@@ -0,0 +1,89 @@
+"""
+Book-hit rate of the move-order OpeningTree against the position-keyed
+PositionBook.
+
+Both books are built from the same games of the .alg book, with every
+HOLDOUT-th game held out. The held-out games and the games in test.pgn are
+then replayed: for each game we count how many plies the engine would stay
+in book, and how many of its positions the book still has moves for (a
+position book can pick a game back up after a transposition).
+
+    python benchmark_book.py [--plies 20] [--holdout 10]
+"""
+import argparse
+import time
+from bitboard import BitBoard
+from openings import OpeningTree, PositionBook, MAX_BOOK_PLIES, STARTING_FEN, \
+    convertPgnToAlgebraic
+from pgn import streamGames
+
+ALG_BOOKS = ["../../books/lichess_alireza.alg"]
+PGN_BOOKS = ["../../books/test.pgn"]
+
+
+def treeHits(tree, moves):
+    """ (plies in book, positions with book moves) for one game. """
+    node = tree
+    for ply, move in enumerate(moves):
+        if node is None or len(node.getChildren()) == 0:
+            return ply, ply
+        node = node.getChildren().get(move)
+    return len(moves), len(moves)
+
+def positionHits(book, moves):
+    board = BitBoard.createFromFen(STARTING_FEN)
+    inBook = None
+    hits = 0
+    for ply, move in enumerate(moves):
+        if book.getCount(board) > 0:
+            hits += 1
+        elif inBook is None:
+            inBook = ply
+        board = board.makeMove(move)
+    return (len(moves) if inBook is None else inBook), hits
+
+def report(name, results, plies, seconds):
+    games = len(results)
+    print("{:<14} {:>8.2f} {:>8.1f}% {:>8.1f}% {:>9.1f}".format(name, \
+        sum(r[0] for r in results) / games, \
+        100.0 * sum(r[0] for r in results) / (games * plies), \
+        100.0 * sum(r[1] for r in results) / (games * plies), seconds))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, \
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--plies", type=int, default=MAX_BOOK_PLIES)
+    parser.add_argument("--holdout", type=int, default=10)
+    args = parser.parse_args()
+
+    training = []
+    testing = []
+    for file in ALG_BOOKS:
+        with open(file) as f:
+            for i, line in enumerate(f):
+                moves = line.split()
+                (testing if i % args.holdout == 0 else training).append(moves)
+    for file in PGN_BOOKS:
+        for _, movetext in streamGames(file):
+            testing.append(convertPgnToAlgebraic(movetext))
+    # Only score games that are long enough to leave the book.
+    testing = [moves[:args.plies] for moves in testing if len(moves) >= args.plies]
+    print("{} training games, {} test games, first {} plies".format( \
+        len(training), len(testing), args.plies))
+
+    start = time.time()
+    tree = OpeningTree.generateFromGames(training, args.plies)
+    treeTime = time.time() - start
+    start = time.time()
+    book = PositionBook.generateFromGames(training, args.plies)
+    bookTime = time.time() - start
+
+    print("{:<14} {:>8} {:>9} {:>9} {:>9}".format( \
+        "book", "plies", "in book", "hits", "build s"))
+    report("OpeningTree", [treeHits(tree, m) for m in testing], args.plies, treeTime)
+    report("PositionBook", [positionHits(book, m) for m in testing], args.plies, bookTime)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+"""
+SAN throughput over the games in books/test.pgn, in moves/sec:
+
+  parseSan     SAN -> move, from the attackers of the destination square
+  legal list   SAN -> move by generating every legal move and comparing SANs,
+               which is roughly what the old PGN converter paid per move
+  sanStr       move -> SAN
+
+    python benchmark_san.py [--repeat 20] [pgn ...]
+"""
+import argparse
+import time
+from bitboard import BitBoard, STARTING_FEN
+from pgn import streamGames
+from openings import convertPgnToAlgebraic
+
+PGN_BOOKS = ["../../books/test.pgn"]
+
+
+def loadPositions(files):
+    """ [(board, san, uci)] for every move of every game. """
+    positions = []
+    for file in files:
+        for _, movetext in streamGames(file):
+            board = BitBoard.createFromFen(STARTING_FEN)
+            moves = convertPgnToAlgebraic(movetext)
+            for move in moves:
+                positions.append((board, board.sanStr(move), move))
+                board = board.makeMove(move)
+    return positions
+
+def fresh(board):
+    """ A copy without the cached legal moves, so each run pays for them. """
+    return BitBoard(board._bits)
+
+def parseSan(positions):
+    for board, san, _ in positions:
+        fresh(board).parseSan(san)
+
+def legalList(positions):
+    for board, san, _ in positions:
+        board = fresh(board)
+        for move in board.getLegalMoves():
+            if board.sanStr(move) == san:
+                break
+
+def sanStr(positions):
+    for board, _, move in positions:
+        fresh(board).sanStr(move)
+
+def measure(function, positions, repeat):
+    start = time.perf_counter()
+    for _ in range(repeat):
+        function(positions)
+    return len(positions) * repeat / (time.perf_counter() - start)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, \
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("pgn", nargs="*", default=PGN_BOOKS)
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    positions = loadPositions(args.pgn)
+    print("{} moves".format(len(positions)))
+    for name, function, repeat in [("parseSan", parseSan, args.repeat), \
+                                   ("legal list", legalList, 1), \
+                                   ("sanStr", sanStr, args.repeat)]:
+        print("  {:<12} {:>10.0f} moves/s".format(name, measure(function, positions, repeat)))
+
+
+if __name__ == "__main__":
+    main()
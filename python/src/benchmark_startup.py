@@ -0,0 +1,80 @@
+"""
+Measures how long the python engines take to come up.
+
+Each engine is started cold in a fresh process. We report the time until it
+answers "uciok", "readyok" and a book "bestmove" from the starting position,
+plus its peak resident memory. Run from python/src:
+
+    python benchmark_startup.py [--runs 5] [engine.py ...]
+"""
+import argparse
+import statistics
+import subprocess
+import sys
+import time
+
+ENGINES = ["alphabeta_bot.py", "minimax_bot.py", "random_bot.py"]
+
+
+def waitFor(process, token):
+    while True:
+        line = process.stdout.readline()
+        if not line:
+            raise EOFError("engine exited before sending " + token)
+        if line.startswith(token):
+            return
+
+
+def peakRssKb(pid):
+    """ VmHWM from /proc, so Linux only; None elsewhere. """
+    try:
+        with open("/proc/{}/status".format(pid)) as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1])
+    except OSError:
+        pass
+    return None
+
+
+def measure(engine):
+    start = time.perf_counter()
+    process = subprocess.Popen([sys.executable, engine], stdin=subprocess.PIPE, \
+        stdout=subprocess.PIPE, text=True, bufsize=1)
+    timings = {}
+    process.stdin.write("uci\n")
+    waitFor(process, "uciok")
+    timings["uciok"] = time.perf_counter() - start
+    process.stdin.write("isready\n")
+    waitFor(process, "readyok")
+    timings["readyok"] = time.perf_counter() - start
+    process.stdin.write("position startpos\ngo depth 1\n")
+    waitFor(process, "bestmove")
+    timings["bestmove"] = time.perf_counter() - start
+    timings["rss"] = peakRssKb(process.pid)
+    process.stdin.write("quit\n")
+    process.stdin.close()
+    process.wait()
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, \
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("engines", nargs="*", default=ENGINES)
+    parser.add_argument("--runs", type=int, default=5)
+    args = parser.parse_args()
+
+    print("{:<18} {:>10} {:>10} {:>10} {:>10}".format( \
+        "engine", "uciok ms", "ready ms", "move ms", "rss MB"))
+    for engine in args.engines:
+        runs = [measure(engine) for _ in range(args.runs)]
+        median = lambda key: statistics.median(r[key] for r in runs) * 1000
+        rss = [r["rss"] for r in runs if r["rss"] is not None]
+        print("{:<18} {:>10.0f} {:>10.0f} {:>10.0f} {:>10}".format(engine, \
+            median("uciok"), median("readyok"), median("bestmove"), \
+            "{:.1f}".format(max(rss) / 1024) if rss else "?"))
+
+
+if __name__ == "__main__":
+    main()
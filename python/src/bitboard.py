@@ -14,6 +14,8 @@ Benchmarks:
     startposMoves(50): 0.3792362999993202ms
     startposMoves(100): 0.7665094999974826ms
 """
+import re
+
 STARTING_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
 TEST_FEN = "rn2k3/2pp1pp1/2b1pn2/1BB5/P3P3/1PN2Q1r/2PP1P1P/R3K1NR w KQq - 0 15"
 # TEST_FEN = "3R1q1k/pp4b1/6Q1/8/1P4n1/P6K/6P1/2r5 w - - 4 40"
@@ -50,6 +52,11 @@ CASTLE_MOVES = {0o20060604: 0o07,  # e8g8 / k / black king-side
                 0o20060204: 0o00,  # e8c8 / q / black queen-side
                 0o20067674: 0o77,  # e1g1 / K / white king-side
                 0o20067274: 0o70}  # e1c3 / Q / white queen-side
+# The castle right tied to each rook starting square (a8, h8, a1, h1).
+ROOK_CASTLES = {0o00: 0b0010, 0o07: 0b0001, 0o70: 0b1000, 0o77: 0b0100}
+# piece, from file, from rank, dest, promotion
+SAN_PATTERN = re.compile(r"^([KQRBN])?([a-h])?([1-8])?x?([a-h][1-8])(?:=?([QRBNqrbn]))?$")
+SAN_PIECES = {"K": KING, "Q": QUEEN, "R": ROOK, "B": BISHOP, "N": KNIGHT}
 ROOK_DIRS = [(-1,0),(1,0),(0,-1),(0,1)]
 BISHOP_DIRS = [(-1,-1),(-1,1),(1,-1),(1,1)]
 KNIGHT_DIRS = [(-2,-1),(-2,1),(2,-1),(2,1),(-1,-2),(-1,2),(1,-2),(1,2)]
@@ -93,6 +100,8 @@ class BitBoard():
         self._whiteToMove = None
         self._sideToMove = None
         self._enpassant = None
+        # (bits, legal moves, previous) for popMove().
+        self._undo = None
 
     """ ====================== Static helper methods ======================= """
     def coordToAddress(coord):
@@ -250,6 +259,59 @@ class BitBoard():
         isWhitePiece = (piece & 8) >> 3
         return isWhitePiece != self.whiteToMove()
 
+    """ ============= Board protocol (see boards.py) ======================= """
+    def toFen(self):
+        rows = []
+        for r in range(BOARD_SIZE):
+            row = ""
+            empties = 0
+            for c in range(BOARD_SIZE):
+                piece = BitBoard.getPiece(self._bits, r * BOARD_SIZE + c)
+                if piece == 0:
+                    empties += 1
+                    continue
+                name = PIECE_STRING[BitBoard.pieceType(piece)]
+                row += (str(empties) if empties else "") + (name.upper() if piece & 8 else name)
+                empties = 0
+            rows.append(row + (str(empties) if empties else ""))
+        castles = "".join(c for bit, c in ((4, "K"), (8, "Q"), (1, "k"), (2, "q")) \
+            if self.getCastles() & bit)
+        enpassant = self.getEnpassant()
+        return "{} {} {} {} 0 1".format("/".join(rows), "w" if self.whiteToMove() else "b", \
+            castles or "-", BitBoard.indexToAlgebraic(enpassant) if enpassant else "-")
+
+    def copy(self):
+        return BitBoard(self._bits)
+
+    def pieceAt(self, index):
+        return BitBoard.getPiece(self._bits, index)
+
+    def positionKey(self):
+        return self._bits
+
+    def isCheck(self):
+        return self.isSquareAttacked(self.findPiece(self.sideToMove() | KING))
+
+    def pushMove(self, move):
+        """
+        Makes |move| on this board; popMove() takes it back. The bits are
+        immutable, so this just swaps them and keeps the old ones.
+        """
+        self._undo = (self._bits, self._legalMoves, self._undo)
+        self.setBits(self.makeMove(move)._bits, None)
+
+    def popMove(self):
+        bits, legalMoves, self._undo = self._undo
+        self.setBits(bits, legalMoves)
+
+    def setBits(self, bits, legalMoves):
+        self._bits = bits
+        self._legalMoves = legalMoves
+        self._castles = None
+        self._whiteToMove = None
+        self._sideToMove = None
+        self._enpassant = None
+
     """ ============= Class methods ======================================== """
     def activePieces(self):
         whitePieces = []
@@ -279,19 +341,10 @@ class BitBoard():
             # Even if not castling, moving king cancels all castle possibility.
             newCastles &= ~(0b11 << (2 if self.whiteToMove() else 0))
 
-        # If our rook moves, remove that castle possibility
-        if BitBoard.pieceType(piece) == ROOK:
-            shift = (2 if self.whiteToMove() else 0) + \
-                    (0 if (move & 0b111) == 7 else 1)
-            newCastles &= ~(0b1 << shift)
-
-        # If we just took on a starting rook square, remove opponent's castle possibility
-        oppRow = 7 if self.whiteToMove() else 0
-        destRow = (move & (0b111 << 9)) >> 9
-        if destRow == oppRow:
-            shift = (0 if self.whiteToMove() else 2) + \
-                    (0 if (move & 0b111) == 7 else 1)
-            newCastles &= ~(0b1 << shift)
+        # Moving from or capturing on a rook's starting square loses that castle.
+        src = move & MOVE_SQ_MASK
+        dest = (move >> DEST_SQ) & MOVE_SQ_MASK
+        newCastles &= ~(ROOK_CASTLES.get(src, 0) | ROOK_CASTLES.get(dest, 0))
         bits &= ((newCastles << CASTLES_START) | ~(CASTLES_MASK << CASTLES_START))
         return bits
 
@@ -317,6 +370,11 @@ class BitBoard():
         srcPiece = BitBoard.getPiece(self._bits, src)
         endPiece = srcPiece
 
+        # String moves don't carry the meta bits, so castling has to be
+        # recognized here for castleLogic to move the rook as well.
+        if BitBoard.pieceType(srcPiece) == KING and abs(src - dest) == 2:
+            move = BitBoard.constructMove(src, dest, srcPiece, 0, CASTLE)
+
         # Right now, keep the legality checks simple and just trust in the GUI
         # to send us legal moves only.
         if srcPiece == 0 or self.isOpponentPiece(srcPiece):
@@ -329,10 +387,12 @@ class BitBoard():
 
         # Pawn promotion logic
         if BitBoard.pieceType(srcPiece) == PAWN and (dest <= 0o07 or dest >= 0o70):
-            endPiece = (QUEEN if promo > 0 else promo) | self.sideToMove()
+            endPiece = (promo if promo > 0 else QUEEN) | self.sideToMove()
 
-        # En passant logic
-        if BitBoard.pieceType(srcPiece) == PAWN and dest == self.getEnpassant():
+        # En passant logic. An en passant square of 0 means there is none, so a
+        # pawn promoting on a8 must not take the a7 pawn with it.
+        if BitBoard.pieceType(srcPiece) == PAWN and dest == self.getEnpassant() \
+                and dest > 0:
             # captured piece is on same row as src, and same col as dest.
             capturedAddr = ((src & (0b111 << 3)) | (dest & 0b111)) * PIECE_SIZE
             newBits = BitBoard.removePiece(newBits, capturedAddr)
@@ -493,8 +553,9 @@ class BitBoard():
         if any([self.isSquareAttackedByPiece(index, target, dir, ps) \
                 for (dir, ps) in directionals]):
             return True
-        # Pawn logic is special
-        forward = 1 if self.whiteToMove() else -1
+        # Pawn logic is special: enemy pawns attack a white target from the
+        # row above it, and a black target from the row below.
+        forward = -1 if BitBoard.pieceSide(target) else 1
         diagonals = [(forward, 1), (forward, -1)]
         for diag in diagonals:
             tmp, outOfBounds = BitBoard.indexPlusCoord(index, diag)
@@ -555,6 +616,161 @@ class BitBoard():
         # self._legalMoves = [m[0] for m in moves]
         self._legalMoves = moves
 
+    """ ============== Standard algebraic notation ===================== """
+    def attackersOf(self, dest, piece):
+        """
+        Squares holding |piece| that could move to |dest|, ignoring pins. Walks
+        outward from |dest| instead of generating every legal move.
+        """
+        pieceType = BitBoard.pieceType(piece)
+        multiStep = pieceType in (ROOK, BISHOP, QUEEN)
+        squares = []
+        for d in DIR_MAP[pieceType]:
+            src, outOfBounds = BitBoard.indexPlusCoord(dest, d)
+            while multiStep and not outOfBounds and BitBoard.getPiece(self._bits, src) == 0:
+                src, outOfBounds = BitBoard.indexPlusCoord(src, d)
+            if not outOfBounds and BitBoard.getPiece(self._bits, src) == piece:
+                squares.append(src)
+        return squares
+
+    def pawnSources(self, dest, fromFile):
+        """ Squares a pawn of the side to move could come to |dest| from. """
+        backward = 1 if self.whiteToMove() else -1
+        row = dest // BOARD_SIZE + backward
+        if row < 0 or row >= BOARD_SIZE:
+            return []
+        pawn = PAWN | self.sideToMove()
+        target = BitBoard.getPiece(self._bits, dest)
+        if fromFile is not None:
+            # A capture: one file over, onto an enemy piece or en passant.
+            enpassant = dest == self.getEnpassant() and \
+                dest // BOARD_SIZE == (2 if self.whiteToMove() else 5)
+            if abs(fromFile - dest % BOARD_SIZE) != 1 or \
+                    not (enpassant or (target != 0 and self.isOpponentPiece(target))):
+                return []
+            src = row * BOARD_SIZE + fromFile
+            return [src] if BitBoard.getPiece(self._bits, src) == pawn else []
+        if target != 0:
+            # Pawns only push onto empty squares.
+            return []
+        src = row * BOARD_SIZE + dest % BOARD_SIZE
+        if BitBoard.getPiece(self._bits, src) == pawn:
+            return [src]
+        # Double advance, over an empty square.
+        double = src + backward * BOARD_SIZE
+        if BitBoard.getPiece(self._bits, src) == 0 and row == (5 if self.whiteToMove() else 2) \
+                and BitBoard.getPiece(self._bits, double) == pawn:
+            return [double]
+        return []
+
+    def moveFromSquares(self, src, dest, promo=0):
+        """ The move int for src -> dest, with the capture and castle bits. """
+        srcPiece = BitBoard.getPiece(self._bits, src)
+        destPiece = BitBoard.getPiece(self._bits, dest)
+        meta = CAPTURE if destPiece != 0 else 0
+        if BitBoard.pieceType(srcPiece) == PAWN and dest == self.getEnpassant() \
+                and dest % BOARD_SIZE != src % BOARD_SIZE:
+            destPiece = PAWN
+            meta = CAPTURE
+        if BitBoard.pieceType(srcPiece) == KING and abs(src - dest) == 2:
+            meta = CASTLE
+        if promo:
+            meta |= PROMOTION
+        return BitBoard.constructMove(src, dest, srcPiece, destPiece, meta, promo)
+
+    def parseSan(self, san):
+        """
+        Resolves a SAN move like "Nbxd7+", "exd6", "e8=Q" or "O-O" to a move
+        int. Raises ValueError if it is malformed, illegal or ambiguous.
+        """
+        token = san.rstrip("+#!?")
+        kingRow = 56 if self.whiteToMove() else 0
+        if token in ("O-O", "0-0", "O-O-O", "0-0-0"):
+            dest = kingRow + (6 if len(token) == 3 else 2)
+            move = self.moveFromSquares(kingRow + 4, dest)
+            if move not in self.legalCastleMoves():
+                raise ValueError("illegal castle: " + san)
+            return move
+        match = SAN_PATTERN.match(token)
+        if match is None:
+            raise ValueError("bad SAN: " + san)
+        pieceName, fromFile, fromRank, destName, promoName = match.groups()
+        dest = BitBoard.algebraicToIndex(destName)
+        promo = PIECE_MAP[promoName.lower()] if promoName else 0
+        fileIndex = ord(fromFile) - ord("a") if fromFile else None
+        lastRank = dest // BOARD_SIZE == (0 if self.whiteToMove() else BOARD_SIZE - 1)
+        if bool(promo) != (pieceName is None and lastRank):
+            raise ValueError("bad promotion: " + san)
+        if pieceName is None:
+            sources = self.pawnSources(dest, fileIndex)
+        else:
+            piece = SAN_PIECES[pieceName] | self.sideToMove()
+            sources = [s for s in self.attackersOf(dest, piece) \
+                if (fileIndex is None or s % BOARD_SIZE == fileIndex) and \
+                   (fromRank is None or BitBoard.indexToAlgebraic(s)[1] == fromRank)]
+
+        target = BitBoard.getPiece(self._bits, dest)
+        if target != 0 and not self.isOpponentPiece(target):
+            sources = []
+        moves = [self.moveFromSquares(s, dest, promo) for s in sources]
+        if len(moves) > 1 or (len(moves) == 1 and not self.isKingSafeAfterMove(moves[0])):
+            # Only pins can tell candidates apart, so only check them then.
+            moves = [m for m in moves if self.isKingSafeAfterMove(m)]
+        if len(moves) != 1:
+            raise ValueError("{} SAN: {}".format( \
+                "illegal" if len(moves) == 0 else "ambiguous", san))
+        return moves[0]
+
+    def sanStr(self, move):
+        """ The SAN of a legal |move| (int or uci string) from this position. """
+        if isinstance(move, str):
+            promo = PIECE_MAP[move[4]] if len(move) > 4 else 0
+            move = self.moveFromSquares(BitBoard.algebraicToIndex(move[0:2]), \
+                BitBoard.algebraicToIndex(move[2:4]), promo)
+        src = move & MOVE_SQ_MASK
+        dest = (move >> DEST_SQ) & MOVE_SQ_MASK
+        promo = (move >> PROMO_PIECE) & MOVE_PIECE_MASK
+        piece = BitBoard.getPiece(self._bits, src)
+        pieceType = BitBoard.pieceType(piece)
+        capture = BitBoard.getPiece(self._bits, dest) != 0 or \
+            (pieceType == PAWN and src % BOARD_SIZE != dest % BOARD_SIZE)
+        destName = BitBoard.indexToAlgebraic(dest)
+
+        if pieceType == KING and abs(src - dest) == 2:
+            san = "O-O" if dest > src else "O-O-O"
+        elif pieceType == PAWN:
+            san = (BitBoard.indexToAlgebraic(src)[0] + "x" if capture else "") + destName
+            if promo:
+                san += "=" + PIECE_STRING[promo].upper()
+        else:
+            san = PIECE_STRING[pieceType].upper()
+            others = [s for s in self.attackersOf(dest, piece) if s != src and \
+                self.isKingSafeAfterMove(self.moveFromSquares(s, dest))]
+            srcName = BitBoard.indexToAlgebraic(src)
+            if others:
+                if all(s % BOARD_SIZE != src % BOARD_SIZE for s in others):
+                    san += srcName[0]
+                elif all(s // BOARD_SIZE != src // BOARD_SIZE for s in others):
+                    san += srcName[1]
+                else:
+                    san += srcName
+            san += ("x" if capture else "") + destName
+
+        after = self.makeMove(move)
+        king = KING | after.sideToMove()
+        if after.isSquareAttacked(after.findPiece(king), king):
+            san += "#" if len(after.getLegalMoves()) == 0 else "+"
+        return san
+
+    def sanLine(self, moves):
+        """ SAN for a sequence of uci moves, e.g. a PV, played from here. """
+        board = self
+        line = []
+        for move in moves:
+            line.append(board.sanStr(move))
+            board = board.makeMove(move)
+        return line
+
     """ ============== Debugging and Printing ===================== """
     def moveToDebugString(move):
         src = BitBoard.indexToAlgebraic(move & MOVE_SQ_MASK)
@@ -570,8 +786,7 @@ class BitBoard():
         src = BitBoard.indexToAlgebraic(move & MOVE_SQ_MASK)
         dest = BitBoard.indexToAlgebraic((move & (MOVE_SQ_MASK << DEST_SQ)) >> DEST_SQ)
         promo = (move & (MOVE_PIECE_MASK << PROMO_PIECE)) >> PROMO_PIECE
-        pieces = ["", "", "r", "b", "n", "q", ""]
-        return "{}{}{}".format(src, dest, pieces[promo])
+        return "{}{}{}".format(src, dest, PIECE_STRING[promo].strip())
 
     def printLegalMoves(self):
         print([BitBoard.moveToDebugString(m) for m in self.getLegalMoves()])
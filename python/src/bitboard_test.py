@@ -1,6 +1,67 @@
 import unittest
-from bitboard import BitBoard
+from bitboard import BitBoard, STARTING_FEN, TRICKY_FEN
 
 class TestBitBoard(unittest.TestCase):
     def test_createFromFen(self):
-        self.assert(BitBoard.createFromFen(), 0)
+        board = BitBoard.createFromFen(STARTING_FEN)
+        self.assertTrue(board.whiteToMove())
+        self.assertEqual(board.getCastles(), 0b1111)
+        self.assertEqual(len(board.getLegalMoves()), 20)
+
+    def test_parseSan(self):
+        board = BitBoard.createFromFen(TRICKY_FEN)
+        self.assertEqual(BitBoard.moveStr(board.parseSan("O-O")), "e1g1")
+        self.assertEqual(BitBoard.moveStr(board.parseSan("O-O-O")), "e1c1")
+        self.assertEqual(BitBoard.moveStr(board.parseSan("Nxf7")), "e5f7")
+        self.assertEqual(BitBoard.moveStr(board.parseSan("bxa8=N")), "b7a8n")
+        self.assertEqual(BitBoard.moveStr(board.parseSan("Qxh3")), "f3h3")
+        self.assertEqual(BitBoard.moveStr(board.parseSan("a4")), "a2a4")
+        self.assertRaises(ValueError, board.parseSan, "Nd4")
+        self.assertRaises(ValueError, board.parseSan, "Ke3")
+        start = BitBoard.createFromFen(STARTING_FEN)
+        for san in ["exd3", "exe3", "e5", "Nf3=Q", "e4=Q"]:
+            self.assertRaises(ValueError, start.parseSan, san)
+        # A push can't take, and a pawn on the last rank must promote.
+        board = BitBoard.createFromFen( \
+            "rnbqkbnr/pppp1ppp/8/4p3/4P3/8/PPPP1PPP/RNBQKBNR w KQkq - 0 2")
+        self.assertRaises(ValueError, board.parseSan, "e5")
+        board = BitBoard.createFromFen("1n2k3/P7/8/8/8/8/8/4K3 w - - 0 1")
+        self.assertRaises(ValueError, board.parseSan, "a8")
+        self.assertRaises(ValueError, board.parseSan, "axb8")
+        self.assertEqual(BitBoard.moveStr(board.parseSan("axb8=Q")), "a7b8q")
+        # En passant lands on an empty square.
+        board = BitBoard.createFromFen( \
+            "rnbqkbnr/ppp1p1pp/8/3pPp2/8/8/PPPP1PPP/RNBQKBNR w KQkq f6 0 3")
+        self.assertEqual(BitBoard.moveStr(board.parseSan("exf6")), "e5f6")
+        self.assertRaises(ValueError, board.parseSan, "exd6")
+
+    def test_parseSanDisambiguation(self):
+        # Both knights reach d2...
+        board = BitBoard.createFromFen("4k3/8/8/8/8/5N2/8/1N2K3 w - - 0 1")
+        self.assertRaises(ValueError, board.parseSan, "Nd2")
+        self.assertEqual(BitBoard.moveStr(board.parseSan("Nbd2")), "b1d2")
+        self.assertEqual(board.sanStr("f3d2"), "Nfd2")
+        # ...but the pinned c3 knight can't go to e2.
+        board = BitBoard.createFromFen("4k3/8/8/b7/8/2N5/8/4K1N1 w - - 0 1")
+        self.assertEqual(BitBoard.moveStr(board.parseSan("Ne2")), "g1e2")
+        self.assertEqual(board.sanStr("g1e2"), "Ne2")
+
+    def test_sanStr(self):
+        board = BitBoard.createFromFen(TRICKY_FEN)
+        self.assertEqual(board.sanStr("e1g1"), "O-O")
+        self.assertEqual(board.sanStr("b7a8q"), "bxa8=Q+")
+        self.assertEqual(board.sanStr("b7a8n"), "bxa8=N")
+        self.assertEqual(board.sanStr("e5f7"), "Nxf7")
+        self.assertEqual(board.sanStr("c3b1"), "Nb1")
+        self.assertEqual(board.sanStr("d5e6"), "dxe6")
+        fools = BitBoard.createFromFen( \
+            "rnbqkbnr/pppp1ppp/8/4p3/6P1/5P2/PPPPP2P/RNBQKBNR b KQkq - 0 2")
+        self.assertEqual(fools.sanStr("d8h4"), "Qh4#")
+
+    def test_sanLine(self):
+        board = BitBoard.createFromFen(STARTING_FEN)
+        self.assertEqual(board.sanLine("e2e4 e7e5 g1f3 b8c6 f1b5".split()), \
+            ["e4", "e5", "Nf3", "Nc6", "Bb5"])
+
+if __name__ == "__main__":
+    unittest.main()
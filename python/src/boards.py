@@ -0,0 +1,55 @@
+"""
+The board backends, and the protocol they all implement, so the engines and
+tools can take any of them:
+
+    Board.createFromFen(fen), board.toFen()
+    board.copy()                  the same position, nothing cached
+    board.getLegalMoves()         [move]
+    board.makeMove(move)          a new board with |move| made
+    board.pushMove(move)          makes |move| in place...
+    board.popMove()               ...and takes it back
+    board.whiteToMove()
+    board.isCheck(), board.isCheckMate()
+    board.pieceAt(index)          the piece on |index| (a8 = 0) as a BitBoard
+                                  piece, 8 (white) | PAWN..KING, or 0
+    board.activePieces()          ([(type, index)] of white, same for black)
+    board.getCastles()            castle rights as BitBoard's castle bits
+    board.getEnpassant()          the en passant square, 0 if there is none
+    board.positionKey()           hashable and equal for equal positions, for
+                                  transposition tables; not across backends
+    board.prettyPrint()
+
+Moves are ints laid out as BitBoard's (see BitBoard.constructMove). Every
+backend sets the squares and the promotion piece; the piece and meta bits
+are hints that may differ, so compare moves with moveKey(). BitBoard.moveStr
+and BitBoard.moveCaptureValue read any backend's moves, and makeMove and
+pushMove also take uci strings.
+
+zobristHash() is the Polyglot key, read through pieceAt() and friends, so two
+backends holding the same position hash the same. fuzz_board.py plays random
+games on every backend at once to check exactly that.
+"""
+import polyglot
+from arrayboard import Array2DBoard
+from mailboxboard import MailboxBoard
+from bitboard import BitBoard, DEST_SQ, PROMO_PIECE, MOVE_SQ_MASK, MOVE_PIECE_MASK
+
+BOARDS = {"bitboard": BitBoard, "array": Array2DBoard, "mailbox": MailboxBoard}
+DEFAULT_BOARD = "bitboard"
+
+# The squares and the promotion piece: what identifies a move.
+MOVE_KEY_MASK = MOVE_SQ_MASK | (MOVE_SQ_MASK << DEST_SQ) | (MOVE_PIECE_MASK << PROMO_PIECE)
+
+
+def boardName(board):
+    """ The BOARDS name of |board|'s backend. """
+    for name, boardType in BOARDS.items():
+        if isinstance(board, boardType):
+            return name
+    raise ValueError("unknown board backend: {}".format(type(board).__name__))
+
+def moveKey(move):
+    return move & MOVE_KEY_MASK
+
+def zobristHash(board):
+    return polyglot.zobristKey(board)
@@ -0,0 +1,122 @@
+"""
+EPD test-suite runner for AlphaBetaEngine.
+
+Each EPD line is a position (the first four FEN fields) followed by
+operations; "bm" lists the best moves and "am" the moves to avoid, in SAN:
+
+    6k1/5ppp/8/8/8/8/5PPP/3R2K1 w - - bm Rd8#; id "back rank";
+
+Positions are spread over a process pool, each worker driving its own engine
+through AlphaBetaEngine.searchLimited at a fixed depth, node count or time.
+A position is solved if the final best move is a bm (and not an am). Its
+time-to-solution is when the search settled on a correct move for good.
+
+    python epd.py ../../books/tactics.epd --depth 3 [--nodes N] [--movetime MS]
+                  [--processes 4]
+"""
+import argparse
+import multiprocessing
+import shlex
+import time
+from alphabeta_bot import AlphaBetaEngine
+from bitboard import BitBoard
+
+_engine = None
+
+
+def parseEpd(line):
+    """ Returns (fen, {opcode: [operands]}) or None for blank lines. """
+    fields = line.split(None, 4)
+    if len(fields) < 4:
+        return None
+    fen = " ".join(fields[:4]) + " 0 1"
+    ops = {}
+    rest = fields[4] if len(fields) > 4 else ""
+    for op in rest.split(";"):
+        words = shlex.split(op)
+        if words:
+            ops[words[0]] = words[1:]
+    return fen, ops
+
+def loadSuite(file):
+    with open(file) as f:
+        return [p for p in (parseEpd(l) for l in f if not l.startswith("#")) if p is not None]
+
+def isSolution(board, move, ops):
+    """ Whether the uci |move| meets the suite's bm/am for |board|. """
+    bestMoves = [board.parseSan(san) for san in ops.get("bm", [])]
+    avoidMoves = [board.parseSan(san) for san in ops.get("am", [])]
+    played = board.parseSan(board.sanStr(move))
+    if bestMoves and played not in bestMoves:
+        return False
+    return played not in avoidMoves
+
+
+def initEpdWorker():
+    global _engine
+    _engine = AlphaBetaEngine(loadBook=False)
+    _engine._debug = False
+
+def runPosition(task):
+    """
+    Searches one suite position and returns a result dict. Runs inside the
+    worker processes.
+    """
+    index, fen, ops, limits = task
+    start = time.time()
+    iterations = _engine.searchLimited(fen, *limits)
+    board = BitBoard.createFromFen(fen)
+    result = {"index": index, "id": " ".join(ops.get("id", [str(index + 1)])), \
+              "move": None, "solved": False, "depth": 0, "nodes": _engine._nodes, \
+              "seconds": time.time() - start, "solvedAt": None}
+    if len(iterations) == 0:
+        return result
+    depth, path = iterations[-1][0:2]
+    result.update(move=board.sanStr(path.split()[0]), depth=depth)
+    # The solution time is the end of the first iteration of the final run of
+    # solving iterations.
+    for _, path, _, _, _, seconds in reversed(iterations):
+        if not isSolution(board, path.split()[0], ops):
+            break
+        result["solved"] = True
+        result["solvedAt"] = seconds
+    return result
+
+
+def runSuite(positions, limits, processes=None):
+    tasks = [(i, fen, ops, limits) for i, (fen, ops) in enumerate(positions)]
+    with multiprocessing.Pool(processes, initEpdWorker) as pool:
+        # Ordered, so the report follows the suite.
+        yield from pool.imap(runPosition, tasks)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, \
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("suite", nargs="+")
+    parser.add_argument("--depth", type=int, default=None)
+    parser.add_argument("--nodes", type=int, default=None)
+    parser.add_argument("--movetime", type=int, default=None, help="ms per position")
+    parser.add_argument("--processes", type=int, default=None)
+    args = parser.parse_args()
+
+    positions = [p for file in args.suite for p in loadSuite(file)]
+    limits = (args.depth, args.nodes, args.movetime)
+    start = time.time()
+    solved = 0
+    nodes = 0
+    print("{:<24} {:>7} {:>4} {:>5} {:>9} {:>7} {:>8} {:>8}".format( \
+        "id", "move", "ok", "depth", "nodes", "nps", "time", "solved"))
+    for r in runSuite(positions, limits, args.processes):
+        solved += r["solved"]
+        nodes += r["nodes"]
+        print("{:<24} {:>7} {:>4} {:>5} {:>9} {:>7.0f} {:>7.2f}s {:>8}".format( \
+            r["id"][:24], r["move"] or "-", "yes" if r["solved"] else "no", \
+            r["depth"], r["nodes"], r["nodes"] / max(r["seconds"], 1e-9), r["seconds"], \
+            "{:.2f}s".format(r["solvedAt"]) if r["solvedAt"] is not None else "-"))
+    elapsed = time.time() - start
+    print("solved {}/{}  nodes {}  nps {:.0f}  time {:.1f}s".format( \
+        solved, len(positions), nodes, nodes / max(elapsed, 1e-9), elapsed))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,26 @@
+import unittest
+import epd
+from epd import initEpdWorker, loadSuite, parseEpd, runPosition
+
+TACTICS = "../../books/tactics.epd"
+
+class TestEpd(unittest.TestCase):
+    def test_parseEpd(self):
+        fen, ops = parseEpd('6k1/5ppp/8/8/8/8/5PPP/3R2K1 w - - bm Rd8#; id "back rank";')
+        self.assertEqual(fen, "6k1/5ppp/8/8/8/8/5PPP/3R2K1 w - - 0 1")
+        self.assertEqual(ops, {"bm": ["Rd8#"], "id": ["back rank"]})
+        self.assertIsNone(parseEpd("\n"))
+
+    def test_runPosition(self):
+        initEpdWorker()
+        # The engine's own game position must not leak into the result.
+        epd._engine.position("position startpos moves e2e4")
+        positions = loadSuite(TACTICS)[:2]
+        for i, (fen, ops) in enumerate(positions):
+            result = runPosition((i, fen, ops, (2, None, None)))
+            self.assertTrue(result["solved"], result["id"])
+            self.assertEqual(result["move"], ops["bm"][0])
+            self.assertEqual(result["depth"], 2)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,182 @@
+"""
+Differential fuzzing of the board backends (see boards.py).
+
+Plays random games on every backend at once, from the start position and the
+perft suite's positions, and at every ply compares what the backends say about
+the position: the legal moves (by boards.moveKey), the FEN, check and mate.
+Each move is made both with makeMove on a copy and pushMove in place, which
+must agree, and at the end of each game popMove takes all of them back, which
+must lead to the start position again.
+
+positionKey differs between backends, so each one is checked on its own: it
+must come back after popMove, be the same for a, x, b and b, x, a from the
+same position, and over a game be equal exactly when the FENs (without the
+move counters) are.
+
+    python fuzz_board.py [--games 20] [--plies 200] [--seed 1] [--board all]
+
+The first mismatch is printed with the start FEN and the moves leading to it,
+ready for "perft.py divide", and the exit status is 1.
+"""
+import argparse
+import random
+import sys
+import time
+from bitboard import BitBoard, STARTING_FEN
+from boards import BOARDS, moveKey
+from perft import PERFT_SUITE
+
+START_FENS = [STARTING_FEN] + [fen for _, fen, _ in PERFT_SUITE]
+
+
+def describe(board):
+    """ What every backend has to agree on about a position. """
+    return {"fen": board.toFen(),
+            "check": bool(board.isCheck()),
+            "mate": bool(board.isCheckMate()),
+            "moves": sorted(moveKey(m) for m in board.getLegalMoves())}
+
+def firstMismatch(views):
+    """ (field, {name: value}) for the first field the views differ on, or None. """
+    reference = next(iter(views.values()))
+    for field in reference:
+        values = {name: view[field] for name, view in views.items()}
+        if any(value != reference[field] for value in values.values()):
+            return field, values
+    return None
+
+def playKeys(board, keys):
+    """ |board| after the moves with |keys|, or None if one isn't legal. """
+    for key in keys:
+        move = next((m for m in board.getLegalMoves() if moveKey(m) == key), None)
+        if move is None:
+            return None
+        board = board.makeMove(move)
+    return board
+
+def transposition(board, keys, rng):
+    """ Move keys a, x, b and b, x, a playable from |board|, or None. """
+    if len(keys) < 2:
+        return None
+    a, b = rng.sample(keys, 2)
+    replies = [moveKey(m) for m in playKeys(board, [a]).getLegalMoves()]
+    if len(replies) == 0:
+        return None
+    x = rng.choice(replies)
+    return [a, x, b], [b, x, a]
+
+def checkPositionKey(name, seen, board):
+    """
+    Records |board| in |seen|, ({fen: key}, {key: fen}) over one backend's
+    positions. Returns a mismatch if the key is known for another position
+    or the position under another key, else None.
+    """
+    fen = " ".join(board.toFen().split()[:4])
+    key = board.positionKey()
+    keysByFen, fensByKey = seen
+    known = keysByFen.setdefault(fen, key)
+    if known != key:
+        return "positionKey", {name + " " + fen: known, name + " now": key}
+    known = fensByKey.setdefault(key, fen)
+    if known != fen:
+        return "positionKey", {name + " " + known: key, name + " " + fen: key}
+    return None
+
+def playGame(boardNames, fen, plies, rng):
+    """
+    Plays one random game of up to |plies| on every backend in |boardNames|.
+    Returns (moves, positions, mismatch), mismatch being None or a
+    (field, {name: value}) naming what the backends disagreed on.
+    """
+    boards = {name: BOARDS[name].createFromFen(fen) for name in boardNames}
+    startFens = {name: board.toFen() for name, board in boards.items()}
+    seen = {name: ({}, {}) for name in boardNames}
+    pushedKeys = {name: [] for name in boardNames}
+    moves = []
+    positions = 0
+    for ply in range(plies + 1):
+        views = {name: describe(board) for name, board in boards.items()}
+        positions += 1
+        mismatch = firstMismatch(views)
+        if mismatch is not None:
+            return moves, positions, mismatch
+        for name, board in boards.items():
+            mismatch = checkPositionKey(name, seen[name], board)
+            if mismatch is not None:
+                return moves, positions, mismatch
+        keys = next(iter(views.values()))["moves"]
+        orders = transposition(next(iter(boards.values())), keys, rng)
+        for name, board in boards.items():
+            ends = [playKeys(board, order) for order in orders or []]
+            if len(ends) == 0 or None in ends:
+                continue
+            for end in ends:
+                mismatch = checkPositionKey(name, seen[name], end)
+                if mismatch is not None:
+                    return moves, positions, ("transposed " + mismatch[0], mismatch[1])
+        if ply == plies or len(keys) == 0:
+            break
+        key = rng.choice(keys)
+        moves.append(BitBoard.moveStr(key))
+        for name, board in boards.items():
+            move = next(m for m in board.getLegalMoves() if moveKey(m) == key)
+            made = board.makeMove(move)
+            pushedKeys[name].append(board.positionKey())
+            board.pushMove(move)
+            if made.toFen() != board.toFen():
+                return moves, positions, ("pushMove", \
+                    {name + " makeMove": made.toFen(), name + " pushMove": board.toFen()})
+            if made.positionKey() != board.positionKey():
+                return moves, positions, ("pushMove positionKey", \
+                    {name + " makeMove": made.positionKey(), name + " pushMove": board.positionKey()})
+
+    for name, board in boards.items():
+        for key in reversed(pushedKeys[name]):
+            board.popMove()
+            if board.positionKey() != key:
+                return moves, positions, ("popMove positionKey", \
+                    {name + " pushed": key, name + " popMove": board.positionKey()})
+        if board.toFen() != startFens[name]:
+            return moves, positions, ("popMove", \
+                {name + " start": startFens[name], name + " popMove": board.toFen()})
+    return moves, positions, None
+
+def fuzz(boardNames, games, plies, seed):
+    """ Prints a summary and the first mismatch, if any; returns whether all agreed. """
+    rng = random.Random(seed)
+    start = time.time()
+    positions = 0
+    for game in range(games):
+        fen = START_FENS[game % len(START_FENS)]
+        moves, gamePositions, mismatch = playGame(boardNames, fen, plies, rng)
+        positions += gamePositions
+        if mismatch is not None:
+            field, values = mismatch
+            print("MISMATCH in game {} on {}".format(game + 1, field))
+            print("  fen:   {}".format(fen))
+            print("  moves: {}".format(" ".join(moves)))
+            for name, value in values.items():
+                print("  {:<20} {}".format(name, \
+                    [BitBoard.moveStr(m) for m in value] if field == "moves" else value))
+            return False
+    elapsed = time.time() - start
+    print("{} games, {} positions on {}: all agree ({:.1f}s, {:.0f} positions/s)".format( \
+        games, positions, ", ".join(boardNames), elapsed, positions / max(elapsed, 1e-9)))
+    return True
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, \
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--games", type=int, default=20)
+    parser.add_argument("--plies", type=int, default=200)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--board", nargs="+", choices=list(BOARDS) + ["all"], default=["all"])
+    args = parser.parse_args()
+
+    boardNames = list(BOARDS) if "all" in args.board else args.board
+    sys.exit(0 if fuzz(boardNames, args.games, args.plies, args.seed) else 1)
+
+
+if __name__ == "__main__":
+    main()
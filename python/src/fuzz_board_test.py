@@ -0,0 +1,28 @@
+import random
+import unittest
+from boards import BOARDS
+from fuzz_board import START_FENS, checkPositionKey, playGame
+
+class TestFuzzBoard(unittest.TestCase):
+    def test_fuzzBoards(self):
+        rng = random.Random(1)
+        for fen in START_FENS:
+            moves, _, mismatch = playGame(list(BOARDS), fen, 40, rng)
+            self.assertIsNone(mismatch, "{} moves {}".format(fen, " ".join(moves)))
+
+    def test_checkPositionKey(self):
+        for name, board in BOARDS.items():
+            start = board.createFromFen(START_FENS[0])
+            seen = ({}, {})
+            self.assertIsNone(checkPositionKey(name, seen, start))
+            knights = start.makeMove("g1f3").makeMove("e7e5").makeMove("b1c3")
+            transposed = start.makeMove("b1c3").makeMove("e7e5").makeMove("g1f3")
+            self.assertIsNone(checkPositionKey(name, seen, knights), name)
+            self.assertIsNone(checkPositionKey(name, seen, transposed), name)
+            # A key that ignores the position is caught.
+            transposed.positionKey = lambda: start.positionKey()
+            field, _ = checkPositionKey(name, seen, transposed)
+            self.assertEqual(field, "positionKey")
+
+if __name__ == "__main__":
+    unittest.main()
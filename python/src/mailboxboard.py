@@ -0,0 +1,395 @@
+"""
+Chess board on a 10x12 mailbox: the 64 squares sit in the middle of a list
+of 120, framed by OFFBOARD sentinels (one file on either side, two ranks above
+and below), so stepping off the board, even a knight's jump, lands on a
+sentinel and every bounds check is a single comparison. Squares hold BitBoard
+pieces, 8 (white) | PAWN..KING, or EMPTY. A piece list, the squares each side
+occupies and where the kings are, saves scanning the board for move
+generation, check tests and evaluation.
+
+Moves are BitBoard move ints, on BitBoard's squares (a8 = 0). pushMove() and
+popMove() make and unmake a move in place with an undo record, which is what
+the legality checks use; makeMove() makes it on a copy.
+
+python benchmark_board.py times it next to BitBoard and Array2DBoard.
+"""
+from arrayboard import SQUARES, SQUARE_NAMES, PIECE_CODES, PROMOTIONS, CASTLE_BITS, fenRows
+from bitboard import BitBoard, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, \
+    DEST_SQ, PROMO_PIECE, MOVE_SQ_MASK, MOVE_PIECE_MASK, CAPTURE, CASTLE, PROMOTION
+
+WHITE = 8
+EMPTY = 0
+OFFBOARD = 16
+MAILBOX_SQUARES = 120
+# The mailbox square of each of the 64 squares (a8 = 0): a8 is 21, h1 is 98.
+MAILBOX64 = [21 + (i // 8) * 10 + i % 8 for i in range(64)]
+
+def mailbox120():
+    """ For every mailbox square, its index on the 64 square board, or -1. """
+    indices = [-1] * MAILBOX_SQUARES
+    for index, square in enumerate(MAILBOX64):
+        indices[square] = index
+    return indices
+
+MAILBOX120 = mailbox120()
+PIECE_LETTERS = {code: letter for letter, code in PIECE_CODES.items()}
+
+KNIGHT_OFFSETS = (-21, -19, -12, -8, 8, 12, 19, 21)
+ROOK_OFFSETS = (-10, -1, 1, 10)
+BISHOP_OFFSETS = (-11, -9, 9, 11)
+ROYAL_OFFSETS = ROOK_OFFSETS + BISHOP_OFFSETS
+# Piece type: (offsets it moves along, whether it slides).
+PIECE_OFFSETS = {KNIGHT: (KNIGHT_OFFSETS, False),
+                 BISHOP: (BISHOP_OFFSETS, True),
+                 ROOK: (ROOK_OFFSETS, True),
+                 QUEEN: (ROYAL_OFFSETS, True),
+                 KING: (ROYAL_OFFSETS, False)}
+
+# King destination when castling: (rook from, rook to).
+CASTLE_ROOKS = {97:(98,96), 27:(28,26), 93:(91,94), 23:(21,24)}
+# Castle bit: (king from, king to, squares that must be empty, squares not
+# attacked).
+CASTLES = {CASTLE_BITS["K"]:(95, 97, (96,97), (95,96,97)),
+           CASTLE_BITS["Q"]:(95, 93, (92,93,94), (93,94,95)),
+           CASTLE_BITS["k"]:(25, 27, (26,27), (25,26,27)),
+           CASTLE_BITS["q"]:(25, 23, (22,23,24), (23,24,25))}
+WHITE_CASTLES = CASTLE_BITS["K"] | CASTLE_BITS["Q"]
+BLACK_CASTLES = CASTLE_BITS["k"] | CASTLE_BITS["q"]
+
+def castleMasks():
+    """ The castle rights kept when a move leaves or lands on each square. """
+    masks = [WHITE_CASTLES | BLACK_CASTLES] * MAILBOX_SQUARES
+    masks[95] &= ~WHITE_CASTLES
+    masks[25] &= ~BLACK_CASTLES
+    masks[98] &= ~CASTLE_BITS["K"]
+    masks[91] &= ~CASTLE_BITS["Q"]
+    masks[28] &= ~CASTLE_BITS["k"]
+    masks[21] &= ~CASTLE_BITS["q"]
+    return masks
+
+CASTLE_MASKS = castleMasks()
+
+def findPieces(board):
+    """ The piece list of |board|: ((black squares, white squares), [black king, white king]). """
+    pieces = (set(), set())
+    kings = [0, 0]
+    for square in MAILBOX64:
+        piece = board[square]
+        if piece == EMPTY:
+            continue
+        white = piece & WHITE != 0
+        pieces[white].add(square)
+        if piece & 7 == KING:
+            kings[white] = square
+    return pieces, kings
+
+def addPawnMoves(moves, origin, dest, destPiece, meta):
+    """ Adds the pawn move from |origin| to |dest|, all four if it promotes. """
+    src = MAILBOX120[origin]
+    to = MAILBOX120[dest]
+    if dest <= 28 or dest >= 91:
+        moves += [BitBoard.constructMove(src, to, PAWN, destPiece, meta | PROMOTION, p) \
+            for p in PROMOTIONS]
+    else:
+        moves.append(BitBoard.constructMove(src, to, PAWN, destPiece, meta))
+
+class MailboxBoard():
+    def __init__(self, board, whiteToPlay, castles, enpassant, pieces=None):
+        """
+        Params:
+            board: the 120 mailbox squares, with a BitBoard piece, EMPTY or
+                   OFFBOARD on each.
+            castles: the castle rights as BitBoard's castle bits.
+            enpassant: the mailbox square a pawn may take en passant on, or 0.
+            pieces: the piece list, as findPieces() returns it, if known.
+        """
+        assert(len(board) == MAILBOX_SQUARES)
+        self.board = board
+        self.whiteToPlay = whiteToPlay
+        self.castles = castles
+        self.enpassant = enpassant
+        self.pieces, self.kings = findPieces(board) if pieces is None else pieces
+        self.legalMoves = None
+        # What popMove() needs to take back each pushMove().
+        self._undo = []
+
+    def createFromFen(fen):
+        fenArr = fen.split(" ")
+        board = [OFFBOARD] * MAILBOX_SQUARES
+        squares = []
+        for c in fenArr[0].replace("/", ""):
+            squares += [EMPTY] * int(c) if c.isdigit() else [PIECE_CODES[c]]
+        for index, piece in enumerate(squares):
+            board[MAILBOX64[index]] = piece
+        castles = sum(CASTLE_BITS[c] for c in fenArr[2] if c != "-")
+        enpassant = MAILBOX64[SQUARES[fenArr[3]]] if fenArr[3] != "-" else 0
+        return MailboxBoard(board, fenArr[1] == "w", castles, enpassant)
+
+    def moveStr(move):
+        return BitBoard.moveStr(move)
+
+    """ ============= Board protocol (see boards.py) ======================= """
+    def toFen(self):
+        rows = fenRows([PIECE_LETTERS[self.board[s]] for s in MAILBOX64])
+        castles = "".join(c for c in "KQkq" if self.castles & CASTLE_BITS[c])
+        enpassant = SQUARE_NAMES[MAILBOX120[self.enpassant]] if self.enpassant else "-"
+        return "{} {} {} {} 0 1".format(rows, "w" if self.whiteToPlay else "b", \
+            castles or "-", enpassant)
+
+    def copy(self):
+        """ The same position, without the move history or cached moves. """
+        black, white = self.pieces
+        return MailboxBoard(self.board[:], self.whiteToPlay, self.castles, \
+            self.enpassant, ((set(black), set(white)), self.kings[:]))
+
+    def whiteToMove(self):
+        return self.whiteToPlay
+
+    def pieceAt(self, index):
+        return self.board[MAILBOX64[index]]
+
+    def getCastles(self):
+        return self.castles
+
+    def getEnpassant(self):
+        return MAILBOX120[self.enpassant] if self.enpassant else 0
+
+    def positionKey(self):
+        return (bytes(self.board), self.whiteToPlay, self.castles, self.enpassant)
+
+    def activePieces(self):
+        black, white = self.pieces
+        board = self.board
+        return ([(board[s] & 7, MAILBOX120[s]) for s in white], \
+                [(board[s] & 7, MAILBOX120[s]) for s in black])
+
+    def isCheck(self):
+        return self.squareAttacked(self.kings[self.whiteToPlay], not self.whiteToPlay)
+
+    """ ============= Making moves ========================================= """
+    def makeMove(self, move):
+        """
+        |move| is a move int, or a uci string of length 4 or 5.
+        Returns the new board; this one is left as it is.
+        """
+        newBoard = self.copy()
+        newBoard.applyMove(move)
+        return newBoard
+
+    def pushMove(self, move):
+        """ Makes |move| on this board. popMove() takes it back. """
+        self._undo.append(self.applyMove(move))
+
+    def popMove(self):
+        origin, dest, piece, captured, capturedSquare, rook, castles, enpassant, \
+            legalMoves = self._undo.pop()
+        board = self.board
+        white = not self.whiteToPlay
+        ours = self.pieces[white]
+        ours.remove(dest)
+        ours.add(origin)
+        board[dest] = EMPTY
+        board[origin] = piece
+        if captured != EMPTY:
+            board[capturedSquare] = captured
+            self.pieces[not white].add(capturedSquare)
+        if rook is not None:
+            rookFrom, rookTo = rook
+            board[rookFrom] = board[rookTo]
+            board[rookTo] = EMPTY
+            ours.remove(rookTo)
+            ours.add(rookFrom)
+        if piece & 7 == KING:
+            self.kings[white] = origin
+        self.whiteToPlay = white
+        self.castles = castles
+        self.enpassant = enpassant
+        self.legalMoves = legalMoves
+
+    def applyMove(self, move):
+        """ Makes |move| in place, and returns what it takes to undo it. """
+        if isinstance(move, str):
+            assert(len(move) >= 4 and len(move) <= 5)
+            origin = MAILBOX64[SQUARES[move[0:2]]]
+            dest = MAILBOX64[SQUARES[move[2:4]]]
+            promo = PIECE_CODES[move[4]] if len(move) == 5 else 0
+        else:
+            origin = MAILBOX64[move & MOVE_SQ_MASK]
+            dest = MAILBOX64[(move >> DEST_SQ) & MOVE_SQ_MASK]
+            promo = (move >> PROMO_PIECE) & MOVE_PIECE_MASK
+
+        board = self.board
+        white = self.whiteToPlay
+        piece = board[origin]
+
+        # Like Array2DBoard, trust the GUI to send us legal moves only.
+        if piece == EMPTY or (piece & WHITE != 0) != white:
+            print("Illegal move: " + (move if isinstance(move, str) else BitBoard.moveStr(move)))
+            self.prettyPrint()
+
+        ours = self.pieces[white]
+        captured = board[dest]
+        capturedSquare = dest
+        rook = None
+        newPiece = piece
+        newEnpassant = 0
+        kind = piece & 7
+        if kind == PAWN:
+            if dest == self.enpassant:
+                # The pawn taken en passant is right behind |dest|.
+                capturedSquare = dest + (10 if white else -10)
+                captured = board[capturedSquare]
+                board[capturedSquare] = EMPTY
+            elif dest - origin == 20 or origin - dest == 20:
+                newEnpassant = (origin + dest) // 2
+            if dest <= 28 or dest >= 91:
+                newPiece = (piece & WHITE) | ((promo & 7) or QUEEN)
+        elif kind == KING:
+            self.kings[white] = dest
+            if dest - origin == 2 or origin - dest == 2:
+                rook = CASTLE_ROOKS[dest]
+                board[rook[1]] = board[rook[0]]
+                board[rook[0]] = EMPTY
+                ours.remove(rook[0])
+                ours.add(rook[1])
+        if captured != EMPTY:
+            self.pieces[not white].remove(capturedSquare)
+        ours.remove(origin)
+        ours.add(dest)
+        board[origin] = EMPTY
+        board[dest] = newPiece
+
+        undo = (origin, dest, piece, captured, capturedSquare, rook, self.castles, \
+                self.enpassant, self.legalMoves)
+        self.whiteToPlay = not white
+        self.castles &= CASTLE_MASKS[origin] & CASTLE_MASKS[dest]
+        self.enpassant = newEnpassant
+        self.legalMoves = None
+        return undo
+
+    """ ============= Legal moves ========================================== """
+    def legalMovesForPawn(self, square, moves):
+        board = self.board
+        white = self.whiteToPlay
+        forward = -10 if white else 10
+        ahead = square + forward
+
+        # Diagonal take logic
+        for dest in (ahead - 1, ahead + 1):
+            target = board[dest]
+            if target == EMPTY:
+                if dest == self.enpassant:
+                    moves.append(BitBoard.constructMove(MAILBOX120[square], \
+                        MAILBOX120[dest], PAWN, PAWN, CAPTURE))
+            elif target != OFFBOARD and (target & WHITE != 0) != white:
+                addPawnMoves(moves, square, dest, target, CAPTURE)
+
+        # Single, then double step forward logic
+        if board[ahead] != EMPTY:
+            return
+        addPawnMoves(moves, square, ahead, EMPTY, 0)
+        onBaseRow = 81 <= square <= 88 if white else 31 <= square <= 38
+        if onBaseRow and board[ahead + forward] == EMPTY:
+            moves.append(BitBoard.constructMove(MAILBOX120[square], \
+                MAILBOX120[ahead + forward], PAWN))
+
+    def pseudoLegalMoves(self):
+        """ The moves of the side to move, which may leave its king in check. """
+        moves = []
+        board = self.board
+        us = WHITE if self.whiteToPlay else 0
+        for square in self.pieces[self.whiteToPlay]:
+            kind = board[square] & 7
+            if kind == PAWN:
+                self.legalMovesForPawn(square, moves)
+                continue
+            src = MAILBOX120[square]
+            offsets, slides = PIECE_OFFSETS[kind]
+            for offset in offsets:
+                dest = square + offset
+                while True:
+                    target = board[dest]
+                    if target == EMPTY:
+                        moves.append(BitBoard.constructMove(src, MAILBOX120[dest], kind))
+                    else:
+                        if target != OFFBOARD and target & WHITE != us:
+                            moves.append(BitBoard.constructMove(src, MAILBOX120[dest], \
+                                kind, target, CAPTURE))
+                        break
+                    if not slides:
+                        break
+                    dest += offset
+        return moves
+
+    def squareAttacked(self, square, byWhite):
+        """ Is mailbox |square| attacked by white (black) pieces? """
+        board = self.board
+        them = WHITE if byWhite else 0
+        # A white pawn attacks us from the rank below, a black one from above.
+        behind = square + (10 if byWhite else -10)
+        pawn = them | PAWN
+        if board[behind - 1] == pawn or board[behind + 1] == pawn:
+            return True
+        knight = them | KNIGHT
+        for offset in KNIGHT_OFFSETS:
+            if board[square + offset] == knight:
+                return True
+        king = them | KING
+        for offset in ROYAL_OFFSETS:
+            if board[square + offset] == king:
+                return True
+        queen = them | QUEEN
+        for sliders, offsets in ((them | ROOK, ROOK_OFFSETS), (them | BISHOP, BISHOP_OFFSETS)):
+            for offset in offsets:
+                dest = square + offset
+                target = board[dest]
+                while target == EMPTY:
+                    dest += offset
+                    target = board[dest]
+                if target == sliders or target == queen:
+                    return True
+        return False
+
+    def isSquareAttacked(self, index, byWhite=None):
+        """ By the side not to move, unless |byWhite| says otherwise. """
+        if byWhite is None:
+            byWhite = not self.whiteToPlay
+        return self.squareAttacked(MAILBOX64[index], byWhite)
+
+    def isKingSafeAfterMove(self, move):
+        white = self.whiteToPlay
+        self.pushMove(move)
+        safe = not self.squareAttacked(self.kings[white], not white)
+        self.popMove()
+        return safe
+
+    def legalCastleMoves(self):
+        moves = []
+        rights = self.castles & (WHITE_CASTLES if self.whiteToPlay else BLACK_CASTLES)
+        if rights == 0:
+            return moves
+        for right, (origin, dest, empties, unattacked) in CASTLES.items():
+            if not rights & right:
+                continue
+            if any(self.board[s] != EMPTY for s in empties):
+                continue
+            if any(self.squareAttacked(s, not self.whiteToPlay) for s in unattacked):
+                continue
+            moves.append(BitBoard.constructMove(MAILBOX120[origin], MAILBOX120[dest], \
+                KING, 0, CASTLE))
+        return moves
+
+    def getLegalMoves(self):
+        if self.legalMoves is None:
+            self.legalMoves = list(filter(self.isKingSafeAfterMove, \
+                self.pseudoLegalMoves())) + self.legalCastleMoves()
+        return self.legalMoves
+
+    def isCheckMate(self):
+        return len(self.getLegalMoves()) == 0 and self.isCheck()
+
+    def prettyPrint(self):
+        print(" _ _ _ _ _ _ _ _")
+        for r in range(8):
+            print("|" + "|".join(PIECE_LETTERS[self.board[s]] \
+                for s in MAILBOX64[r * 8:r * 8 + 8]) + "|")
@@ -0,0 +1,517 @@
+"""
+Engine-vs-engine match runner.
+
+Plays two UCI engines against each other, several games at a time, each
+engine in its own subprocess driven over asyncio pipes. Every opening is
+played twice with colours swapped. Openings are random walks through the
+opening book (or the positions of an EPD file). Games run under a clock with
+an increment and are adjudicated once both engines agree on a decisive or a
+drawn score. After each game we print the score, the Elo difference and the
+SPRT log-likelihood ratio, and stop as soon as the SPRT accepts either
+hypothesis. Every game is appended to a PGN file.
+
+    python match.py alphabeta_bot.py random_bot.py --games 200 --tc 10+0.1 \\
+        --concurrency 4 --sprt 0 10 --pgn match.pgn
+
+Engines ending in .py run under this python; anything else is a command line.
+"""
+import argparse
+import asyncio
+import math
+import os
+import random
+import shlex
+import sys
+import time
+from bitboard import BitBoard, STARTING_FEN, KING, PAWN, KNIGHT, BISHOP, \
+    CAPTURE, SRC_PIECE, MOVE_META, MOVE_PIECE_MASK
+
+BOOK = "../../books/lichess_alireza.alg"
+BOOK_PLIES = 8
+MATE_SCORE = 100000
+# Margin on top of the clock before a late bestmove loses on time, for the
+# pipe round trip.
+TIME_MARGIN_MS = 200
+# Answering uci and isready.
+HANDSHAKE_TIMEOUT = 30
+
+
+class EngineError(Exception):
+    """ The engine died, hung or sent something we can't play. """
+    pass
+
+
+class UciEngine:
+    """ One engine subprocess. """
+    def __init__(self, command, name):
+        self._command = command
+        self._process = None
+        self.name = name
+        self.options = set()
+
+    async def start(self, options):
+        self._process = await asyncio.create_subprocess_exec(*self._command, \
+            stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE, \
+            stderr=asyncio.subprocess.DEVNULL)
+        self.send("uci")
+        while True:
+            line = await self.readLine(HANDSHAKE_TIMEOUT)
+            if line.startswith("option name "):
+                self.options.add(line[len("option name "):].split(" type ")[0])
+            elif line == "uciok":
+                break
+        for name, value in options.items():
+            if name in self.options:
+                self.send("setoption name {} value {}".format(name, value))
+        await self.isReady()
+
+    def send(self, line):
+        self._process.stdin.write((line + "\n").encode())
+
+    async def readLine(self, timeout):
+        try:
+            line = await asyncio.wait_for(self._process.stdout.readline(), timeout)
+        except asyncio.TimeoutError:
+            raise EngineError("{} timed out".format(self.name))
+        if not line:
+            raise EngineError("{} exited".format(self.name))
+        return line.decode(errors="replace").strip()
+
+    async def isReady(self):
+        self.send("isready")
+        while await self.readLine(HANDSHAKE_TIMEOUT) != "readyok":
+            pass
+
+    async def newGame(self):
+        self.send("ucinewgame")
+        await self.isReady()
+
+    async def go(self, fen, moves, clock):
+        """
+        Returns (move, score from the mover's side or None, seconds taken).
+        Raises EngineError when the clock runs out.
+        """
+        position = "position startpos" if fen == STARTING_FEN else "position fen " + fen
+        if moves:
+            position += " moves " + " ".join(moves)
+        self.send(position)
+        self.send("go " + clock.goArgs())
+        timeLeft = clock.remaining(clock.turn)
+        start = time.time()
+        score = None
+        while True:
+            remaining = (timeLeft + TIME_MARGIN_MS) / 1000 - (time.time() - start)
+            line = await self.readLine(max(remaining, 0.001))
+            if line.startswith("info"):
+                parsed = parseScore(line.split())
+                score = parsed if parsed is not None else score
+            elif line.startswith("bestmove"):
+                words = line.split()
+                return (words[1] if len(words) > 1 else None), score, time.time() - start
+
+    async def quit(self):
+        if self._process is None or self._process.returncode is not None:
+            return
+        try:
+            self.send("quit")
+            await asyncio.wait_for(self._process.wait(), 2)
+        except (asyncio.TimeoutError, ConnectionError):
+            self._process.kill()
+            await self._process.wait()
+
+
+def parseScore(words):
+    """ The centipawn score of an info line, mates as +-MATE_SCORE. """
+    if "string" in words or "score" not in words:
+        return None
+    index = words.index("score")
+    try:
+        if words[index + 1] == "cp":
+            return int(words[index + 2])
+        if words[index + 1] == "mate":
+            mate = int(words[index + 2])
+            return MATE_SCORE - abs(mate) if mate > 0 else -MATE_SCORE + abs(mate)
+    except (IndexError, ValueError):
+        pass
+    return None
+
+def engineCommand(engine):
+    if engine.endswith(".py"):
+        return [sys.executable, engine]
+    return shlex.split(engine)
+
+def engineName(engine):
+    return os.path.splitext(os.path.basename(engineCommand(engine)[-1]))[0]
+
+
+class Clock:
+    """ Both sides' time in ms, with a per-move increment. """
+    def __init__(self, baseMs, incrementMs, whiteToMove):
+        self._times = {True: baseMs, False: baseMs}
+        self._increment = incrementMs
+        self.turn = whiteToMove
+
+    def remaining(self, white):
+        return self._times[white]
+
+    def goArgs(self):
+        return "wtime {} btime {} winc {} binc {}".format(int(self._times[True]), \
+            int(self._times[False]), self._increment, self._increment)
+
+    def punch(self, seconds):
+        """ Charges the side to move; False if its flag fell. """
+        self._times[self.turn] -= seconds * 1000
+        if self._times[self.turn] < 0:
+            return False
+        self._times[self.turn] += self._increment
+        self.turn = not self.turn
+        return True
+
+def parseTimeControl(tc):
+    """ "10+0.1" (seconds + increment) to ms. """
+    base, _, increment = tc.partition("+")
+    return int(float(base) * 1000), int(float(increment or 0) * 1000)
+
+
+class Adjudicator:
+    """
+    Ends games the engines agree on: a resign once both report at least
+    |resignScore| for the winner for |resignMoves| moves each, a draw once both
+    report within |drawScore| for |drawMoves| moves each after |drawMoveNumber|.
+    """
+    def __init__(self, resignScore, resignMoves, drawScore, drawMoves, drawMoveNumber):
+        self._resignScore = resignScore
+        self._resignMoves = resignMoves
+        self._drawScore = drawScore
+        self._drawMoves = drawMoves
+        self._drawMoveNumber = drawMoveNumber
+        self._whiteWins = 0
+        self._blackWins = 0
+        self._draws = 0
+
+    def update(self, whiteMoved, score, ply):
+        """ Returns a result string once the game can be adjudicated. """
+        if score is None:
+            self._whiteWins = self._blackWins = self._draws = 0
+            return None
+        whiteScore = score if whiteMoved else -score
+        self._whiteWins = self._whiteWins + 1 if whiteScore >= self._resignScore else 0
+        self._blackWins = self._blackWins + 1 if whiteScore <= -self._resignScore else 0
+        self._draws = self._draws + 1 \
+            if abs(whiteScore) <= self._drawScore and ply >= 2 * self._drawMoveNumber else 0
+        if self._resignMoves > 0 and self._whiteWins >= 2 * self._resignMoves:
+            return "1-0"
+        if self._resignMoves > 0 and self._blackWins >= 2 * self._resignMoves:
+            return "0-1"
+        if self._drawMoves > 0 and self._draws >= 2 * self._drawMoves:
+            return "1/2-1/2"
+        return None
+
+
+""" =============== Game rules ===================== """
+def isInsufficientMaterial(board):
+    """ Bare kings, or a lone knight or bishop against a bare king. """
+    whites, blacks = board.activePieces()
+    pieces = [p for p, _ in whites + blacks if p != KING]
+    return len(pieces) == 0 or (len(pieces) == 1 and pieces[0] in (KNIGHT, BISHOP))
+
+def gameOver(board, halfmoves, seen):
+    """ (result, termination) if the game is over by the rules, else None. """
+    if len(board.getLegalMoves()) == 0:
+        if board.isCheckMate():
+            return ("0-1" if board.whiteToMove() else "1-0"), "checkmate"
+        return "1/2-1/2", "stalemate"
+    if halfmoves >= 100:
+        return "1/2-1/2", "fifty moves"
+    if seen.get(board._bits, 0) >= 3:
+        return "1/2-1/2", "threefold repetition"
+    if isInsufficientMaterial(board):
+        return "1/2-1/2", "insufficient material"
+    return None
+
+def openingPosition(fen, openingMoves):
+    """
+    (board, halfmoves, seen) after |openingMoves| from |fen|, for gameOver.
+    The start position counts towards repetitions and the fifty move count
+    goes on from the FEN's halfmove clock (EPD has none: 0).
+    """
+    board = BitBoard.createFromFen(fen)
+    fields = fen.split()
+    halfmoves = int(fields[4]) if len(fields) > 4 else 0
+    seen = {board._bits: 1}
+    for move in openingMoves:
+        legal = {BitBoard.moveStr(m): m for m in board.getLegalMoves()}
+        halfmoves = 0 if resetsHalfmoves(legal[move]) else halfmoves + 1
+        board = board.makeMove(move)
+        seen[board._bits] = seen.get(board._bits, 0) + 1
+    return board, halfmoves, seen
+
+def resetsHalfmoves(move):
+    """ Pawn moves and captures reset the fifty move count. """
+    return (move >> SRC_PIECE) & MOVE_PIECE_MASK == PAWN or move & (CAPTURE << MOVE_META)
+
+
+""" =============== Openings ===================== """
+def bookOpenings(file, count, plies, seed):
+    """ |count| (fen, moves) random walks of up to |plies| through a book. """
+    from openings import loadBook
+    book = loadBook(file)
+    # The book picks moves with the random module.
+    random.seed(seed)
+    openings = []
+    for _ in range(count):
+        board = BitBoard.createFromFen(STARTING_FEN)
+        moves = []
+        for _ in range(plies):
+            move = book.chooseMove(board)
+            if move is None:
+                break
+            moves.append(move)
+            board = board.makeMove(move)
+        openings.append((STARTING_FEN, moves))
+    return openings
+
+def epdOpenings(file, count, seed):
+    from epd import loadSuite
+    positions = [(fen, []) for fen, _ in loadSuite(file)]
+    random.Random(seed).shuffle(positions)
+    return [positions[i % len(positions)] for i in range(count)]
+
+
+""" =============== Statistics ===================== """
+def expectedScore(elo):
+    return 1 / (1 + 10 ** (-elo / 400))
+
+def eloFromScore(score):
+    score = min(max(score, 1e-6), 1 - 1e-6)
+    return -400 * math.log10(1 / score - 1)
+
+def scoreStats(wins, draws, losses):
+    """ (mean score, per game variance) of a trinomial result. """
+    games = wins + draws + losses
+    mean = (wins + draws / 2) / games
+    variance = (wins * (1 - mean) ** 2 + draws * (0.5 - mean) ** 2 + \
+                losses * mean ** 2) / games
+    return mean, variance
+
+def eloEstimate(wins, draws, losses):
+    """ (elo, 95% margin) of the first engine over the second. """
+    games = wins + draws + losses
+    if games == 0:
+        return 0.0, float("inf")
+    mean, variance = scoreStats(wins, draws, losses)
+    margin = 1.96 * math.sqrt(variance / games)
+    return eloFromScore(mean), \
+        (eloFromScore(mean + margin) - eloFromScore(mean - margin)) / 2
+
+def sprtBounds(alpha, beta):
+    return math.log(beta / (1 - alpha)), math.log((1 - beta) / alpha)
+
+def sprtLlr(wins, draws, losses, elo0, elo1):
+    """
+    Log-likelihood ratio of H1 (elo1) over H0 (elo0), by the usual normal
+    approximation of the trinomial.
+    """
+    games = wins + draws + losses
+    if games == 0 or wins + losses == 0:
+        return 0.0
+    mean, variance = scoreStats(wins, draws, losses)
+    if variance == 0:
+        return 0.0
+    s0 = expectedScore(elo0)
+    s1 = expectedScore(elo1)
+    return games * (s1 - s0) * (2 * mean - s0 - s1) / (2 * variance)
+
+
+""" =============== PGN ===================== """
+def pgnText(game):
+    headers = [("Event", game["event"]), ("Site", "local"), \
+               ("Date", time.strftime("%Y.%m.%d")), ("Round", str(game["round"])), \
+               ("White", game["white"]), ("Black", game["black"]), \
+               ("Result", game["result"]), ("TimeControl", game["timeControl"]), \
+               ("Termination", game["termination"])]
+    if game["fen"] != STARTING_FEN:
+        headers += [("SetUp", "1"), ("FEN", game["fen"])]
+    board = BitBoard.createFromFen(game["fen"])
+    fields = game["fen"].split()
+    number = int(fields[5]) if len(fields) > 5 else 1
+    white = board.whiteToMove()
+    tokens = []
+    for ply, san in enumerate(board.sanLine(game["moves"])):
+        if white:
+            tokens.append("{}.".format(number))
+        elif ply == 0:
+            tokens.append("{}...".format(number))
+        tokens.append(san)
+        number += 0 if white else 1
+        white = not white
+    tokens.append(game["result"])
+    lines = []
+    line = ""
+    for token in tokens:
+        if len(line) + len(token) + 1 > 79:
+            lines.append(line)
+            line = token
+        else:
+            line = token if line == "" else line + " " + token
+    lines.append(line)
+    return "\n".join("[{} \"{}\"]".format(k, v) for k, v in headers) + \
+        "\n\n" + "\n".join(lines) + "\n\n"
+
+
+""" =============== Match ===================== """
+class Match:
+    def __init__(self, args):
+        self._args = args
+        self._engines = args.engines
+        self._names = [engineName(e) for e in args.engines]
+        if self._names[0] == self._names[1]:
+            self._names = [n + str(i + 1) for i, n in enumerate(self._names)]
+        self._baseMs, self._incrementMs = parseTimeControl(args.tc)
+        self._options = [dict(o.split("=", 1) for o in opts or []) \
+                         for opts in (args.option1, args.option2)]
+        for options in self._options:
+            # The runner picks the openings.
+            options.setdefault("OwnBook", "false")
+        self._wins = self._draws = self._losses = 0
+        self._played = 0
+        self._nextGame = 0
+        self._done = False
+        self._lowerBound, self._upperBound = sprtBounds(args.alpha, args.beta)
+
+    def openings(self):
+        count = (self._args.games + 1) // 2
+        if self._args.openings:
+            return epdOpenings(self._args.openings, count, self._args.seed)
+        return bookOpenings(self._args.book, count, self._args.book_plies, self._args.seed)
+
+    async def playGame(self, index, opening):
+        """ Plays game |index|; the first engine is white in even games. """
+        fen, openingMoves = opening
+        first = index % 2 == 0
+        order = [0, 1] if first else [1, 0]
+        engines = [UciEngine(engineCommand(self._engines[i]), self._names[i]) for i in order]
+        game = {"event": "{} vs {}".format(*self._names), "round": index + 1, \
+                "white": engines[0].name, "black": engines[1].name, "fen": fen, \
+                "moves": list(openingMoves), "timeControl": self._args.tc, \
+                "result": "*", "termination": "unterminated"}
+        board, halfmoves, seen = openingPosition(fen, openingMoves)
+        clock = Clock(self._baseMs, self._incrementMs, board.whiteToMove())
+        adjudicator = Adjudicator(self._args.resign_score, self._args.resign_moves, \
+            self._args.draw_score, self._args.draw_moves, self._args.draw_move_number)
+        try:
+            for i, engine in zip(order, engines):
+                await engine.start(self._options[i])
+                await engine.newGame()
+            while True:
+                over = gameOver(board, halfmoves, seen)
+                if over is not None:
+                    game["result"], game["termination"] = over
+                    break
+                if len(game["moves"]) >= self._args.max_plies:
+                    game["result"], game["termination"] = "1/2-1/2", "adjudication: max plies"
+                    break
+                white = board.whiteToMove()
+                mover = engines[0 if white else 1]
+                loss = "0-1" if white else "1-0"
+                try:
+                    move, score, seconds = await mover.go(fen, game["moves"], clock)
+                except EngineError as e:
+                    game["result"], game["termination"] = loss, str(e)
+                    break
+                if not clock.punch(seconds):
+                    game["result"], game["termination"] = loss, "time forfeit"
+                    break
+                legal = {BitBoard.moveStr(m): m for m in board.getLegalMoves()}
+                if move not in legal:
+                    game["result"] = loss
+                    game["termination"] = "illegal move {} by {}".format(move, mover.name)
+                    break
+                halfmoves = 0 if resetsHalfmoves(legal[move]) else halfmoves + 1
+                board = board.makeMove(move)
+                seen[board._bits] = seen.get(board._bits, 0) + 1
+                game["moves"].append(move)
+                adjudicated = adjudicator.update(white, score, len(game["moves"]))
+                if adjudicated is not None:
+                    game["result"], game["termination"] = adjudicated, "adjudication"
+                    break
+        except EngineError as e:
+            # Died during the handshake: nobody's fault we can score.
+            game["termination"] = str(e)
+        finally:
+            for engine in engines:
+                await engine.quit()
+        return game, first
+
+    def record(self, game, first):
+        result = game["result"]
+        if result == "*":
+            return
+        if result == "1/2-1/2":
+            self._draws += 1
+        elif (result == "1-0") == first:
+            self._wins += 1
+        else:
+            self._losses += 1
+        self._played += 1
+        with open(self._args.pgn, "a") as f:
+            f.write(pgnText(game))
+        elo, margin = eloEstimate(self._wins, self._draws, self._losses)
+        print("Game {} {} - {}: {} {{{}}}".format(game["round"], game["white"], \
+            game["black"], result, game["termination"]))
+        print("Score of {} vs {}: {} - {} - {}  [{:.3f}] {}".format(self._names[0], \
+            self._names[1], self._wins, self._losses, self._draws, \
+            (self._wins + self._draws / 2) / self._played, self._played))
+        print("Elo difference: {:.1f} +/- {:.1f}".format(elo, margin))
+        if self._args.sprt is not None:
+            llr = sprtLlr(self._wins, self._draws, self._losses, *self._args.sprt)
+            print("SPRT: llr {:.2f} ({:.2f}, {:.2f}), elo0 {} elo1 {}".format( \
+                llr, self._lowerBound, self._upperBound, *self._args.sprt))
+            if llr >= self._upperBound or llr <= self._lowerBound:
+                print("SPRT: H{} accepted".format(1 if llr >= self._upperBound else 0))
+                self._done = True
+        sys.stdout.flush()
+
+    async def worker(self, openings):
+        while not self._done and self._nextGame < self._args.games:
+            index = self._nextGame
+            self._nextGame += 1
+            game, first = await self.playGame(index, openings[index // 2])
+            self.record(game, first)
+
+    async def run(self):
+        openings = self.openings()
+        await asyncio.gather(*[self.worker(openings) \
+                               for _ in range(self._args.concurrency)])
+        return self._wins, self._draws, self._losses
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, \
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("engines", nargs=2, help="two engine commands")
+    parser.add_argument("--games", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--tc", default="10+0.1", help="seconds+increment")
+    parser.add_argument("--book", default=BOOK)
+    parser.add_argument("--book-plies", type=int, default=BOOK_PLIES)
+    parser.add_argument("--openings", default=None, help="EPD file instead of the book")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--pgn", default="match.pgn")
+    parser.add_argument("--option1", action="append", metavar="NAME=VALUE")
+    parser.add_argument("--option2", action="append", metavar="NAME=VALUE")
+    parser.add_argument("--sprt", type=float, nargs=2, default=None, metavar=("ELO0", "ELO1"))
+    parser.add_argument("--alpha", type=float, default=0.05)
+    parser.add_argument("--beta", type=float, default=0.05)
+    parser.add_argument("--resign-score", type=int, default=1000)
+    parser.add_argument("--resign-moves", type=int, default=3)
+    parser.add_argument("--draw-score", type=int, default=10)
+    parser.add_argument("--draw-moves", type=int, default=8)
+    parser.add_argument("--draw-move-number", type=int, default=40)
+    parser.add_argument("--max-plies", type=int, default=400)
+    args = parser.parse_args()
+    asyncio.run(Match(args).run())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,74 @@
+import unittest
+from bitboard import STARTING_FEN
+from match import Adjudicator, Clock, eloEstimate, eloFromScore, expectedScore, \
+    gameOver, openingPosition, parseScore, parseTimeControl, scoreStats, sprtBounds, \
+    sprtLlr, MATE_SCORE
+
+class TestStatistics(unittest.TestCase):
+    def test_elo(self):
+        self.assertAlmostEqual(expectedScore(0), 0.5)
+        self.assertAlmostEqual(eloFromScore(expectedScore(200)), 200)
+        self.assertAlmostEqual(eloFromScore(0.75), 190.85, places=2)
+        elo, margin = eloEstimate(60, 20, 20)
+        self.assertAlmostEqual(elo, 147.19, places=2)
+        # Variance 0.16 per game, so the score is 0.7 +- 1.96 * 0.04.
+        self.assertAlmostEqual(margin, (eloFromScore(0.7 + 1.96 * 0.04) - \
+            eloFromScore(0.7 - 1.96 * 0.04)) / 2)
+        self.assertEqual(eloEstimate(0, 0, 0), (0.0, float("inf")))
+        # Draws count half.
+        self.assertEqual(scoreStats(1, 2, 1), (0.5, 0.125))
+
+    def test_sprt(self):
+        lower, upper = sprtBounds(0.05, 0.05)
+        self.assertAlmostEqual(upper, 2.944, places=3)
+        self.assertAlmostEqual(lower, -upper)
+        self.assertAlmostEqual(sprtLlr(100, 100, 80, 0, 10), 0.7206, places=4)
+        # Evidence for H1 mirrors evidence for H0.
+        self.assertAlmostEqual(sprtLlr(80, 100, 100, 0, 10), -sprtLlr(100, 100, 80, -10, 0))
+        self.assertGreater(sprtLlr(1000, 1000, 800, 0, 10), upper)
+        self.assertLess(sprtLlr(800, 1000, 1000, 0, 10), lower)
+        self.assertEqual(sprtLlr(0, 10, 0, 0, 10), 0.0)
+
+class TestMatchHelpers(unittest.TestCase):
+    def test_parseScore(self):
+        self.assertEqual(parseScore("info depth 3 score cp -35 pv e2e4".split()), -35)
+        self.assertEqual(parseScore("info score mate 2 pv a1a8".split()), MATE_SCORE - 2)
+        self.assertEqual(parseScore("info score mate -1".split()), 1 - MATE_SCORE)
+        self.assertIsNone(parseScore("info string score cp 10".split()))
+        self.assertIsNone(parseScore("info depth 3 nodes 10".split()))
+
+    def test_clock(self):
+        self.assertEqual(parseTimeControl("10+0.1"), (10000, 100))
+        self.assertEqual(parseTimeControl("60"), (60000, 0))
+        clock = Clock(1000, 100, True)
+        self.assertTrue(clock.punch(0.5))
+        self.assertEqual(clock.remaining(True), 600)
+        self.assertEqual(clock.goArgs(), "wtime 600 btime 1000 winc 100 binc 100")
+        self.assertFalse(clock.punch(1.5))
+
+    def test_adjudicator(self):
+        adjudicator = Adjudicator(500, 2, 10, 2, 20)
+        # White reports +600, black -600 from its side: two moves each.
+        results = [adjudicator.update(ply % 2 == 0, 600 if ply % 2 == 0 else -600, ply) \
+                   for ply in range(4)]
+        self.assertEqual(results, [None, None, None, "1-0"])
+        adjudicator = Adjudicator(500, 2, 10, 2, 20)
+        self.assertEqual([adjudicator.update(True, 0, ply) for ply in range(40, 44)], \
+            [None, None, None, "1/2-1/2"])
+        adjudicator = Adjudicator(500, 2, 10, 2, 20)
+        self.assertEqual([adjudicator.update(True, 0, ply) for ply in range(4)], [None] * 4)
+    def test_openingPosition(self):
+        # Two knight shuffles bring back the start position a third time.
+        shuffle = ["g1f3", "g8f6", "f3g1", "f6g8"]
+        board, halfmoves, seen = openingPosition(STARTING_FEN, shuffle * 2)
+        self.assertEqual(halfmoves, 8)
+        self.assertEqual(gameOver(board, halfmoves, seen), ("1/2-1/2", "threefold repetition"))
+        board, halfmoves, seen = openingPosition(STARTING_FEN, shuffle)
+        self.assertIsNone(gameOver(board, halfmoves, seen))
+        fen = "8/8/4k3/8/8/4K3/4P3/8 w - - 97 80"
+        board, halfmoves, seen = openingPosition(fen, ["e3d3", "e6d6", "d3e3"])
+        self.assertEqual(gameOver(board, halfmoves, seen), ("1/2-1/2", "fifty moves"))
+        self.assertEqual(openingPosition(fen.rsplit(" ", 2)[0], [])[1], 0)
+
+if __name__ == "__main__":
+    unittest.main()
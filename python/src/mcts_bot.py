@@ -0,0 +1,453 @@
+"""
+Monte Carlo tree search engine: UCT selection, one node expanded per
+iteration, a random (or light, capture-preferring) playout from it with
+random_bot.playout, and the result backed up the path.
+
+The tree lives in this process. With Threads > 1 the playouts, which are
+nearly all the work, run on a process pool: each round selects a batch of
+leaves, using a virtual loss so the batch spreads over the tree, and backs
+up the results as the workers return them. Playouts cut short after
+PlayoutPlies are scored on material.
+
+A search stops at the node budget ("go nodes", else the Nodes option), the
+time limit ("go movetime", or a slice of the clock) or "stop". The tree is
+kept between moves: when the next "position" is the last one plus moves
+found in the tree, search carries on from that subtree.
+
+    python mcts_bot.py                  UCI engine
+    python mcts_bot.py bench [nodes]    nodes/sec on a few positions
+"""
+import math
+import multiprocessing
+import random
+import sys
+import time
+from collections import defaultdict
+from threading import Event
+import bitboard
+from bitboard import BitBoard
+from boards import BOARDS
+from random_bot import playout
+from uci import UciLoop, UciWriter, parsePosition, optionLine, parseSetOption, \
+    parseCheck, parseSpin, parseCombo, processPool
+
+ENGINE_NAME = "WALRUS_MCTS"
+STARTING_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+DEBUG = True
+# Playouts make and unmake thousands of moves, so use the fastest backend.
+DEFAULT_BOARD = "mailbox"
+NODES = 2000
+PLAYOUT_PLIES = 60
+# The UCT exploration constant, in hundredths (sqrt 2).
+EXPLORATION = 141
+# Leaves selected per worker each round with Threads > 1.
+LEAVES_PER_WORKER = 4
+INFO_INTERVAL_MS = 1000
+TIME_SLICE = 30
+# A playout cut short is a win for the side this much material ahead.
+MATERIAL_SCALE = 1000
+BENCH_NODES = 300
+BENCH_FENS = [STARTING_FEN,
+              "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1",
+              "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1"]
+
+# (name, type, min, max) of the options advertised on "uci".
+OPTIONS = [("Threads", "spin", 1, 256),
+           ("Nodes", "spin", 1, 100000000),
+           ("PlayoutPlies", "spin", 1, 1000),
+           ("Policy", "combo", ["random", "light"], None),
+           ("Exploration", "spin", 1, 1000),
+           ("TreeReuse", "check", None, None),
+           ("Board", "combo", list(BOARDS), None),
+           ("Debug", "check", None, None)]
+
+PIECE_VALUES = {bitboard.PAWN: 100,
+                bitboard.KNIGHT: 300,
+                bitboard.BISHOP: 300,
+                bitboard.ROOK: 500,
+                bitboard.QUEEN: 900,
+                bitboard.KING: 0}
+
+
+def scorePlayout(board, light, maxPlies, rng=random):
+    """ Plays out |board| in place; the result for white, from 0 to 1. """
+    result = playout(board, maxPlies, light, rng)
+    if result is not None:
+        return result
+    whites, blacks = board.activePieces()
+    material = sum(PIECE_VALUES[p[0]] for p in whites) - \
+        sum(PIECE_VALUES[p[0]] for p in blacks)
+    return 0.5 + max(-0.5, min(0.5, material / MATERIAL_SCALE))
+
+
+class Node:
+    def __init__(self, move, parent, whiteMoved):
+        """
+        |move| is the uci move leading here from |parent|, and |whiteMoved|
+        whether white made it; value sums the results for that side.
+        """
+        self.move = move
+        self.parent = parent
+        self.whiteMoved = whiteMoved
+        self.children = {}
+        # Moves not expanded yet, None until the node is first visited.
+        self.untried = None
+        self.visits = 0
+        self.value = 0.0
+
+    def uct(self, exploration, logParent):
+        if self.visits == 0:
+            return math.inf
+        return self.value / self.visits + \
+            exploration * math.sqrt(logParent / self.visits)
+
+    def size(self):
+        return 1 + sum(child.size() for child in self.children.values())
+
+    def principalVariation(self):
+        moves = []
+        node = self
+        while node.children:
+            node = max(node.children.values(), key=lambda c: c.visits)
+            moves.append(node.move)
+        return moves
+
+
+class MctsEngine:
+    def __init__(self):
+        self._options = defaultdict(str)
+        self._boardName = DEFAULT_BOARD
+        self._board = BOARDS[DEFAULT_BOARD].createFromFen(STARTING_FEN)
+        self._threads = 1
+        self._pool = None
+        self._nodeBudget = NODES
+        self._playoutPlies = PLAYOUT_PLIES
+        self._light = False
+        self._exploration = EXPLORATION
+        self._treeReuse = True
+        self._debug = DEBUG
+        self._stop = Event()
+        self._out = UciWriter()
+        # The position command last applied, and its search tree.
+        self._positionFen = None
+        self._positionMoves = []
+        self._root = None
+        # Search counters and limits.
+        self._nodes = 0
+        self._nodeLimit = None
+        self._deadline = None
+        self._searchStart = time.time()
+        self._lastInfo = self._searchStart
+
+    def getOption(self, name):
+        return {"Threads": self._threads,
+                "Nodes": self._nodeBudget,
+                "PlayoutPlies": self._playoutPlies,
+                "Policy": "light" if self._light else "random",
+                "Exploration": self._exploration,
+                "TreeReuse": self._treeReuse,
+                "Board": self._boardName,
+                "Debug": self._debug}[name]
+
+    def inputUCI(self):
+        print("id name " + ENGINE_NAME)
+        print("id author Walrus")
+        for name, kind, low, high in OPTIONS:
+            print(optionLine(name, kind, self.getOption(name), low, high))
+        print("uciok")
+
+    def setOptions(self, line):
+        name, value = parseSetOption(line)
+        options = {o[0].lower(): o for o in OPTIONS}
+        if name is None or name.lower() not in options:
+            print("info string unknown option {}".format(name))
+            return
+        name, kind, low, high = options[name.lower()]
+        try:
+            if name == "Threads":
+                self._threads = parseSpin(value, low, high)
+                self.closePool()
+            elif name == "Nodes":
+                self._nodeBudget = parseSpin(value, low, high)
+            elif name == "PlayoutPlies":
+                self._playoutPlies = parseSpin(value, low, high)
+            elif name == "Policy":
+                self._light = parseCombo(value, low) == "light"
+            elif name == "Exploration":
+                self._exploration = parseSpin(value, low, high)
+            elif name == "TreeReuse":
+                self._treeReuse = parseCheck(value)
+            elif name == "Board":
+                self._boardName = parseCombo(value, low)
+                self._board = BOARDS[self._boardName].createFromFen(self._board.toFen())
+                self.closePool()
+            elif name == "Debug":
+                self._debug = parseCheck(value)
+        except (ValueError, TypeError) as e:
+            print("info string bad value for {}: {}".format(name, e))
+
+    def isReady(self):
+        print("readyok")
+
+    def newGame(self):
+        self._root = None
+        self._positionFen = None
+        self._positionMoves = []
+
+    def position(self, line):
+        fen, moves = parsePosition(line)
+        if fen is None:
+            print("weird " + line)
+            return
+        # Carry the tree over when this is the last position plus a few moves.
+        previous = self._positionMoves
+        node = None
+        if self._treeReuse and self._root is not None and fen == self._positionFen \
+                and moves[:len(previous)] == previous:
+            node = self._root
+            for move in moves[len(previous):]:
+                node = node.children.get(move)
+                if node is None:
+                    break
+        self._root = node
+        if node is not None:
+            node.parent = None
+        self._board = BOARDS[self._boardName].createFromFen(fen)
+        for move in moves:
+            self._board = self._board.makeMove(move)
+        self._positionFen = fen
+        self._positionMoves = moves
+
+    def go(self, args):
+        moves = self._board.getLegalMoves()
+        if self._board.isCheckMate():
+            print("CHECK MATED SON")
+            return
+        elif len(moves) == 0:
+            print("stale mate...??")
+            return
+
+        self._nodeLimit = self._nodeBudget
+        self._deadline = None
+        if "nodes" in args:
+            self._nodeLimit = int(args[args.index("nodes") + 1])
+        if "movetime" in args:
+            self._deadline = time.time() + int(args[args.index("movetime") + 1]) / 1000
+        if "infinite" in args:
+            self._nodeLimit = None
+        clock = "wtime" if self._board.whiteToMove() else "btime"
+        if clock in args:
+            usTime = int(args[args.index(clock) + 1])
+            incKey = "winc" if self._board.whiteToMove() else "binc"
+            increment = int(args[args.index(incKey) + 1]) if incKey in args else 0
+            self._deadline = time.time() + \
+                min(usTime / TIME_SLICE + increment * 3 / 4, usTime / 2) / 1000
+            self._nodeLimit = None
+
+        best = self.search(self._board)
+        if "infinite" in args or "ponder" in args:
+            self._out.flush()
+            self._stop.wait()
+        self._out.write("bestmove " + best)
+        self._out.flush()
+
+    def printBoard(self):
+        self._board.prettyPrint()
+        print(self._board.getLegalMoves())
+
+    def run(self):
+        UciLoop(self).run()
+
+    """ =============== MCTS implementation ====================="""
+    def search(self, board):
+        """ Grows the tree from |board| until a limit; returns the best uci move. """
+        if self._root is None:
+            self._root = Node(None, None, not board.whiteToMove())
+        root = self._root
+        self._nodes = 0
+        self._searchStart = time.time()
+        self._lastInfo = self._searchStart
+        board = board.copy()
+        batch = self._threads * LEAVES_PER_WORKER if self._threads > 1 else 1
+        while not self.limitReached():
+            leaves = [self.selectLeaf(root, board) for _ in range(batch)]
+            if self._threads > 1:
+                self.playoutParallel(leaves)
+            else:
+                for leaf, leafBoard, result in leaves:
+                    if result is None:
+                        result = scorePlayout(leafBoard, self._light, self._playoutPlies)
+                    self.backup(leaf, result)
+            self.periodicInfo()
+        self.printInfo()
+        if not root.children:
+            # Stopped before the first playout.
+            return BitBoard.moveStr(board.getLegalMoves()[0])
+        return max(root.children.values(), key=lambda c: c.visits).move
+
+    def limitReached(self):
+        if self._stop.is_set():
+            return True
+        if self._nodeLimit is not None and self._nodes >= self._nodeLimit:
+            return True
+        return self._deadline is not None and time.time() >= self._deadline
+
+    def selectLeaf(self, root, board):
+        """
+        Walks down by UCT from |root| on |board| and expands one move. Returns
+        (leaf, leafBoard, result): result is known (for white) at the end of
+        the game, otherwise None and leafBoard, a copy, needs a playout. Every
+        node on the path takes a visit now, a virtual loss until the result
+        is backed up.
+        """
+        exploration = self._exploration / 100
+        node = root
+        node.visits += 1
+        pushed = 0
+        while True:
+            if node.untried is None:
+                node.untried = [BitBoard.moveStr(m) for m in board.getLegalMoves()]
+                random.shuffle(node.untried)
+            if node.untried:
+                move = node.untried.pop()
+                board.pushMove(move)
+                pushed += 1
+                child = Node(move, node, not board.whiteToMove())
+                node.children[move] = child
+                node = child
+                node.visits += 1
+                break
+            if not node.children:
+                break
+            logParent = math.log(node.visits)
+            node = max(node.children.values(), key=lambda c: c.uct(exploration, logParent))
+            board.pushMove(node.move)
+            pushed += 1
+            node.visits += 1
+        self._nodes += 1
+
+        result = None
+        if node.untried == [] and not node.children:
+            result = 0.5 if not board.isCheck() else 0 if board.whiteToMove() else 1
+        leafBoard = board.copy()
+        for _ in range(pushed):
+            board.popMove()
+        return node, leafBoard, result
+
+    def backup(self, node, result):
+        """ Adds |result| (for white) up the path; the visits are already in. """
+        while node is not None:
+            node.value += result if node.whiteMoved else 1 - result
+            node = node.parent
+
+    def getPool(self):
+        if self._pool is None:
+            self._pool = processPool(self._threads, initPlayoutWorker, (self._boardName,))
+        return self._pool
+
+    def closePool(self):
+        if self._pool is not None:
+            self._pool.terminate()
+            self._pool = None
+
+    def playoutParallel(self, leaves):
+        """ Plays out |leaves| on the pool and backs up the results. """
+        pool = self.getPool()
+        pending = []
+        for leaf, leafBoard, result in leaves:
+            if result is None:
+                pending.append((leaf, leafBoard.toFen()))
+            else:
+                self.backup(leaf, result)
+        it = pool.imap(playoutTask, [(fen, self._light, self._playoutPlies) \
+            for _, fen in pending])
+        for i, (leaf, _) in enumerate(pending):
+            while True:
+                try:
+                    result = it.next(timeout=0.005)
+                    break
+                except multiprocessing.TimeoutError:
+                    if self._stop.is_set():
+                        # Take back the virtual losses of the playouts we
+                        # won't get, so the tree stays usable.
+                        self.closePool()
+                        for node, _ in pending[i:]:
+                            self.undoVisit(node)
+                        return
+            self.backup(leaf, result)
+
+    def undoVisit(self, node):
+        while node is not None:
+            node.visits -= 1
+            node = node.parent
+
+    """ =============== Output ====================="""
+    def periodicInfo(self):
+        now = time.time()
+        if (now - self._lastInfo) * 1000 >= INFO_INTERVAL_MS:
+            self._lastInfo = now
+            self.printInfo()
+
+    def printInfo(self):
+        if not self._debug or not self._root.children:
+            return
+        root = self._root
+        best = max(root.children.values(), key=lambda c: c.visits)
+        pv = root.principalVariation()
+        # The win rate of the side to move as centipawns, the usual logistic.
+        winRate = min(max(best.value / max(best.visits, 1), 0.001), 0.999)
+        score = int(400 * math.log10(winRate / (1 - winRate)))
+        elapsedMs = int((time.time() - self._searchStart) * 1000)
+        self._out.write("info depth {} score cp {} nodes {} nps {} time {} pv {}".format( \
+            len(pv), score, self._nodes, self._nodes * 1000 // max(elapsedMs, 1), \
+            elapsedMs, " ".join(pv)))
+
+    def bench(self, args=[]):
+        """
+        "bench [nodes]": grows a fresh tree of |nodes| on each of BENCH_FENS
+        and prints nodes/sec.
+        """
+        nodes = int(args[0]) if len(args) > 0 else BENCH_NODES
+        debug = self._debug
+        self._debug = False
+        start = time.time()
+        for i, fen in enumerate(BENCH_FENS):
+            self.newGame()
+            self._nodeLimit = nodes
+            self._deadline = None
+            self._stop.clear()
+            move = self.search(BOARDS[self._boardName].createFromFen(fen))
+            print("Position: {}/{} ({}) best {} tree {}".format(i + 1, len(BENCH_FENS), \
+                fen, move, self._root.size()))
+            sys.stdout.flush()
+        elapsed = time.time() - start
+        self._debug = debug
+        self.newGame()
+        total = nodes * len(BENCH_FENS)
+        print("===========================")
+        print("Total time (ms) : {}".format(int(elapsed * 1000)))
+        print("Nodes searched  : {}".format(total))
+        print("Nodes/second    : {}".format(int(total / max(elapsed, 1e-9))))
+
+
+""" =============== Playout workers ====================="""
+_workerBoard = None
+
+def initPlayoutWorker(boardName):
+    global _workerBoard
+    _workerBoard = BOARDS[boardName]
+
+def playoutTask(task):
+    fen, light, maxPlies = task
+    return scorePlayout(_workerBoard.createFromFen(fen), light, maxPlies)
+
+
+if __name__ == "__main__":
+    if len(sys.argv) > 1 and sys.argv[1] == "bench":
+        # python mcts_bot.py bench [nodes]
+        engine = MctsEngine()
+        engine.bench(sys.argv[2:])
+        engine.closePool()
+        sys.exit(0)
+    engine = MctsEngine()
+    engine.run()
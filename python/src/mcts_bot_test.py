@@ -0,0 +1,20 @@
+import random
+import unittest
+from mcts_bot import MctsEngine
+
+class TestMcts(unittest.TestCase):
+    def test_mcts(self):
+        random.seed(1)
+        engine = MctsEngine()
+        engine._debug = False
+        engine.position("position fen 6k1/5ppp/8/8/8/8/8/R5K1 w - - 0 1")
+        engine._nodeLimit = 300
+        self.assertEqual(engine.search(engine._board), "a1a8")
+        # The tree carries over to the reply when it was searched.
+        root = engine._root
+        reply = next(iter(root.children["a1a2"].children))
+        engine.position("position fen 6k1/5ppp/8/8/8/8/8/R5K1 w - - 0 1 moves a1a2 " + reply)
+        self.assertIs(engine._root, root.children["a1a2"].children[reply])
+
+if __name__ == "__main__":
+    unittest.main()
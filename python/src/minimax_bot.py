@@ -1,18 +1,32 @@
 import bitboard
 import copy
+import os
 import sys
 import random
 import time
 from bitboard import BitBoard
+from boards import BOARDS, DEFAULT_BOARD
 from collections import defaultdict
-from threading import Thread
-from openings import OpeningTree
+from threading import Event
+from openings import BookLoader
+from uci import SearchStopped, UciLoop, parsePosition, optionLine, \
+    parseSetOption, parseCheck, parseSpin, parseCombo
 
 ENGINE_NAME = "BAD_MINIMAX"
 STARTING_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
 TEST_FEN = "rn2k3/2pp1pp1/2b1pn2/1BB5/P3P3/1PN2Q1r/2PP1P1P/R3K1NR w KQq - 0 15"
 ALIREZA = "books/lichess_alireza.alg"
+# Book moves are only played this many plies into the game.
+BOOK_PLIES = 10
 DEBUG = False
+USE_BOOK = True
+
+# (name, type, min, max) of the options advertised on "uci".
+OPTIONS = [("MaxDepth", "spin", 1, 10),
+           ("OwnBook", "check", None, None),
+           ("BookFile", "string", None, None),
+           ("Debug", "check", None, None),
+           ("Board", "combo", list(BOARDS), None)]
 
 PIECE_VALUES = {bitboard.PAWN: 100,
                 bitboard.ROOK: 500,
@@ -24,71 +38,106 @@ PIECE_VALUES = {bitboard.PAWN: 100,
 class MiniMaxEngine:
     def __init__(self):
         self._options = defaultdict(str)
-        self._board = BitBoard(0)
+        self._boardName = DEFAULT_BOARD
+        self._board = BOARDS[DEFAULT_BOARD].createFromFen(STARTING_FEN)
         self._maxDepth = 3 # in plies
         self._table = {}
         self._moves = 0
+        self._stop = Event()
+        self._useBook = USE_BOOK
+        self._debug = DEBUG
+        self._bookLoader = None
+        self.loadBook(ALIREZA if os.path.exists(ALIREZA) else "../" + ALIREZA)
+
+    def loadBook(self, file):
+        # The book loads in the background; getOpenings() waits for it.
+        self._bookLoader = BookLoader(file)
+        self._bookFile = file
+
+    def getOpenings(self):
+        """ The position-keyed opening book, or None without a usable one. """
+        if self._bookLoader is None:
+            return None
         try:
-            self._openings = OpeningTree.generateFromFile(ALIREZA)
-        except FileNotFoundError:
-            self._openings = OpeningTree.generateFromFile("../" + ALIREZA)
+            return self._bookLoader.getBook()
+        except (OSError, ValueError) as e:
+            print("info string could not load book {}: {}".format( \
+                self._bookLoader.getFile(), e))
+            self._bookLoader = None
+            return None
+
+    def getOption(self, name):
+        return {"MaxDepth": self._maxDepth,
+                "OwnBook": self._useBook,
+                "BookFile": self._bookFile,
+                "Debug": self._debug,
+                "Board": self._boardName}[name]
 
     def inputUCI(self):
         print("id name " + ENGINE_NAME)
         print("id author Walrus")
+        for name, kind, low, high in OPTIONS:
+            print(optionLine(name, kind, self.getOption(name), low, high))
         print("uciok")
 
     def setOptions(self, line):
-        print("unimplemented")
+        name, value = parseSetOption(line)
+        options = {o[0].lower(): o for o in OPTIONS}
+        if name is None or name.lower() not in options:
+            print("info string unknown option {}".format(name))
+            return
+        name, kind, low, high = options[name.lower()]
+        try:
+            if name == "MaxDepth":
+                self._maxDepth = parseSpin(value, low, high)
+            elif name == "OwnBook":
+                self._useBook = parseCheck(value)
+            elif name == "BookFile":
+                self.loadBook(value)
+                # Surface a bad path here rather than on the next game.
+                self._bookLoader.getBook()
+            elif name == "Debug":
+                self._debug = parseCheck(value)
+            elif name == "Board":
+                self._boardName = parseCombo(value, low)
+                self._board = BOARDS[self._boardName].createFromFen(self._board.toFen())
+        except (ValueError, TypeError, OSError) as e:
+            print("info string bad value for {}: {}".format(name, e))
 
     def isReady(self):
         print("readyok")
 
     def newGame(self):
-        # _bookMoves is a OpeningsTree node that is not None as long as there
-        # are still moves remaining.
-        self._bookMoves = self._openings
         self._table = {}
         self._moves = 0
 
     def printBookMoves(self):
         print("book moves (move #{})".format(self._moves))
-        children = self._bookMoves.getChildren()
-        for c in children:
-            print("  {}: {}".format(c, children[c].getCount()))
+        book = self.getOpenings()
+        moves = book.getMoves(self._board) if book is not None else {}
+        for move, count in moves.items():
+            print("  {}: {}".format(move, count))
 
     def position(self, line):
-        words = line.split()
-        assert(words[0] == "position")
-
-        if words[1] == "startpos":
-            self._bookMoves = self._openings
-            self._board = BitBoard.createFromFen(STARTING_FEN)
-            self._moves = 0
-            if DEBUG:
-                self.printBookMoves()
-            if len(words) > 2 and words[2] == "moves":
-                for move in words[3:]:
-                    self._board = self._board.makeMove(move)
-                    self._moves += 1
-                    if self._bookMoves is None:
-                        continue
-                    if move in self._bookMoves.getChildren():
-                        self._bookMoves = self._bookMoves.getChild(move)
-                        if DEBUG:
-                            self.printBookMoves()
-                    else:
-                        self._bookMoves = None
-        else:
-            print("weird " + words.join())
-
-    def go(self):
+        fen, moves = parsePosition(line)
+        if fen is None:
+            print("weird " + line)
+            return
+
+        self._board = BOARDS[self._boardName].createFromFen(fen)
+        self._moves = 0
+        for move in moves:
+            self._board = self._board.makeMove(move)
+            self._moves += 1
+        if self._debug:
+            self.printBookMoves()
+
+    def go(self, args):
         # Consult the opening book first
-        if self._bookMoves is not None and self._moves < 10:
-            children = self._bookMoves.getChildren()
-            values = [c.getCount() for c in children.values()]
-            print("bestmove " + \
-                random.choices(list(children.keys()), values)[0])
+        book = self.getOpenings() if self._useBook and self._moves < BOOK_PLIES else None
+        bookMove = book.chooseMove(self._board) if book is not None else None
+        if bookMove is not None:
+            print("bestmove " + bookMove)
             return
 
         self._bestMoves = []
@@ -106,29 +155,19 @@ class MiniMaxEngine:
         bestMoves = copy.copy(info['moves'])
         # print(bestMoves)
         # print(info['score'])
-        print("bestmove " + random.choice(bestMoves))
+        if len(bestMoves) == 0:
+            # Stopped before the first root move was searched.
+            bestMoves = [BitBoard.moveStr(moves[0])]
+        if "infinite" in args or "ponder" in args:
+            self._stop.wait()
+        print("bestmove " + random.choice(bestMoves), flush=True)
+
+    def printBoard(self):
+        self._board.prettyPrint()
+        print(self._board.getLegalMoves())
 
     def run(self):
-        while True:
-            line = input()
-            if line == "uci":
-                self.inputUCI()
-            elif line.startswith("setoption"):
-                self.setOptions(line)
-            elif line.startswith("isready"):
-                self.isReady()
-            elif line.startswith("ucinewgame"):
-                self.newGame()
-            elif line.startswith("position"):
-                self.position(line)
-            elif line.startswith("go"):
-                self.go()
-            elif line.startswith("print"):
-                self._board.prettyPrint()
-                print(self._board.getLegalMoves())
-            elif line.startswith("end") or line.startswith("quit"):
-                print("goodbye")
-                break
+        UciLoop(self).run()
 
     """ =============== Minimax implementation ====================="""
     def evaluatePosition(board):
@@ -140,6 +179,8 @@ class MiniMaxEngine:
         return whiteScore - blackScore
 
     def search(self, board, info, depth = 0, moves = ""):
+        if self._stop.is_set() and depth > 0:
+            raise SearchStopped()
         if board.isCheckMate():
             return 1, (-10000 if board.whiteToMove() else 10000)
         if len(board.getLegalMoves()) == 0:  # stalemate
@@ -157,10 +198,16 @@ class MiniMaxEngine:
             start = time.time()
         for move in board.getLegalMoves():
             i += 1
+            newBoard = board.makeMove(move)
+            move = BitBoard.moveStr(move)
             if depth == 0:
                 print("info currmove {} currmovenumber {}".format(move, i))
-            newBoard = board.makeMove(move)
-            newNodes, score = self.search(newBoard, {}, depth + 1, moves + move + " ")
+            try:
+                newNodes, score = self.search(newBoard, {}, depth + 1, moves + move + " ")
+            except SearchStopped:
+                if depth > 0:
+                    raise
+                break
             nodes += newNodes
             if (board.whiteToMove() and (score > bestScore)) or \
                     ((not board.whiteToMove()) and (score < bestScore)):
@@ -179,7 +226,7 @@ class MiniMaxEngine:
             elapsedMs = int((time.time() - start) * 1000)
             print("info depth {} score cp {} time {} nodes {} pv {}".format( \
                 self._maxDepth, bestScore * (1 if board.whiteToMove() else -1), \
-                elapsedMs, nodes, bestMoves[0]))
+                elapsedMs, nodes, bestMoves[0] if bestMoves else ""))
         return nodes, bestScore
 
 
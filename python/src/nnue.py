@@ -0,0 +1,407 @@
+"""
+Small NNUE-style evaluator for AlphaBetaEngine.
+
+Features are king-relative piece-squares (HalfKP): for each perspective, one
+feature per non-king piece, indexed by (own king square, piece, square), with
+black's perspective mirrored so both sides share the weights.
+
+    feature transformer: 40960 -> ACC_SIZE, one accumulator per perspective
+    head: [stm acc, other acc] (2 x ACC_SIZE) -> HIDDEN_SIZE -> 1
+
+The accumulators are updated incrementally: AlphaBetaEngine calls push() after
+every makeMove and pop() when it unwinds, and only the handful of features
+whose squares changed are subtracted/added. A perspective is only refreshed
+from scratch when its own king moves. The feature transformer can be stored
+quantized (int16, scaled by FT_SCALE), in which case the accumulators are
+int16 too and only the tiny head runs in float32.
+
+Usage:
+    python nnue.py train [--alg FILE] [--pgn FILE] [--selfplay N] --out net.npz
+    python nnue.py bench net.npz [--depth 2]
+"""
+import argparse
+import contextlib
+import io
+import math
+import multiprocessing
+import random
+import sys
+import time
+
+import numpy as np
+
+import bitboard
+import texel
+from bitboard import BitBoard, PIECE_MASK, PIECE_SIZE, NUM_SQUARES
+from openings import convertPgnToAlgebraic
+
+ACC_SIZE = 32
+HIDDEN_SIZE = 32
+NUM_PIECES = 10  # P, N, B, R, Q for each side
+NUM_FEATURES = NUM_SQUARES * NUM_PIECES * NUM_SQUARES
+MAX_ACTIVE = 30
+FT_SCALE = 127
+# The network's output is in logits: sigmoid(out) is the expected score. This
+# converts it to the same centipawn scale as the Texel tuner (K = 1).
+EVAL_SCALE = 400 / math.log(10)
+BOARD_MASK = (1 << (NUM_SQUARES * PIECE_SIZE)) - 1
+WHITE = 1
+BLACK = 0
+
+
+def featureIndex(perspective, kingSquare, piece, square):
+    """
+    |piece| is a 4-bit BitBoard piece. Squares use BitBoard indexing (a8 = 0),
+    so black's perspective flips ranks with ^ 56.
+    """
+    side = BitBoard.pieceSide(piece)
+    pieceIndex = BitBoard.pieceType(piece) - 1 + (0 if side == perspective else 5)
+    if perspective == BLACK:
+        kingSquare ^= 56
+        square ^= 56
+    return (kingSquare * NUM_PIECES + pieceIndex) * NUM_SQUARES + square
+
+def kingSquares(board):
+    return board.findPiece(8 | bitboard.KING), board.findPiece(bitboard.KING)
+
+def activeFeatures(board, perspective, kingSquare=None):
+    if kingSquare is None:
+        kingSquare = board.findPiece((8 if perspective == WHITE else 0) | bitboard.KING)
+    features = []
+    bits = board._bits & BOARD_MASK
+    square = 0
+    while bits:
+        piece = bits & PIECE_MASK
+        if piece != 0 and BitBoard.pieceType(piece) != bitboard.KING:
+            features.append(featureIndex(perspective, kingSquare, piece, square))
+        bits >>= PIECE_SIZE
+        square += 1
+    return features
+
+
+class Network:
+    """ Weights of the evaluator, loadable from / savable to an .npz file. """
+    def __init__(self, ftWeight, ftBias, l1Weight, l1Bias, outWeight, outBias):
+        self.ftWeight = ftWeight
+        self.ftBias = ftBias
+        self.l1Weight = l1Weight.astype(np.float32)
+        self.l1Bias = l1Bias.astype(np.float32)
+        self.outWeight = outWeight.astype(np.float32)
+        self.outBias = outBias.astype(np.float32)
+        self.quantized = ftWeight.dtype == np.int16
+
+    def random(seed=0):
+        rng = np.random.default_rng(seed)
+        return Network(
+            rng.normal(0, 0.01, (NUM_FEATURES, ACC_SIZE)).astype(np.float32),
+            np.full(ACC_SIZE, 0.5, dtype=np.float32),
+            rng.normal(0, 1 / math.sqrt(2 * ACC_SIZE), (2 * ACC_SIZE, HIDDEN_SIZE)).astype(np.float32),
+            np.zeros(HIDDEN_SIZE, dtype=np.float32),
+            rng.normal(0, 1 / math.sqrt(HIDDEN_SIZE), (HIDDEN_SIZE, 1)).astype(np.float32),
+            np.zeros(1, dtype=np.float32))
+
+    def load(file):
+        data = np.load(file)
+        return Network(data["ft_weight"], data["ft_bias"], data["l1_weight"], \
+            data["l1_bias"], data["out_weight"], data["out_bias"])
+
+    def save(self, file, quantize=False):
+        ftWeight, ftBias = self.ftWeight, self.ftBias
+        if quantize and not self.quantized:
+            ftWeight = np.rint(ftWeight * FT_SCALE).astype(np.int16)
+            ftBias = np.rint(ftBias * FT_SCALE).astype(np.int16)
+        np.savez(file, ft_weight=ftWeight, ft_bias=ftBias, \
+            l1_weight=self.l1Weight, l1_bias=self.l1Bias, \
+            out_weight=self.outWeight, out_bias=self.outBias)
+
+    def accumulate(self, features):
+        return self.ftBias + self.ftWeight[features].sum(axis=0, dtype=self.ftBias.dtype)
+
+    def head(self, stmAcc, otherAcc):
+        """ Side-to-move relative evaluation in centipawns. """
+        x = np.concatenate((stmAcc, otherAcc)).astype(np.float32)
+        if self.quantized:
+            x /= FT_SCALE
+        np.clip(x, 0.0, 1.0, out=x)
+        hidden = np.maximum(x @ self.l1Weight + self.l1Bias, 0.0)
+        return float((hidden @ self.outWeight + self.outBias)[0]) * EVAL_SCALE
+
+
+class NnueEvaluator:
+    """
+    Stack of (white, black) accumulators, mirroring the search's make/unmake.
+    """
+    def __init__(self, network):
+        self._net = network
+        self._stack = []
+
+    def load(file):
+        return NnueEvaluator(Network.load(file))
+
+    def reset(self, board):
+        whiteKing, blackKing = kingSquares(board)
+        self._stack = [(
+            self._net.accumulate(activeFeatures(board, WHITE, whiteKing)),
+            self._net.accumulate(activeFeatures(board, BLACK, blackKing)),
+            whiteKing, blackKing)]
+
+    def push(self, parent, child):
+        """ Accumulators for |child|, reached from |parent| by one move. """
+        white, black, whiteKing, blackKing = self._stack[-1]
+        diff = (parent._bits ^ child._bits) & BOARD_MASK
+        removed = []
+        added = []
+        kings = [blackKing, whiteKing]
+        refresh = [False, False]
+        while diff:
+            lowest = diff & -diff
+            square = (lowest.bit_length() - 1) // PIECE_SIZE
+            shift = square * PIECE_SIZE
+            diff &= ~(PIECE_MASK << shift)
+            old = (parent._bits >> shift) & PIECE_MASK
+            new = (child._bits >> shift) & PIECE_MASK
+            for piece, changes in ((old, removed), (new, added)):
+                if piece == 0:
+                    continue
+                if BitBoard.pieceType(piece) == bitboard.KING:
+                    refresh[BitBoard.pieceSide(piece)] = True
+                    if piece == new:
+                        kings[BitBoard.pieceSide(piece)] = square
+                    continue
+                changes.append((piece, square))
+        blackKing, whiteKing = kings
+        white = self.update(child, WHITE, whiteKing, white, removed, added, refresh[WHITE])
+        black = self.update(child, BLACK, blackKing, black, removed, added, refresh[BLACK])
+        self._stack.append((white, black, whiteKing, blackKing))
+
+    def update(self, board, perspective, kingSquare, acc, removed, added, refresh):
+        if refresh:
+            return self._net.accumulate(activeFeatures(board, perspective, kingSquare))
+        weights = self._net.ftWeight
+        acc = acc.copy()
+        for piece, square in removed:
+            acc -= weights[featureIndex(perspective, kingSquare, piece, square)]
+        for piece, square in added:
+            acc += weights[featureIndex(perspective, kingSquare, piece, square)]
+        return acc
+
+    def pop(self):
+        self._stack.pop()
+
+    def evaluate(self, board):
+        """ White-relative centipawns, like AlphaBetaEngine.evaluatePosition. """
+        white, black = self._stack[-1][:2]
+        if board.whiteToMove():
+            return int(self._net.head(white, black))
+        return -int(self._net.head(black, white))
+
+
+""" =============== Training ===================== """
+def extractTrainingGame(game):
+    """
+    Replays one game (see texel.extractGame) and returns, for each quiet
+    position, the side-to-move and other-side feature lists, the side-to-move
+    PST eval and which side was to move, plus the game result for white.
+    """
+    import alphabeta_bot
+    moves, result = game
+    board = BitBoard.createFromFen(texel.STARTING_FEN)
+    rows = []
+    try:
+        if isinstance(moves, str):
+            moves = convertPgnToAlgebraic(moves)
+        for ply, move in enumerate(moves):
+            if ply >= texel.SKIP_PLIES and texel.isQuiet(board):
+                stm = WHITE if board.whiteToMove() else BLACK
+                pst = alphabeta_bot.AlphaBetaEngine.evaluatePosition(board)
+                rows.append((activeFeatures(board, stm), activeFeatures(board, 1 - stm), \
+                    pst if stm == WHITE else -pst, stm))
+            board = board.makeMove(move)
+    except Exception:
+        return [], 0.5
+    if result is None:
+        result = texel.resultFromFinalPosition(board)
+    return rows, result
+
+def padFeatures(features):
+    return features + [NUM_FEATURES] * (MAX_ACTIVE - len(features))
+
+def extractTrainingData(games, processes=None):
+    stmFeatures = []
+    otherFeatures = []
+    pstScores = []
+    results = []
+    with multiprocessing.Pool(processes) as pool:
+        for rows, result in pool.imap_unordered(extractTrainingGame, games, 16):
+            for stm, other, pst, side in rows:
+                stmFeatures.append(padFeatures(stm))
+                otherFeatures.append(padFeatures(other))
+                pstScores.append(pst)
+                results.append(result if side == WHITE else 1 - result)
+    return np.array(stmFeatures, dtype=np.int32).reshape(-1, MAX_ACTIVE), \
+           np.array(otherFeatures, dtype=np.int32).reshape(-1, MAX_ACTIVE), \
+           np.array(pstScores, dtype=np.float32), \
+           np.array(results, dtype=np.float32)
+
+def selfPlayGames(numGames, maxPlies=200, epsilon=0.1, seed=0):
+    """
+    Cheap self-play: each side plays the move with the best static eval,
+    with an |epsilon| chance of a random move to keep the games varied.
+    """
+    import alphabeta_bot
+    rng = random.Random(seed)
+    evaluate = alphabeta_bot.AlphaBetaEngine.evaluatePosition
+    for _ in range(numGames):
+        board = BitBoard.createFromFen(texel.STARTING_FEN)
+        moves = []
+        for _ in range(maxPlies):
+            legalMoves = board.getLegalMoves()
+            if len(legalMoves) == 0:
+                break
+            if rng.random() < epsilon:
+                move = rng.choice(legalMoves)
+            else:
+                sign = 1 if board.whiteToMove() else -1
+                move = max(legalMoves, key=lambda m: sign * evaluate(board.makeMove(m)))
+            moves.append(BitBoard.moveStr(move))
+            board = board.makeMove(move)
+        yield moves, None
+
+def train(network, stmFeatures, otherFeatures, pstScores, results, epochs=10, \
+          batchSize=1024, learningRate=1e-3, resultWeight=0.5, seed=0, verbose=True):
+    """
+    Minibatch Adam on the cross-entropy between sigmoid(output) and a blend of
+    the game result and the (squashed) PST eval of the position.
+    """
+    targets = resultWeight * results + \
+        (1 - resultWeight) / (1 + np.exp(-pstScores / EVAL_SCALE))
+    # One extra all-zero row for the padding feature.
+    ftWeight = np.vstack((network.ftWeight.astype(np.float32), np.zeros((1, ACC_SIZE), np.float32)))
+    params = [ftWeight, network.ftBias.astype(np.float32), network.l1Weight, \
+              network.l1Bias, network.outWeight, network.outBias]
+    moments = [(np.zeros_like(p), np.zeros_like(p)) for p in params]
+    rng = np.random.default_rng(seed)
+    n = len(targets)
+    step = 0
+    for epoch in range(epochs):
+        order = rng.permutation(n)
+        totalLoss = 0.0
+        for start in range(0, n, batchSize):
+            batch = order[start:start + batchSize]
+            fs, fo, t = stmFeatures[batch], otherFeatures[batch], targets[batch]
+            m = len(batch)
+            W1, b1, W2, b2, W3, b3 = params
+
+            accS = b1 + W1[fs].sum(axis=1)
+            accO = b1 + W1[fo].sum(axis=1)
+            x = np.clip(np.concatenate((accS, accO), axis=1), 0.0, 1.0)
+            z2 = x @ W2 + b2
+            h = np.maximum(z2, 0.0)
+            out = (h @ W3 + b3)[:, 0]
+            p = 1 / (1 + np.exp(-out))
+            totalLoss += -np.sum(t * np.log(p + 1e-9) + (1 - t) * np.log(1 - p + 1e-9))
+
+            dOut = ((p - t) / m)[:, None]
+            gW3 = h.T @ dOut
+            gb3 = dOut.sum(axis=0)
+            dz2 = (dOut @ W3.T) * (z2 > 0)
+            gW2 = x.T @ dz2
+            gb2 = dz2.sum(axis=0)
+            accAll = np.concatenate((accS, accO), axis=1)
+            dx = (dz2 @ W2.T) * ((accAll > 0) & (accAll < 1))
+            dAccS, dAccO = dx[:, :ACC_SIZE], dx[:, ACC_SIZE:]
+            gb1 = dAccS.sum(axis=0) + dAccO.sum(axis=0)
+            gW1 = np.zeros_like(W1)
+            np.add.at(gW1, fs.ravel(), np.repeat(dAccS, MAX_ACTIVE, axis=0))
+            np.add.at(gW1, fo.ravel(), np.repeat(dAccO, MAX_ACTIVE, axis=0))
+            gW1[NUM_FEATURES] = 0
+
+            step += 1
+            for param, grad, (mom, vel) in zip(params, [gW1, gb1, gW2, gb2, gW3, gb3], moments):
+                mom *= 0.9
+                mom += 0.1 * grad
+                vel *= 0.999
+                vel += 0.001 * grad * grad
+                param -= learningRate * (mom / (1 - 0.9 ** step)) / \
+                    (np.sqrt(vel / (1 - 0.999 ** step)) + 1e-8)
+        if verbose:
+            print("  epoch {}: loss {:.6f}".format(epoch + 1, totalLoss / n), \
+                file=sys.stderr, flush=True)
+    return Network(params[0][:NUM_FEATURES], *params[1:])
+
+
+""" =============== Benchmarking ===================== """
+BENCH_FENS = [texel.STARTING_FEN,
+              "r1bqkbnr/pppp1ppp/2n5/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R w KQkq - 2 3",
+              "r3k2r/pp1nbppp/2p1pn2/q7/2BP4/2N1PN2/PP3PPP/R2QK2R w KQkq - 0 10",
+              "8/5pk1/6p1/3R4/7P/6P1/5PK1/3r4 b - - 0 40"]
+
+def compareNps(evaluator, depth=2, fens=BENCH_FENS):
+    """ Runs the same fixed-depth searches with the PST eval and |evaluator|. """
+    import alphabeta_bot
+    results = {}
+    for name, nnue in (("pst", None), ("nnue", evaluator)):
+        engine = alphabeta_bot.AlphaBetaEngine()
+        engine._nnue = nnue
+        engine._maxDepth = depth
+        nodes = 0
+        start = time.time()
+        for fen in fens:
+            engine._nodes = 0
+            with contextlib.redirect_stdout(io.StringIO()):
+                engine.search(BitBoard.createFromFen(fen))
+            nodes += engine._nodes
+        elapsed = time.time() - start
+        results[name] = (nodes, elapsed)
+        print("{:5}: {:6d} nodes {:7.2f}s {:8.1f} nps".format(\
+            name, nodes, elapsed, nodes / elapsed))
+    return results
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Train or benchmark the NNUE evaluator.")
+    sub = parser.add_subparsers(dest="command", required=True)
+    trainParser = sub.add_parser("train")
+    trainParser.add_argument("--alg", action="append", default=[])
+    trainParser.add_argument("--pgn", action="append", default=[])
+    trainParser.add_argument("--selfplay", type=int, default=0)
+    trainParser.add_argument("--max-games", type=int, default=None)
+    trainParser.add_argument("--processes", type=int, default=None)
+    trainParser.add_argument("--epochs", type=int, default=10)
+    trainParser.add_argument("--init", default=None)
+    trainParser.add_argument("--quantize", action="store_true")
+    trainParser.add_argument("--out", required=True)
+    benchParser = sub.add_parser("bench")
+    benchParser.add_argument("weights")
+    benchParser.add_argument("--depth", type=int, default=2)
+    args = parser.parse_args(argv)
+
+    if args.command == "bench":
+        compareNps(NnueEvaluator.load(args.weights), args.depth)
+        return
+
+    if not args.alg and not args.pgn and args.selfplay == 0:
+        args.alg = [texel.ALIREZA]
+
+    def games():
+        for file in args.alg:
+            yield from texel.streamAlgGames(file, args.max_games)
+        for file in args.pgn:
+            yield from texel.streamPgnGames(file, args.max_games)
+        yield from selfPlayGames(args.selfplay)
+
+    start = time.time()
+    data = extractTrainingData(games(), args.processes)
+    print("extracted {} positions in {:.1f}s".format(len(data[3]), time.time() - start))
+    network = Network.random() if args.init is None else Network.load(args.init)
+    if network.quantized:
+        network = Network(network.ftWeight.astype(np.float32) / FT_SCALE, \
+            network.ftBias.astype(np.float32) / FT_SCALE, network.l1Weight, \
+            network.l1Bias, network.outWeight, network.outBias)
+    network = train(network, *data, epochs=args.epochs)
+    network.save(args.out, args.quantize)
+    print("wrote " + args.out)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,58 @@
+import os
+import random
+import tempfile
+import unittest
+import numpy as np
+from alphabeta_bot import AlphaBetaEngine
+from bitboard import BitBoard, TRICKY_FEN
+from fuzz_board import START_FENS
+from nnue import Network, NnueEvaluator
+
+class TestNnue(unittest.TestCase):
+    def setUp(self):
+        self.network = Network.random(seed=1)
+
+    def assertMatchesReset(self, evaluator, board):
+        fresh = NnueEvaluator(evaluator._net)
+        fresh.reset(board)
+        for pushed, reset in zip(evaluator._stack[-1], fresh._stack[-1]):
+            np.testing.assert_allclose(pushed, reset, atol=1e-4)
+
+    def test_pushMatchesReset(self):
+        with tempfile.TemporaryDirectory() as directory:
+            file = os.path.join(directory, "net.npz")
+            self.network.save(file, quantize=True)
+            networks = [self.network, Network.load(file)]
+        self.assertTrue(networks[1].quantized)
+        rng = random.Random(1)
+        for network in networks:
+            evaluator = NnueEvaluator(network)
+            # Random games see castles, promotions, en passant and king moves.
+            for fen in START_FENS:
+                board = BitBoard.createFromFen(fen)
+                evaluator.reset(board)
+                boards = [board]
+                for _ in range(30):
+                    moves = board.getLegalMoves()
+                    if len(moves) == 0:
+                        break
+                    board = board.makeMove(rng.choice(moves))
+                    evaluator.push(boards[-1], board)
+                    boards.append(board)
+                    self.assertMatchesReset(evaluator, board)
+                for board in reversed(boards[:-1]):
+                    evaluator.pop()
+                    self.assertMatchesReset(evaluator, board)
+
+    def test_stoppedQuiesce(self):
+        engine = AlphaBetaEngine(loadBook=False)
+        engine._debug = False
+        engine._nnue = NnueEvaluator(self.network)
+        engine._quiesce = True
+        # Limits that stop the search part way, mostly inside quiesce.
+        for nodes in range(16, 160, 24):
+            engine.searchLimited(TRICKY_FEN, depth=3, nodes=nodes)
+            self.assertEqual(len(engine._nnue._stack), 1, nodes)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,122 +1,46 @@
-from bitboard import BitBoard, PAWN, BISHOP, ROOK, KING, QUEEN, KNIGHT
+from bitboard import BitBoard
 from collections import defaultdict
+from polyglot import PolyglotBook, zobristKey, encodeMove, decodeMove, writeBook
+from threading import Thread
+import os
+import random
+import re
 import sys
 
 STARTING_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
-PIECE_MAP = {"P": PAWN, \
-            "N": KNIGHT, \
-            "R": ROOK, \
-            "B": BISHOP, \
-            "Q": QUEEN, \
-            "K": KING}
+MOVE_NUMBER = re.compile(r"^\d+\.+")
+RESULTS = ["1-0", "0-1", "1/2-1/2", "*"]
 alirezaPgn = "books/lichess_alireza2003_2022-07-20.pgn"
+# How deep into each game the position book goes.
+MAX_BOOK_PLIES = 20
 
 def convertPgnToAlgebraic(line):
+    """
+    Converts PGN movetext to a list of uci moves. Move numbers and results are
+    skipped; comments must already be stripped (see pgn.cleanMovetext).
+    Raises ValueError on a move that doesn't resolve.
+    """
     board = BitBoard.createFromFen(STARTING_FEN)
     algebraic = []
-    for omove in line.split():
-        move = omove
-        if move[-1] == "." or move[0].isdigit():
+    for token in line.split():
+        token = MOVE_NUMBER.sub("", token)
+        if token == "" or token in RESULTS:
             continue
-        move = move.strip("+#")
-        move = move.replace('x', '')
-        # print("|{}|".format(move))
-        # board.prettyPrint()
-        if move == "O-O":
-            alg = "e1g1" if board.whiteToMove() else "e8g8"
-            algebraic.append(alg)
-            board = board.makeMove(alg)
-            continue
-        if move == "O-O-O":
-            alg = "e1c1" if board.whiteToMove() else "e8c8"
-            algebraic.append(alg)
-            board = board.makeMove(alg)
-            # raise Exception("HAAAAAAAAAAAAAAAAAAAAAAAAAAAAAa")
-            continue
-        if "=" in move:
-            dest, promo = move.split("=")
-            # print("ASDFASDF " + dest + promo.lower())
-            try:
-                legalMoves = board.getLegalMoves()
-            except Exception as e:
-                print(line)
-                raise e
-            for move in legalMoves:
-                if (dest[-2:] in move) and (promo.lower() in move):
-                    board = board.makeMove(move)
-                    algebraic.append(move)
-                    # print("Found a move " + move)
-                    break
-            continue
-        dest = move[-2:]
-        piece = "P" if move[0].islower() else move[0]
-        if move[0].isupper():
-            move = move[1:]
-        bitPiece = PIECE_MAP[piece]
-        # print("\nmove: {}  piece: {}  dest: {}  {}".format(move, bin(bitPiece), dest, \
-        #     "WHITE" if board.whiteToMove() else "BLACK"))
-        try:
-            legalMoves = board.getLegalMoves()
-        except Exception as e:
-            print(line)
-            raise e
-        possibles = []
-        for lm in legalMoves:
-            src = BitBoard.pieceAtAlgebraic(board._bits, lm[0:2])
-            if lm[-2:] == dest and bitPiece == BitBoard.pieceType(src):
-                possibles.append(lm)
-        if len(possibles) == 1:
-            lm = possibles[0]
-            src = BitBoard.pieceAtAlgebraic(board._bits, lm[0:2])
-            board = board.makeMove(possibles[0])
-            algebraic.append(possibles[0])
-            if bitPiece != BitBoard.pieceType(src):
-                # print("hmmm... SAN: {}   board: {}   {}".format(piece, bin(src), lm[0:2]))
-                raise Exception("hmm")
-            continue
-        if len(possibles) > 1:
-            clarifier = move[0]
-            # print("Too many possibilities.... " + clarifier)
-            # print(possibles)
-            for p in possibles:
-                if clarifier in p[0:2]:
-                    # print("{} {}".format(p, clarifier))
-                    board = board.makeMove(p)
-                    algebraic.append(p)
-                    break
-            # raise Exception("POOPOO {}:  legals {}  white to play? {}".format(\
-            #     move, list(filter((lambda lm : lm[-2:0] == dest), legalMoves)), board.whiteToMove()))
-            continue
-
-        print(line)
-        print("|{}|".format(omove))
-        print("Not enough possibilities")
-        print("algebraic so far: ", algebraic)
-        board.prettyPrint()
-        raise Exception("POOPOO {}:  legals {}  white to play? {}".format(\
-            move, list(filter((lambda lm : lm[-2:0] == dest), legalMoves)), board.whiteToMove()))
+        move = board.parseSan(token)
+        algebraic.append(BitBoard.moveStr(move))
+        board = board.makeMove(move)
     return algebraic
 
-def generateAlgFile(file):
-    f = open(file)
-    newF = open("books/lichess_alireza.pgn", "w")
-    for l in f:
-        if not l.startswith("1"):
-            continue
-        moves = convertPgnToAlgebraic(l)
-        newF.write(" ".join(moves))
-        newF.write("\n")
-
 class OpeningTree:
     def generateFromFile(file):
-        f = open(file)
+        with open(file) as f:
+            return OpeningTree.generateFromGames(l.split() for l in f)
+
+    def generateFromGames(games, maxPlies=None):
         openingBook = OpeningTree(None, "")
-        for line in f:
-            # print(moves)
+        for moves in games:
             child = openingBook
-            for move in line.split():
-                # if move[0].isdigit():
-                #     continue
+            for move in moves[:maxPlies]:
                 child = child.getChild(move)
         return openingBook
 
@@ -148,7 +72,118 @@ class OpeningTree:
         return newChild
 
 
+class PositionBook:
+    """
+    Opening book keyed by position (the Polyglot hash) rather than by move
+    order, so 1.d4 Nf6 2.c4 and 1.c4 Nf6 2.d4 share one entry and their
+    counts add up. Moves are stored as Polyglot move codes.
+    """
+    def generateFromFile(file, maxPlies=MAX_BOOK_PLIES):
+        with open(file) as f:
+            return PositionBook.generateFromGames((l.split() for l in f), maxPlies)
+
+    def generateFromGames(games, maxPlies=MAX_BOOK_PLIES):
+        """ |games| is an iterable of uci move lists from the start position. """
+        book = PositionBook()
+        for moves in games:
+            board = BitBoard.createFromFen(STARTING_FEN)
+            for move in moves[:maxPlies]:
+                book.add(board, move)
+                board = board.makeMove(move)
+        return book
+
+    def __init__(self):
+        self._positions = defaultdict(lambda: defaultdict(int))
+
+    def __len__(self):
+        return len(self._positions)
+
+    def add(self, board, move, count=1):
+        self.addEntry(zobristKey(board), encodeMove(board, move), count)
+
+    def addEntry(self, key, code, count=1):
+        self._positions[key][code] += count
+
+    def getMoves(self, board):
+        """ {move: count} of the book moves from |board|. """
+        moves = self._positions.get(zobristKey(board), {})
+        return {decodeMove(board, code): count for code, count in moves.items()}
+
+    def getCount(self, board):
+        """ How many games passed through |board|, over all move orders. """
+        return sum(self._positions.get(zobristKey(board), {}).values())
+
+    def chooseMove(self, board):
+        moves = self.getMoves(board)
+        if len(moves) == 0:
+            return None
+        return random.choices(list(moves.keys()), list(moves.values()))[0]
+
+    def save(self, file):
+        """ Writes the book as a Polyglot .bin, see polyglot.PolyglotBook. """
+        return writeBook({(key, code): count \
+            for key, moves in self._positions.items() \
+            for code, count in moves.items()}, file)
+
+
+def compiledPath(file):
+    return file + ".bin"
+
+def loadBook(file):
+    """
+    Returns a position-keyed book for |file|, with chooseMove(board). An .alg
+    file is compiled into a Polyglot .alg.bin next to it the first time, and
+    that is memory-mapped from then on until the .alg changes.
+    """
+    if file.endswith(".bin"):
+        return PolyglotBook(file)
+    book = compiledPath(file)
+    if os.path.exists(book) and os.path.getmtime(book) >= os.path.getmtime(file):
+        return PolyglotBook(book)
+    positions = PositionBook.generateFromFile(file)
+    try:
+        positions.save(book)
+    except OSError:
+        # Read-only install: keep using the book we just built.
+        return positions
+    return PolyglotBook(book)
+
+
+class BookLoader:
+    """
+    Loads a book on a background thread so the engine can answer "uci" right
+    away. getBook() blocks until the book is in, and re-raises load errors.
+    """
+    def __init__(self, file):
+        self._file = file
+        self._book = None
+        self._error = None
+        self._thread = Thread(target=self.run, daemon=True)
+        self._thread.start()
+
+    def run(self):
+        try:
+            self._book = loadBook(self._file)
+        except Exception as e:
+            self._error = e
+
+    def getFile(self):
+        return self._file
+
+    def getBook(self):
+        self._thread.join()
+        if self._error is not None:
+            raise self._error
+        return self._book
+
+
 if __name__ == "__main__":
+    if len(sys.argv) >= 4 and sys.argv[1] == "compile":
+        # python openings.py compile <book.alg> <book.bin> [plies]
+        plies = int(sys.argv[4]) if len(sys.argv) > 4 else MAX_BOOK_PLIES
+        book = PositionBook.generateFromFile(sys.argv[2], plies)
+        print("wrote {} entries".format(book.save(sys.argv[3])))
+        sys.exit(0)
     # filename = sys.argv[1]
     tree = OpeningTree.generateFromFile("books/lichess_alireza.alg")
     d4 = tree.getChildren()["d2d4"]
@@ -0,0 +1,47 @@
+import os
+import tempfile
+import time
+import unittest
+from bitboard import BitBoard, STARTING_FEN
+from openings import BookLoader, PositionBook, compiledPath, convertPgnToAlgebraic
+from polyglot import PolyglotBook
+
+GAMES = ["d2d4 g8f6 c2c4 e7e6", "c2c4 g8f6 d2d4 g7g6", "e2e4 e7e5"]
+
+class TestOpenings(unittest.TestCase):
+    def test_positionBook(self):
+        book = PositionBook.generateFromGames(game.split() for game in GAMES)
+        start = BitBoard.createFromFen(STARTING_FEN)
+        self.assertEqual(book.getMoves(start), {"d2d4": 1, "c2c4": 1, "e2e4": 1})
+        # Both move orders reach the same position and share its entry.
+        transposed = start.makeMove("d2d4").makeMove("g8f6").makeMove("c2c4")
+        self.assertEqual(book.getCount(transposed), 2)
+        self.assertEqual(book.getMoves(transposed), {"e7e6": 1, "g7g6": 1})
+        self.assertEqual(convertPgnToAlgebraic("1. d4 Nf6 2. c4 e6"), \
+            ["d2d4", "g8f6", "c2c4", "e7e6"])
+
+    def test_bookLoader(self):
+        with tempfile.TemporaryDirectory() as directory:
+            alg = os.path.join(directory, "book.alg")
+            with open(alg, "w") as f:
+                f.write("\n".join(GAMES) + "\n")
+            book = BookLoader(alg).getBook()
+            # The .alg is compiled to a Polyglot book next to it...
+            self.assertIsInstance(book, PolyglotBook)
+            self.assertTrue(os.path.exists(compiledPath(alg)))
+            start = BitBoard.createFromFen(STARTING_FEN)
+            self.assertEqual(book.getMoves(start), {"d2d4": 1, "c2c4": 1, "e2e4": 1})
+            # ...which is rebuilt once the .alg changes.
+            with open(alg, "a") as f:
+                f.write("e2e4 c7c5\n")
+            later = time.time() + 10
+            os.utime(alg, (later, later))
+            book = BookLoader(alg).getBook()
+            self.assertEqual(book.getMoves(start)["e2e4"], 2)
+            self.assertEqual(BookLoader(compiledPath(alg)).getBook().getMoves(start), \
+                book.getMoves(start))
+            loader = BookLoader(os.path.join(directory, "missing.alg"))
+            self.assertRaises(OSError, loader.getBook)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,183 @@
+"""
+Perft: counts the leaf nodes of the legal move tree to a fixed depth, to check
+move generation against known answers and to measure its speed.
+
+    python perft.py suite [--depth 3] [--board all]
+    python perft.py divide "<fen>" 4 [--board bitboard] [--processes 4]
+    python perft.py count "<fen>" 4 [--hash 1000000] [--no-bulk]
+
+"divide" prints the node count under each root move, in the same format as
+Stockfish, so a mismatch can be chased down move by move. The last ply is bulk
+counted (the length of the legal move list, without making the moves) unless
+--no-bulk is given. --hash caches subtree counts by position and depth, which
+pays off on transpositions. --processes splits the root moves over a process
+pool.
+
+The suite checks every board backend (boards.BOARDS) against published counts
+(and python-chess for the small positions) and reports nodes/sec.
+"""
+import argparse
+import multiprocessing
+import sys
+import time
+from bitboard import BitBoard, STARTING_FEN, TRICKY_FEN
+from boards import BOARDS
+
+# (name, fen, [nodes at depth 1, 2, ...])
+PERFT_SUITE = [
+    ("startpos", STARTING_FEN, [20, 400, 8902, 197281, 4865609]),
+    ("kiwipete", "r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1", \
+        [48, 2039, 97862, 4085603]),
+    ("tricky", TRICKY_FEN, [56, 2123, 116950, 4466894]),
+    ("position 3", "8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1", \
+        [14, 191, 2812, 43238, 674624]),
+    ("position 4", "r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1", \
+        [6, 264, 9467, 422333]),
+    ("position 5", "rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8", \
+        [44, 1486, 62379, 2103487]),
+    ("ep pinned", "8/8/4k3/8/2p5/8/B2P2K1/8 w - - 0 1", [13, 102, 1266, 10276, 135655]),
+    ("ep gives check", "8/8/1k6/2b5/2pP4/8/5K2/8 b - d3 0 1", [15, 126, 1928, 13931, 206379]),
+    ("castle checks", "5k2/8/8/8/8/8/8/4K2R w K - 0 1", [15, 66, 1198, 6399, 120330]),
+    ("long castle checks", "3k4/8/8/8/8/8/8/R3K3 w Q - 0 1", [16, 71, 1286, 7418, 141077]),
+    ("castle rights", "r3k2r/1b4bq/8/8/8/8/7B/R3K2R w KQkq - 0 1", [26, 1141, 27826, 1274206]),
+    ("castle prevented", "r3k2r/8/3Q4/8/8/5q2/8/R3K2R b KQkq - 0 1", [44, 1494, 50509, 1720476]),
+    ("promote out of check", "2K2r2/4P3/8/8/8/8/8/3k4 w - - 0 1", [11, 133, 1442, 19174, 266199]),
+    ("discovered check", "8/8/1P2K3/8/2n5/1q6/8/5k2 b - - 0 1", [29, 165, 5160, 31961, 1004658]),
+    ("promote to check", "4k3/1P6/8/8/8/8/K7/8 w - - 0 1", [9, 40, 472, 2661, 38983]),
+    ("underpromote to check", "8/P1k5/K7/8/8/8/8/8 w - - 0 1", [6, 27, 273, 1329, 18135]),
+    ("self stalemate", "K1k5/8/P7/8/8/8/8/8 w - - 0 1", [2, 6, 13, 63, 382]),
+    ("stalemate and mate", "8/k1P5/8/1K6/8/8/8/8 w - - 0 1", [10, 25, 268, 926, 10857]),
+]
+
+_perft = None
+
+
+class Perft:
+    def __init__(self, bulk=True, hashSize=0):
+        """
+        Params:
+            bulk: count the last ply from the length of the move list.
+            hashSize: max entries in the subtree count table, 0 to disable.
+        """
+        self._bulk = bulk
+        self._hashSize = hashSize
+        self._table = {}
+        self.hashHits = 0
+
+    def count(self, board, depth):
+        if depth == 0:
+            return 1
+        moves = board.getLegalMoves()
+        if depth == 1 and self._bulk:
+            return len(moves)
+        if self._hashSize > 0:
+            key = (board.positionKey(), depth)
+            nodes = self._table.get(key)
+            if nodes is not None:
+                self.hashHits += 1
+                return nodes
+        nodes = 0
+        for move in moves:
+            nodes += self.count(board.makeMove(move), depth - 1)
+        if self._hashSize > 0:
+            # Crude, but cheap: start over when the table fills up.
+            if len(self._table) >= self._hashSize:
+                self._table.clear()
+            self._table[key] = nodes
+        return nodes
+
+    def divide(self, board, depth):
+        """ [(uci move, nodes)] for every root move. """
+        return [(BitBoard.moveStr(move), self.count(board.makeMove(move), depth - 1)) \
+                for move in board.getLegalMoves()]
+
+
+def initPerftWorker(bulk, hashSize):
+    global _perft
+    _perft = Perft(bulk, hashSize)
+
+def perftRootMove(task):
+    """ Counts the subtree under one root move. Runs inside the workers. """
+    boardName, fen, move, depth = task
+    board = BOARDS[boardName].createFromFen(fen).makeMove(move)
+    return move, _perft.count(board, depth - 1)
+
+def divide(boardName, fen, depth, processes=1, bulk=True, hashSize=0):
+    """ Like Perft.divide, with the root moves split over |processes|. """
+    board = BOARDS[boardName].createFromFen(fen)
+    if processes <= 1 or depth <= 1:
+        return Perft(bulk, hashSize).divide(board, depth)
+    tasks = [(boardName, fen, BitBoard.moveStr(m), depth) for m in board.getLegalMoves()]
+    with multiprocessing.Pool(processes, initPerftWorker, (bulk, hashSize)) as pool:
+        # Ordered, so the output matches the single process divide.
+        return pool.map(perftRootMove, tasks, 1)
+
+def perft(boardName, fen, depth, processes=1, bulk=True, hashSize=0):
+    if depth == 0:
+        return 1
+    return sum(nodes for _, nodes in divide(boardName, fen, depth, processes, bulk, hashSize))
+
+
+def runSuite(boardNames, maxDepth, processes=1, bulk=True, hashSize=0):
+    """ Prints a row per board and position; returns the number of failures. """
+    failures = 0
+    print("{:<9} {:<22} {:>5} {:>9} {:>9} {:>4} {:>8} {:>8}".format( \
+        "board", "position", "depth", "nodes", "expected", "ok", "nps", "time"))
+    for boardName in boardNames:
+        totalNodes = 0
+        totalTime = 0
+        for name, fen, counts in PERFT_SUITE:
+            depth = min(maxDepth, len(counts))
+            start = time.time()
+            nodes = perft(boardName, fen, depth, processes, bulk, hashSize)
+            elapsed = time.time() - start
+            totalNodes += nodes
+            totalTime += elapsed
+            ok = nodes == counts[depth - 1]
+            failures += 0 if ok else 1
+            print("{:<9} {:<22} {:>5} {:>9} {:>9} {:>4} {:>8.0f} {:>7.2f}s".format( \
+                boardName, name, depth, nodes, counts[depth - 1], "yes" if ok else "NO", \
+                nodes / max(elapsed, 1e-9), elapsed))
+        print("{:<9} {:<22} {:>5} {:>9} {:>9} {:>4} {:>8.0f} {:>7.2f}s".format( \
+            boardName, "total", "", totalNodes, "", "", totalNodes / max(totalTime, 1e-9), totalTime))
+    return failures
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, \
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["suite", "divide", "count"])
+    parser.add_argument("fen", nargs="?", default=STARTING_FEN)
+    parser.add_argument("depth", nargs="?", type=int, default=3)
+    parser.add_argument("--depth", dest="maxDepth", type=int, default=None, \
+        help="suite depth, capped by the known counts")
+    parser.add_argument("--board", choices=list(BOARDS) + ["all"], default=None)
+    parser.add_argument("--processes", type=int, default=1)
+    parser.add_argument("--hash", type=int, default=0, help="table entries, 0 is off")
+    parser.add_argument("--no-bulk", dest="bulk", action="store_false")
+    args = parser.parse_args()
+
+    if args.command == "suite":
+        boards = list(BOARDS) if args.board in (None, "all") else [args.board]
+        failures = runSuite(boards, args.maxDepth or 3, args.processes, args.bulk, args.hash)
+        print("{} failed".format(failures) if failures else "all passed")
+        sys.exit(1 if failures else 0)
+
+    boardName = args.board if args.board in BOARDS else "bitboard"
+    depth = args.maxDepth or args.depth
+    start = time.time()
+    if args.command == "divide":
+        results = divide(boardName, args.fen, depth, args.processes, args.bulk, args.hash)
+        for move, nodes in results:
+            print("{}: {}".format(move, nodes))
+        nodes = sum(n for _, n in results)
+        print()
+    else:
+        nodes = perft(boardName, args.fen, depth, args.processes, args.bulk, args.hash)
+    elapsed = time.time() - start
+    print("Nodes searched: {}".format(nodes))
+    print("Time: {:.2f}s  nps: {:.0f}".format(elapsed, nodes / max(elapsed, 1e-9)))
+
+
+if __name__ == "__main__":
+    main()
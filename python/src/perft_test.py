@@ -0,0 +1,17 @@
+import unittest
+from bitboard import BitBoard, TRICKY_FEN
+from boards import BOARDS
+from perft import Perft, PERFT_SUITE
+
+class TestPerft(unittest.TestCase):
+    def test_perft(self):
+        for name, fen, counts in PERFT_SUITE:
+            for board in BOARDS.values():
+                self.assertEqual(Perft().count(board.createFromFen(fen), 2), counts[1], \
+                    "{} {}".format(board.__name__, name))
+        # Promoting on a8 must leave the a7 pawn alone.
+        board = BitBoard.createFromFen(TRICKY_FEN).makeMove("b7a8q")
+        self.assertEqual(Perft().count(board, 2), 208)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,191 @@
+"""
+Streaming PGN reader and a parallel PGN-to-book compiler.
+
+Games are read one at a time from plain, .gz or .bz2 files, so a full Lichess
+monthly dump never has to fit in memory. The compiler fans the games out to a
+process pool in bounded batches; the workers resolve the SAN, and the parent
+writes .alg lines as they come back or merges Polyglot book entries.
+
+    python pgn.py lichess_db_2022-07.pgn.bz2 -o books/lichess.alg
+    python pgn.py games.pgn.gz -o books/games.bin --plies 20 --processes 8
+"""
+import argparse
+import bz2
+import gzip
+import itertools
+import multiprocessing
+import re
+import sys
+import time
+from bitboard import BitBoard
+from openings import STARTING_FEN, RESULTS, PositionBook, MAX_BOOK_PLIES, \
+    convertPgnToAlgebraic
+from polyglot import zobristKey, encodeMove
+
+# Comments, variations, NAGs and move annotations in movetext.
+COMMENT = re.compile(r"\{[^}]*\}|;[^\n]*|\$\d+|[!?]+")
+VARIATION = re.compile(r"\([^()]*\)")
+PROGRESS_INTERVAL = 1.0
+
+
+def openText(file):
+    if file.endswith(".gz"):
+        return gzip.open(file, "rt", errors="replace")
+    if file.endswith(".bz2"):
+        return bz2.open(file, "rt", errors="replace")
+    return open(file, errors="replace")
+
+def cleanMovetext(movetext):
+    """ Strips comments, variations and annotations, leaving moves only. """
+    movetext = COMMENT.sub(" ", movetext)
+    # Variations nest, so peel them from the inside out.
+    while "(" in movetext:
+        stripped = VARIATION.sub(" ", movetext)
+        if stripped == movetext:
+            break
+        movetext = stripped
+    return " ".join(movetext.split())
+
+def finishGame(headers, movetext):
+    # Keep the line breaks: a ";" comment only runs to the end of its line.
+    movetext = cleanMovetext("\n".join(movetext))
+    tokens = movetext.split()
+    if tokens and tokens[-1] in RESULTS:
+        headers.setdefault("Result", tokens.pop())
+    return headers, " ".join(tokens)
+
+def streamGames(file, maxGames=None):
+    """
+    Yields (headers, movetext) for each game in |file|. The result token is
+    taken off the movetext and, when there is no [Result] tag, put in headers.
+    """
+    count = 0
+    with openText(file) as f:
+        headers = {}
+        movetext = []
+        for line in f:
+            line = line.strip()
+            if line.startswith("[") and line.endswith("]"):
+                if movetext:
+                    if maxGames is not None and count >= maxGames:
+                        return
+                    yield finishGame(headers, movetext)
+                    count += 1
+                    headers = {}
+                    movetext = []
+                tag, _, value = line[1:-1].partition(" ")
+                headers[tag] = value.strip('"')
+            elif line:
+                movetext.append(line)
+        if movetext and (maxGames is None or count < maxGames):
+            yield finishGame(headers, movetext)
+
+def isStandardGame(headers):
+    """ Games from a set-up position or a variant can't go in the book. """
+    return "FEN" not in headers and \
+        headers.get("Variant", "Standard").lower() in ("standard", "chess")
+
+
+""" =============== Compiler ===================== """
+def convertGame(game):
+    """
+    Resolves one game's SAN into uci moves, cut to |plies| if given. Returns
+    None for games that can't be replayed. Runs inside the worker processes.
+    """
+    movetext, plies = game
+    try:
+        moves = convertPgnToAlgebraic(movetext)
+    except Exception:
+        return None
+    return moves if plies is None else moves[:plies]
+
+def bookEntries(game):
+    """ The (key, move) Polyglot entries of one game, for book output. """
+    moves = convertGame(game)
+    if moves is None:
+        return None
+    board = BitBoard.createFromFen(STARTING_FEN)
+    entries = []
+    for move in moves:
+        entries.append((zobristKey(board), encodeMove(board, move)))
+        board = board.makeMove(move)
+    return entries
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+class Progress:
+    """ Prints games, games/sec and failures to stderr at most every second. """
+    def __init__(self):
+        self._start = time.time()
+        self._last = self._start
+        self.games = 0
+        self.failed = 0
+
+    def update(self, ok):
+        self.games += 1
+        self.failed += 0 if ok else 1
+        now = time.time()
+        if now - self._last >= PROGRESS_INTERVAL:
+            self._last = now
+            self.report()
+
+    def report(self):
+        elapsed = max(time.time() - self._start, 1e-9)
+        print("\r{} games  {:.0f} games/s  {} failed".format( \
+            self.games, self.games / elapsed, self.failed), end="", file=sys.stderr)
+
+def compilePgn(files, output, plies=None, processes=None, chunksize=64, maxGames=None):
+    """
+    Compiles the PGN |files| into |output|: an .alg file of uci move lines, or
+    a Polyglot .bin of the first |plies| plies (MAX_BOOK_PLIES by default).
+    Memory stays bounded by the batch size (and by the book for .bin output).
+    """
+    toBook = output.endswith(".bin")
+    if toBook and plies is None:
+        plies = MAX_BOOK_PLIES
+    games = ((movetext, plies) for file in files \
+             for headers, movetext in streamGames(file, maxGames) \
+             if isStandardGame(headers) and movetext)
+    progress = Progress()
+    processes = processes or multiprocessing.cpu_count()
+    # Feed the pool a batch at a time; imap alone would read the whole input
+    # ahead of the workers.
+    batches = batched(games, processes * chunksize * 4)
+    with multiprocessing.Pool(processes) as pool:
+        if toBook:
+            book = PositionBook()
+            for batch in batches:
+                for entries in pool.imap_unordered(bookEntries, batch, chunksize):
+                    for key, move in entries or []:
+                        book.addEntry(key, move)
+                    progress.update(entries is not None)
+            book.save(output)
+        else:
+            with open(output, "w") as out:
+                for batch in batches:
+                    for moves in pool.imap(convertGame, batch, chunksize):
+                        if moves:
+                            out.write(" ".join(moves) + "\n")
+                        progress.update(moves is not None)
+    progress.report()
+    print(file=sys.stderr)
+    return progress
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compile PGN games into a book.")
+    parser.add_argument("pgn", nargs="+", help=".pgn, .pgn.gz or .pgn.bz2 files")
+    parser.add_argument("-o", "--output", required=True, help=".alg or .bin output")
+    parser.add_argument("--plies", type=int, default=None)
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--chunksize", type=int, default=64)
+    parser.add_argument("--max-games", type=int, default=None)
+    args = parser.parse_args()
+    compilePgn(args.pgn, args.output, args.plies, args.processes, \
+        args.chunksize, args.max_games)
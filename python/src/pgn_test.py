@@ -0,0 +1,65 @@
+import bz2
+import gzip
+import os
+import tempfile
+import unittest
+from bitboard import BitBoard, STARTING_FEN
+from pgn import streamGames, compilePgn
+from polyglot import PolyglotBook
+
+GAMES = """[Event "One"]
+[Result "1-0"]
+
+1. e4 e5 ; the king's pawn
+2. Nf3 {a comment
+over two lines} Nc6 (2... d6 (2... f6?!) 3. d4) 3. Bb5 $1 a6 1-0
+
+[Event "Two"]
+
+1. d4 d5 2. c4 1/2-1/2
+
+[Event "Three"]
+[FEN "8/8/8/4k3/8/8/8/4K2Q w - - 0 1"]
+
+1. Qh5+ *
+"""
+
+class TestPgn(unittest.TestCase):
+    def test_streamGames(self):
+        with tempfile.TemporaryDirectory() as directory:
+            files = [os.path.join(directory, "games.pgn" + ext) for ext in ["", ".gz", ".bz2"]]
+            for file, opener in zip(files, [open, gzip.open, bz2.open]):
+                with opener(file, "wt") as f:
+                    f.write(GAMES)
+            for file in files:
+                games = list(streamGames(file))
+                self.assertEqual([movetext for _, movetext in games], \
+                    ["1. e4 e5 2. Nf3 Nc6 3. Bb5 a6", "1. d4 d5 2. c4", "1. Qh5+"], file)
+                self.assertEqual([headers["Result"] for headers, _ in games], \
+                    ["1-0", "1/2-1/2", "*"])
+                self.assertEqual(len(list(streamGames(file, maxGames=2))), 2)
+
+    def test_compilePgn(self):
+        lines = ["1. e4 e5 2. Nf3 Nc6", "1. e4 c5", "1. d4 d5", "1. e4 e4", "1. Nf3 d5 2. d4"]
+        # More games than one batch of processes * chunksize * 4.
+        games = [lines[i % len(lines)] + " *" for i in range(11)]
+        with tempfile.TemporaryDirectory() as directory:
+            source = os.path.join(directory, "games.pgn")
+            with open(source, "w") as f:
+                f.write("\n\n".join("[Event \"{}\"]\n\n{}".format(i, g) \
+                    for i, g in enumerate(games)) + "\n")
+            output = os.path.join(directory, "games.alg")
+            progress = compilePgn([source], output, processes=1, chunksize=1)
+            self.assertEqual((progress.games, progress.failed), (11, 2))
+            with open(output) as f:
+                compiled = f.read().splitlines()
+            self.assertEqual(len(compiled), 9)
+            self.assertEqual(compiled[0], "e2e4 e7e5 g1f3 b8c6")
+            output = os.path.join(directory, "games.bin")
+            compilePgn([source], output, plies=1, processes=1, chunksize=1)
+            book = PolyglotBook(output)
+            self.assertEqual(book.getMoves(BitBoard.createFromFen(STARTING_FEN)), \
+                {"e2e4": 5, "d2d4": 2, "g1f3": 2})
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,62 @@
+import os
+import tempfile
+import unittest
+from bitboard import BitBoard, STARTING_FEN
+from boards import BOARDS
+from polyglot import PolyglotBook, zobristKey, encodeMove, decodeMove, writeBook
+
+# The test positions from the Polyglot book format description.
+KEYS = [("", 0x463b96181691fc9c),
+        ("e2e4", 0x823c9b50fd114196),
+        ("e2e4 d7d5", 0x0756b94461c50fb0),
+        ("e2e4 d7d5 e4e5", 0x662fafb965db29d4),
+        ("e2e4 d7d5 e4e5 f7f5", 0x22a48b5a8e47ff78),
+        ("e2e4 d7d5 e4e5 f7f5 e1e2", 0x652a607ca3f242c1),
+        ("e2e4 d7d5 e4e5 f7f5 e1e2 e8f7", 0x00fdd303c946bdd9),
+        ("a2a4 b7b5 h2h4 b5b4 c2c4", 0x3c8123ea7b067637),
+        ("a2a4 b7b5 h2h4 b5b4 c2c4 b4c3 a1a3", 0x5c3f9b829b279560)]
+
+class TestPolyglot(unittest.TestCase):
+    def test_zobristKey(self):
+        for boardClass in BOARDS.values():
+            for moves, key in KEYS:
+                board = boardClass.createFromFen(STARTING_FEN)
+                for move in moves.split():
+                    board = board.makeMove(move)
+                self.assertEqual(zobristKey(board), key, moves)
+
+    def test_moveCodes(self):
+        board = BitBoard.createFromFen("r3k2r/1P6/8/8/8/8/8/R3K2R w KQkq - 0 1")
+        # Polyglot castles king takes rook: e1h1 and e1a1.
+        for move, code in [("e1g1", 4 << 6 | 7), ("e1c1", 4 << 6 | 0), ("a1a8", 0 << 6 | 56), \
+                           ("b7b8q", 4 << 12 | 49 << 6 | 57), ("b7a8n", 1 << 12 | 49 << 6 | 56)]:
+            self.assertEqual(encodeMove(board, move), code, move)
+            self.assertEqual(decodeMove(board, code), move)
+
+    def test_bookRoundTrip(self):
+        start = BitBoard.createFromFen(STARTING_FEN)
+        after = start.makeMove("e2e4")
+        counts = {(zobristKey(start), encodeMove(start, "e2e4")): 3,
+                  (zobristKey(start), encodeMove(start, "d2d4")): 1,
+                  (zobristKey(after), encodeMove(after, "c7c5")): 2}
+        with tempfile.TemporaryDirectory() as directory:
+            file = os.path.join(directory, "book.bin")
+            self.assertEqual(writeBook(counts, file), 3)
+            book = PolyglotBook(file)
+            self.assertEqual(len(book), 3)
+            self.assertEqual(book.getMoves(start), {"e2e4": 3, "d2d4": 1})
+            self.assertEqual([move for move, _, _ in book.getEntries(start)], ["e2e4", "d2d4"])
+            self.assertEqual(book.getMoves(after), {"c7c5": 2})
+            self.assertIsNone(book.chooseMove(after.makeMove("c7c5")))
+            # Weights past 16 bits are all scaled down together, to at least 1.
+            counts[(zobristKey(after), encodeMove(after, "c7c5"))] = 200000
+            writeBook(counts, file)
+            book = PolyglotBook(file)
+            self.assertEqual(book.getMoves(start), {"e2e4": 1, "d2d4": 1})
+            self.assertEqual(book.getMoves(after), {"c7c5": 50000})
+            with open(file, "ab") as f:
+                f.write(b"\0")
+            self.assertRaises(ValueError, PolyglotBook, file)
+
+if __name__ == "__main__":
+    unittest.main()
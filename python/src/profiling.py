@@ -0,0 +1,140 @@
+"""
+Search profiling hooks.
+
+PhaseProfiler counts the calls and time spent in a few hot functions (the
+"phases": move generation, check analysis, makeMove, evaluation...). It wraps
+them while enabled and puts the originals back when disabled, so a normal
+search pays nothing for it. It reports, per phase, the calls, the total time
+(including nested phases) and the self time, and can write the self time of
+every phase stack in the folded format flamegraph.pl and speedscope read:
+
+    go;computeLegalMoves;kingCheckAnalysis;makeMove 183012
+
+searchProfile() wraps one search: it turns the phase counters on and, given
+a file prefix, also runs the search under cProfile and writes
+<prefix>-<n>.pstats (python -m pstats, snakeviz, gprof2dot) and
+<prefix>-<n>.folded.
+
+The phases are patched on the classes, so this only sees the searching
+process; root-splitting workers (Threads > 1) are not profiled.
+"""
+import cProfile
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+
+ROOT_PHASE = "go"
+
+
+class PhaseProfiler:
+    def __init__(self, phases):
+        """
+        |phases| is a list of (owner, attribute) to count, e.g.
+        (BitBoard, "makeMove").
+        """
+        self._phases = phases
+        self._originals = {}
+        self.reset()
+
+    def reset(self):
+        self.calls = defaultdict(int)
+        self.total = defaultdict(float)
+        self.selfTime = defaultdict(float)
+        self.folded = defaultdict(float)
+        # The phases we're in, and the time spent in the children of each.
+        self._path = [ROOT_PHASE]
+        self._childTime = [0.0]
+
+    def isEnabled(self):
+        return len(self._originals) > 0
+
+    def enable(self):
+        if self.isEnabled():
+            return
+        for owner, name in self._phases:
+            function = owner.__dict__[name]
+            self._originals[(owner, name)] = function
+            setattr(owner, name, self.wrap(name, function))
+
+    def disable(self):
+        for (owner, name), function in self._originals.items():
+            setattr(owner, name, function)
+        self._originals = {}
+
+    def wrap(self, name, function):
+        def profiled(*args, **kwargs):
+            path = self._path
+            childTime = self._childTime
+            recursive = name in path
+            path.append(name)
+            childTime.append(0.0)
+            start = time.perf_counter()
+            try:
+                return function(*args, **kwargs)
+            finally:
+                elapsed = time.perf_counter() - start
+                own = elapsed - childTime.pop()
+                self.calls[name] += 1
+                # A phase nested in itself is already inside its total.
+                if not recursive:
+                    self.total[name] += elapsed
+                self.selfTime[name] += own
+                self.folded[";".join(path)] += own
+                path.pop()
+                childTime[-1] += elapsed
+        profiled.__wrapped__ = function
+        return profiled
+
+    def finish(self, elapsed):
+        """ Books the time outside every phase to the root. """
+        self.calls[ROOT_PHASE] += 1
+        self.total[ROOT_PHASE] += elapsed
+        self.selfTime[ROOT_PHASE] += elapsed - self._childTime[0]
+        self.folded[ROOT_PHASE] += elapsed - self._childTime[0]
+        self._childTime[0] = 0.0
+
+    def reportLines(self):
+        """ A table of the phases, slowest first, for "info string" lines. """
+        rootTime = max(self.total[ROOT_PHASE], 1e-9)
+        lines = ["{:<20} {:>9} {:>10} {:>10} {:>9} {:>6}".format( \
+            "phase", "calls", "total ms", "self ms", "us/call", "self%")]
+        for name in sorted(self.calls, key=lambda n: -self.total[n]):
+            lines.append("{:<20} {:>9} {:>10.1f} {:>10.1f} {:>9.1f} {:>5.1f}%".format( \
+                name, self.calls[name], self.total[name] * 1000, self.selfTime[name] * 1000, \
+                self.total[name] / self.calls[name] * 1e6, self.selfTime[name] / rootTime * 100))
+        return lines
+
+    def writeFolded(self, file):
+        """ Self time per phase stack, in integer microseconds. """
+        with open(file, "w") as f:
+            for stack, seconds in sorted(self.folded.items()):
+                if seconds > 0:
+                    f.write("{} {}\n".format(stack, int(seconds * 1e6)))
+
+
+@contextmanager
+def searchProfile(profiler, filePrefix=None, number=0):
+    """
+    Profiles the search run inside the with block: the phase counters always,
+    and cProfile too when |filePrefix| is given. Returns the files written
+    through the yielded list.
+    """
+    files = []
+    profiler.reset()
+    profiler.enable()
+    profile = cProfile.Profile() if filePrefix else None
+    start = time.perf_counter()
+    if profile is not None:
+        profile.enable()
+    try:
+        yield files
+    finally:
+        if profile is not None:
+            profile.disable()
+        profiler.finish(time.perf_counter() - start)
+        profiler.disable()
+        if profile is not None:
+            base = "{}-{}".format(filePrefix, number)
+            profile.dump_stats(base + ".pstats")
+            profiler.writeFolded(base + ".folded")
+            files += [base + ".pstats", base + ".folded"]
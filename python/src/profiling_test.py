@@ -0,0 +1,53 @@
+import os
+import tempfile
+import time
+import unittest
+from profiling import PhaseProfiler, searchProfile, ROOT_PHASE
+
+class Phases:
+    def outer(self, n):
+        time.sleep(0.002)
+        self.inner()
+        return n
+
+    def inner(self):
+        time.sleep(0.004)
+
+class TestPhaseProfiler(unittest.TestCase):
+    def test_phases(self):
+        profiler = PhaseProfiler([(Phases, "outer"), (Phases, "inner")])
+        original = Phases.outer
+        with searchProfile(profiler) as files:
+            self.assertTrue(profiler.isEnabled())
+            self.assertEqual(Phases().outer(3), 3)
+            Phases().inner()
+        # The originals are back once the search is over.
+        self.assertFalse(profiler.isEnabled())
+        self.assertIs(Phases.outer, original)
+        self.assertEqual(files, [])
+        self.assertEqual(profiler.calls["outer"], 1)
+        self.assertEqual(profiler.calls["inner"], 2)
+        self.assertEqual(set(profiler.folded), {ROOT_PHASE, "go;outer", "go;outer;inner", \
+                                                "go;inner"})
+        # The nested phase's time counts in outer's total, not in its self time.
+        self.assertAlmostEqual(profiler.selfTime["outer"], \
+            profiler.total["outer"] - profiler.folded["go;outer;inner"], places=6)
+        lines = profiler.reportLines()
+        self.assertTrue(lines[0].startswith("phase"))
+        # Slowest first, and the root holds everything.
+        self.assertEqual([line.split()[0] for line in lines[1:2]], [ROOT_PHASE])
+        self.assertEqual(sorted(line.split()[0] for line in lines[2:]), ["inner", "outer"])
+
+    def test_files(self):
+        profiler = PhaseProfiler([(Phases, "inner")])
+        with tempfile.TemporaryDirectory() as directory:
+            prefix = os.path.join(directory, "search")
+            with searchProfile(profiler, prefix, 2) as files:
+                Phases().outer(1)
+            self.assertEqual(files, [prefix + "-2.pstats", prefix + "-2.folded"])
+            with open(files[1]) as f:
+                stacks = [line.split()[0] for line in f]
+            self.assertEqual(stacks, [ROOT_PHASE, "go;inner"])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -1,6 +1,8 @@
 import random
 from collections import defaultdict
-from bitboard import BitBoard
+from threading import Event
+from bitboard import BitBoard, CAPTURE, MOVE_META
+from uci import UciLoop, parsePosition, parseSetOption
 
 ENGINE_NAME = "RANDOM"
 STARTING_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
@@ -9,11 +11,42 @@ TEST2_FEN = "rnbqk2r/pppp1pp1/5n1p/1Bb1p3/4P2N/5P2/PPPP2PP/RNBQK2R b KQkq - 0 5"
 ENPASSANT_FEN = "rnbqkbnr/1p1p1ppp/8/1Bp1p3/p3P3/5N1P/PPPP1PP1/RNBQK2R w KQkq c6 0 5"
 KING_CHECK_BLACK = "3k4/8/3P4/8/8/8/8/K7 b - - 1 2"
 KING_CHECK_WHITE = "3k4/8/8/8/8/3p4/8/3K4 w - - 1 2"
+# How often a "light" playout takes its best capture when it has one.
+LIGHT_CAPTURE_ODDS = 0.5
+
+def randomMove(moves, light=False, rng=random):
+    """
+    A uniformly random move of |moves|. A light policy takes the capture of
+    the most valuable piece with the least valuable one instead, some of the
+    time.
+    """
+    if light and rng.random() < LIGHT_CAPTURE_ODDS:
+        captures = [m for m in moves if (m >> MOVE_META) & CAPTURE]
+        if captures:
+            return max(captures, key=BitBoard.moveCaptureValue)
+    return rng.choice(moves)
+
+def playout(board, maxPlies, light=False, rng=random):
+    """
+    Plays random moves on |board|, in place with pushMove, until the game
+    ends or |maxPlies| are played. Returns the result for white, 1 for a win,
+    0.5 for a draw and 0 for a loss, or None if the game was cut short.
+    """
+    for _ in range(maxPlies):
+        moves = board.getLegalMoves()
+        if len(moves) == 0:
+            return 0.5 if not board.isCheck() else 0 if board.whiteToMove() else 1
+        board.pushMove(randomMove(moves, light, rng))
+    moves = board.getLegalMoves()
+    if len(moves) == 0:
+        return 0.5 if not board.isCheck() else 0 if board.whiteToMove() else 1
+    return None
 
 class Engine:
     def __init__(self):
         self.options = defaultdict(str)
         self.board = BitBoard(0)
+        self._stop = Event()
 
     def inputUCI(self):
         print("id name " + ENGINE_NAME)
@@ -21,7 +54,9 @@ class Engine:
         print("uciok")
 
     def setOptions(self, line):
-        print("unimplemented")
+        # Random moves don't need any options.
+        name, value = parseSetOption(line)
+        print("info string unknown option {}".format(name))
 
     def isReady(self):
         print("readyok")
@@ -30,18 +65,15 @@ class Engine:
         pass  # nothing to do
 
     def position(self, line):
-        words = line.split()
-        assert(words[0] == "position")
-
-        if words[1] == "startpos":
-            self.board = BitBoard.createFromFen(STARTING_FEN)
-            if len(words) > 2 and words[2] == "moves":
-                for move in words[3:]:
-                    self.board = self.board.makeMove(move)
-        else:
-            print("weird " + words.join())
+        fen, moves = parsePosition(line)
+        if fen is None:
+            print("weird " + line)
+            return
+        self.board = BitBoard.createFromFen(fen)
+        for move in moves:
+            self.board = self.board.makeMove(move)
 
-    def go(self):
+    def go(self, args):
         moves = self.board.getLegalMoves()
         if self.board.isCheckMate():
             print("CHECK MATED SON")
@@ -49,29 +81,17 @@ class Engine:
         elif len(moves) == 0:
             print("stale mate...??")
             return
-        print("bestmove " + random.choice(moves))
+        move = BitBoard.moveStr(randomMove(moves))
+        if "infinite" in args or "ponder" in args:
+            self._stop.wait()
+        print("bestmove " + move, flush=True)
+
+    def printBoard(self):
+        self.board.prettyPrint()
+        print(self.board.getLegalMoves())
 
     def run(self):
-        while True:
-            line = input()
-            if line == "uci":
-                self.inputUCI()
-            elif line.startswith("setoption"):
-                self.setOptions(line)
-            elif line.startswith("isready"):
-                self.isReady()
-            elif line.startswith("ucinewgame"):
-                self.newGame()
-            elif line.startswith("position"):
-                self.position(line)
-            elif line.startswith("go"):
-                self.go()
-            elif line.startswith("print"):
-                self.board.prettyPrint()
-                print(self.board.getLegalMoves())
-            elif line.startswith("end") or line.startswith("quit"):
-                print("goodbye")
-                break
+        UciLoop(self).run()
 
 if __name__ == "__main__":
     engine = Engine()
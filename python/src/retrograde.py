@@ -0,0 +1,577 @@
+"""
+Retrograde endgame tables: exact win/draw/loss and distance to mate for small
+material sets (KQK, KRK, KPK, KBNK...), built here without any downloads.
+
+    python retrograde.py generate KQK KRK KPK [--out ../../books/endgames]
+                         [--processes 4]
+    python retrograde.py probe "<fen>" [--dir ../../books/endgames]
+    python retrograde.py verify KPK [--syzygy ../../books/syzygy]
+
+Generation works backwards from the mates. Every position is first scored by
+its legal moves (BitBoard's move generator): mates and stalemates are final,
+captures and promotions leave the table and take their value from smaller
+tables, and the rest remember how many positions they can move to. Then, one
+ply at a time, the positions decided at the last ply are unmoved: a position
+that can move into a loss is a win one ply further from mate, and a position
+whose moves all reach wins is a loss once the last of them is decided.
+Non-pawn moves are reversible, so unmoves come from the same move generator;
+pawns are stepped back by hand. Both passes are split over a process pool by
+the square of the white king. Whatever is left undecided is a draw.
+
+The tables are indexed by the squares of the pieces, white king first, with
+the white king mirrored into a1-d1-d4 (a1-d8 with pawns). Each entry is the
+distance to mate packed in as few bits as the longest mate needs, behind a
+small header, so a table is probed straight from a memory map:
+
+    0       draw (or an illegal placement)
+    odd n   the side to move is mated in n - 1 plies
+    even n  the side to move mates in n - 1 plies
+
+Positions with castling rights or an en passant square are not stored.
+"""
+import argparse
+import mmap
+import multiprocessing
+import os
+import struct
+import sys
+import time
+from array import array
+from bitboard import BitBoard, PAWN, KNIGHT, BISHOP, ROOK, QUEEN, KING, DIR_MAP, \
+    DEST_SQ, MOVE_SQ_MASK, MOVE_META, CAPTURE, PROMO_PIECE, MOVE_PIECE_MASK
+
+ENDGAME_PATH = "../../books/endgames"
+SYZYGY_PATH = "../../books/syzygy"
+SUFFIX = ".egt"
+MAGIC = b"WEGT"
+VERSION = 1
+# magic, version, bits per entry, pieces, longest mate in plies, entries, name
+HEADER = struct.Struct("<4sBBBHI16s")
+
+WIN = 1
+DRAW = 0
+LOSS = -1
+
+PIECE_LETTERS = "KQRBNP"
+LETTER_TYPES = {"P": PAWN, "N": KNIGHT, "B": BISHOP, "R": ROOK, "Q": QUEEN, "K": KING}
+TYPE_LETTERS = " PNBRQK"
+
+# BitBoard squares: a8 = 0 .. h1 = 63.
+def fileOf(square):
+    return square & 7
+
+def rankOf(square):
+    """ 0 for the first rank. """
+    return 7 - (square >> 3)
+
+def transpose(square):
+    """ Mirror across the a1-h8 diagonal. """
+    return (7 - fileOf(square)) * 8 + rankOf(square)
+
+# Where the white king is kept: the a1-d1-d4 triangle, or files a-d with
+# pawns (which only allow a left-right mirror).
+PAWNLESS_KING_SQUARES = [s for s in range(64) if rankOf(s) <= fileOf(s) <= 3]
+PAWN_KING_SQUARES = [s for s in range(64) if fileOf(s) <= 3]
+
+
+def parseMaterial(name):
+    """ "KQK" or "KQvK" to ("KQ", "K"), each side in KQRBNP order. """
+    name = name.upper()
+    if "V" in name:
+        sides = name.split("V")
+    elif name.count("K") == 2:
+        second = name.index("K", 1)
+        sides = [name[:second], name[second:]]
+    else:
+        sides = []
+    if len(sides) != 2 or any(not s.startswith("K") or s.count("K") != 1 or \
+            any(c not in PIECE_LETTERS for c in s) for s in sides):
+        raise ValueError("bad material {}".format(name))
+    return tuple("".join(sorted(s, key=PIECE_LETTERS.index)) for s in sides)
+
+def materialOf(board):
+    """ ("KQ", "K") for the pieces on |board|. """
+    white, black = board.activePieces()
+    return tuple("".join(sorted((TYPE_LETTERS[t] for t, _ in pieces), \
+                                key=PIECE_LETTERS.index)) for pieces in (white, black))
+
+def isDrawnMaterial(white, black):
+    """ Neither side can ever mate: bare kings or a single minor piece. """
+    rest = white[1:] + black[1:]
+    return rest in ("", "B", "N")
+
+def decode(value):
+    """ A stored entry as (WIN/DRAW/LOSS, plies to mate). """
+    if value == 0:
+        return DRAW, 0
+    return (LOSS if value & 1 else WIN), value - 1
+
+
+class Layout:
+    """ How the positions of one material set are numbered. """
+    def __init__(self, name):
+        self.white, self.black = parseMaterial(name)
+        self.name = self.white + "v" + self.black
+        self.pieces = [8 | KING, KING] + [8 | LETTER_TYPES[c] for c in self.white[1:]] + \
+                      [LETTER_TYPES[c] for c in self.black[1:]]
+        self.hasPawns = "P" in self.name
+        self.kingSquares = PAWN_KING_SQUARES if self.hasPawns else PAWNLESS_KING_SQUARES
+        self.kingSlots = {s: i for i, s in enumerate(self.kingSquares)}
+        self.others = len(self.pieces) - 1
+        # Each white king square owns a contiguous slice: both sides to move
+        # and every placement of the other pieces.
+        self.placements = 64 ** self.others
+        self.sliceSize = 2 * self.placements
+        self.size = len(self.kingSquares) * self.sliceSize
+
+    def canonical(self, squares):
+        """ |squares| mirrored so the white king is in its kept area. """
+        if fileOf(squares[0]) > 3:
+            squares = [s ^ 7 for s in squares]
+        if not self.hasPawns:
+            if rankOf(squares[0]) > 3:
+                squares = [s ^ 56 for s in squares]
+            if rankOf(squares[0]) > fileOf(squares[0]):
+                squares = [transpose(s) for s in squares]
+            elif rankOf(squares[0]) == fileOf(squares[0]):
+                # On the diagonal both the position and its mirror image are
+                # in the triangle; keep the lower one.
+                squares = min(squares, [transpose(s) for s in squares])
+        return squares
+
+    def index(self, squares, white):
+        squares = self.canonical(squares)
+        idx = self.kingSlots[squares[0]] * 2 + white
+        for s in squares[1:]:
+            idx = idx * 64 + s
+        return idx
+
+    def position(self, idx):
+        """ (squares, white to move) of an index. """
+        rest = idx % self.placements
+        slot, white = divmod(idx // self.placements, 2)
+        squares = []
+        for _ in range(self.others):
+            rest, s = divmod(rest, 64)
+            squares.append(s)
+        squares.append(self.kingSquares[slot])
+        squares.reverse()
+        return squares, white
+
+    def isPlacement(self, squares):
+        """ Distinct squares and no pawns on the first or last rank. """
+        if len(set(squares)) != len(squares):
+            return False
+        return all(p & 7 != PAWN or 0 < rankOf(s) < 7 for p, s in zip(self.pieces, squares))
+
+    def board(self, squares, white):
+        bits = white << 256
+        for piece, square in zip(self.pieces, squares):
+            bits |= piece << (4 * square)
+        return BitBoard(bits)
+
+    def isLegal(self, board, white):
+        """ The side not to move must not be in check. """
+        king = KING if white else 8 | KING
+        return not board.isSquareAttacked(board.findPiece(king), king)
+
+
+class EndgameTables:
+    """ The generated tables of a directory, probed through memory maps. """
+    def __init__(self, path=None):
+        self._tables = {}
+        self._files = []
+        self.maxPieces = 0
+        if path:
+            self.addDirectory(path)
+
+    def addDirectory(self, path):
+        for file in sorted(os.listdir(path)):
+            if file.endswith(SUFFIX):
+                self.addTable(os.path.join(path, file))
+
+    def addTable(self, file):
+        with open(file, "rb") as f:
+            data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic, version, bits, pieces, _, entries, name = HEADER.unpack_from(data)
+        if magic != MAGIC or version != VERSION:
+            data.close()
+            raise ValueError("{} is not an endgame table".format(file))
+        layout = Layout(name.rstrip(b"\0").decode())
+        self._files.append(data)
+        self._tables[(layout.white, layout.black)] = (layout, data, bits)
+        self.maxPieces = max(self.maxPieces, pieces)
+
+    def close(self):
+        for data in self._files:
+            data.close()
+        self._files = []
+        self._tables = {}
+        self.maxPieces = 0
+
+    def hasTable(self, white, black):
+        return (white, black) in self._tables or (black, white) in self._tables
+
+    def probe(self, board):
+        """ (WIN/DRAW/LOSS, plies to mate) for the side to move, or None. """
+        if board.getCastles() != 0 or board.getEnpassant() != 0:
+            return None
+        white, black = materialOf(board)
+        mirrored = (white, black) not in self._tables
+        entry = self._tables.get((black, white) if mirrored else (white, black))
+        if entry is None:
+            return None
+        layout, data, bits = entry
+        whitePieces, blackPieces = board.activePieces()
+        if mirrored:
+            # Swap the colours: flip the board and the side to move.
+            whitePieces, blackPieces = ([(t, s ^ 56) for t, s in blackPieces], \
+                                        [(t, s ^ 56) for t, s in whitePieces])
+        squares = []
+        for pieces, letters in ((whitePieces, layout.white), (blackPieces, layout.black)):
+            for letter in letters:
+                for i, (t, s) in enumerate(pieces):
+                    if TYPE_LETTERS[t] == letter:
+                        squares.append(s)
+                        del pieces[i]
+                        break
+        # The layout lists both kings first.
+        squares = [squares[0], squares[len(layout.white)]] + squares[1:len(layout.white)] + \
+                  squares[len(layout.white) + 1:]
+        white = board.whiteToMove() ^ mirrored
+        return decode(readEntry(data, bits, layout.index(squares, white)))
+
+
+def readEntry(data, bits, idx):
+    position = HEADER.size * 8 + idx * bits
+    word = int.from_bytes(data[position >> 3:(position >> 3) + 3], "little")
+    return (word >> (position & 7)) & ((1 << bits) - 1)
+
+def packEntries(values, bits):
+    data = bytearray((len(values) * bits + 7) // 8 + 3)
+    position = 0
+    for value in values:
+        if value:
+            word = value << (position & 7)
+            offset = position >> 3
+            data[offset] |= word & 255
+            data[offset + 1] |= (word >> 8) & 255
+            data[offset + 2] |= word >> 16
+        position += bits
+    return data
+
+def writeTable(file, layout, values):
+    longest = max(values)
+    bits = max(1, longest.bit_length())
+    header = HEADER.pack(MAGIC, VERSION, bits, len(layout.pieces), max(longest - 1, 0), \
+                         len(values), layout.name.encode())
+    with open(file + ".tmp", "wb") as f:
+        f.write(header)
+        f.write(packEntries(values, bits))
+    os.replace(file + ".tmp", file)
+
+
+""" =============== Generation ====================="""
+_tables = None
+
+def initGenerateWorker(path):
+    global _tables
+    _tables = EndgameTables(path)
+
+def exitValue(board):
+    """ The value of a position a capture or promotion leads to. """
+    white, black = materialOf(board)
+    if isDrawnMaterial(white, black):
+        return DRAW, 0
+    value = _tables.probe(board)
+    if value is None:
+        raise ValueError("no table for {}v{}".format(white, black))
+    return value
+
+def scoreSlice(task):
+    """
+    Scores every position of one white king square from its moves. Returns
+    (slot, state, successors, exitWin, exitLoss), a value per position:
+    state is ILLEGAL (or a mirror image of another index), MATED,
+    STALEMATE or OPEN, plus DRAW_EXIT if a capture or promotion draws;
+    successors counts the distinct positions in the table it moves to;
+    exitWin/exitLoss are the earliest win and latest loss plies through
+    captures and promotions (0 for none).
+    """
+    name, slot = task
+    layout = Layout(name)
+    first = slot * layout.sliceSize
+    state = bytearray(layout.sliceSize)
+    successors = array("H", bytes(2 * layout.sliceSize))
+    exitWin = array("H", bytes(2 * layout.sliceSize))
+    exitLoss = array("H", bytes(2 * layout.sliceSize))
+    for offset in range(layout.sliceSize):
+        squares, white = layout.position(first + offset)
+        if not layout.isPlacement(squares) or layout.canonical(squares) != squares:
+            continue
+        board = layout.board(squares, white)
+        if not layout.isLegal(board, white):
+            continue
+        moves = board.getLegalMoves()
+        if len(moves) == 0:
+            state[offset] = MATED if board.isCheckMate() else STALEMATE
+            continue
+        state[offset] = OPEN
+        reached = set()
+        for move in moves:
+            src = move & MOVE_SQ_MASK
+            dest = (move >> DEST_SQ) & MOVE_SQ_MASK
+            # Only the promoted piece marks a quiet promotion.
+            if (move >> MOVE_META) & CAPTURE or (move >> PROMO_PIECE) & MOVE_PIECE_MASK:
+                result, plies = exitValue(board.makeMove(move))
+                if result == DRAW:
+                    state[offset] |= DRAW_EXIT
+                elif result == LOSS:
+                    if exitWin[offset] == 0 or plies + 1 < exitWin[offset]:
+                        exitWin[offset] = plies + 1
+                elif plies + 1 > exitLoss[offset]:
+                    exitLoss[offset] = plies + 1
+                continue
+            after = [dest if s == src else s for s in squares]
+            reached.add(layout.index(after, 1 - white))
+        successors[offset] = len(reached)
+    return slot, state, successors, exitWin, exitLoss
+
+ILLEGAL = 0
+OPEN = 1
+MATED = 2
+STALEMATE = 4
+DRAW_EXIT = 8
+
+def unmoves(layout, idx):
+    """ The distinct positions with a move to position |idx|. """
+    squares, white = layout.position(idx)
+    board = layout.board(squares, white)
+    # The side that just moved is the side not to move here.
+    mover = 0 if white else 8
+    predecessors = set()
+    for i, (piece, square) in enumerate(zip(layout.pieces, squares)):
+        if piece & 8 != mover:
+            continue
+        origins = []
+        if piece & 7 == PAWN:
+            back = 8 if mover else -8
+            if BitBoard.getPiece(board._bits, square + back) == 0 and \
+                    0 < rankOf(square + back) < 7:
+                origins.append(square + back)
+                double = square + 2 * back
+                if rankOf(square) == (3 if mover else 4) and \
+                        BitBoard.getPiece(board._bits, double) == 0:
+                    origins.append(double)
+        else:
+            for move in board.legalMovesForNonPawns(piece, square, DIR_MAP[piece & 7]):
+                if not (move >> MOVE_META) & CAPTURE:
+                    origins.append((move >> DEST_SQ) & MOVE_SQ_MASK)
+        for origin in origins:
+            before = squares[:i] + [origin] + squares[i + 1:]
+            if layout.isLegal(layout.board(before, 1 - white), 1 - white):
+                predecessors.add(layout.index(before, 1 - white))
+    return predecessors
+
+def unmoveBatch(task):
+    """ [(idx, predecessors)] for a batch of one king square. """
+    name, batch = task
+    layout = Layout(name)
+    return [(idx, unmoves(layout, idx)) for idx in batch]
+
+def runTasks(function, tasks, pool):
+    if pool is None:
+        return map(function, tasks)
+    return pool.imap_unordered(function, tasks)
+
+
+def generate(name, path=ENDGAME_PATH, processes=None, verbose=True):
+    """
+    Builds the table for |name| into |path|, first building any table its
+    captures and promotions lead to. Returns the file written.
+    """
+    layout = Layout(name)
+    for dependency in dependencies(layout):
+        file = os.path.join(path, dependency + SUFFIX)
+        if not os.path.exists(file):
+            generate(dependency, path, processes, verbose)
+    start = time.time()
+    processes = processes or os.cpu_count()
+    pool = multiprocessing.Pool(processes, initGenerateWorker, (path,)) if processes > 1 else None
+    if pool is None:
+        initGenerateWorker(path)
+    try:
+        values = retrograde(layout, pool, verbose)
+    finally:
+        if pool is not None:
+            pool.terminate()
+    file = os.path.join(path, layout.name + SUFFIX)
+    writeTable(file, layout, values)
+    if verbose:
+        wins = sum(1 for v in values if v and not v & 1)
+        losses = sum(1 for v in values if v & 1)
+        print("{}: {} entries, {} wins, {} losses, longest mate {} plies, {:.1f}s -> {}".format( \
+            layout.name, len(values), wins, losses, max(values) - 1 if max(values) else 0, \
+            time.time() - start, file))
+    return file
+
+def dependencies(layout):
+    """ The tables reached by one capture or promotion that aren't draws. """
+    found = []
+    sides = [layout.white, layout.black]
+    for side in range(2):
+        us, them = sides[side], sides[1 - side]
+        tables = []
+        # Captures of one of their pieces.
+        for letter in set(them[1:]):
+            tables.append((us, them.replace(letter, "", 1)))
+        # Promotions of one of our pawns.
+        if "P" in us:
+            for promo in "QRBN":
+                tables.append((us.replace("P", "", 1) + promo, them))
+        for white, black in tables:
+            white, black = ("".join(sorted(s, key=PIECE_LETTERS.index)) for s in (white, black))
+            if side == 1:
+                white, black = black, white
+            if isDrawnMaterial(white, black):
+                continue
+            # Stored with the stronger side as given; either colour will do.
+            name = white + "v" + black
+            mirrored = black + "v" + white
+            if name not in found and mirrored not in found:
+                found.append(name)
+    return found
+
+def retrograde(layout, pool, verbose):
+    slots = len(layout.kingSquares)
+    state = bytearray(layout.size)
+    successors = array("H", bytes(2 * layout.size))
+    exitWin = array("H", bytes(2 * layout.size))
+    exitLoss = array("H", bytes(2 * layout.size))
+    for slot, sliceState, sliceSuccessors, sliceWin, sliceLoss in \
+            runTasks(scoreSlice, [(layout.name, s) for s in range(slots)], pool):
+        first = slot * layout.sliceSize
+        last = first + layout.sliceSize
+        state[first:last] = sliceState
+        successors[first:last] = sliceSuccessors
+        exitWin[first:last] = sliceWin
+        exitLoss[first:last] = sliceLoss
+
+    # buckets[n]: positions that may be decided n plies from mate.
+    buckets = [[]]
+    def schedule(plies, idx):
+        while len(buckets) <= plies:
+            buckets.append([])
+        buckets[plies].append(idx)
+
+    values = array("H", bytes(2 * layout.size))
+    for idx in range(layout.size):
+        if state[idx] == MATED:
+            schedule(0, idx)
+        elif state[idx] & OPEN:
+            if exitWin[idx]:
+                schedule(exitWin[idx], idx)
+            elif successors[idx] == 0 and not state[idx] & DRAW_EXIT:
+                # Every move leaves the table and loses.
+                schedule(exitLoss[idx], idx)
+
+    plies = 0
+    while plies < len(buckets):
+        frontier = []
+        for idx in buckets[plies]:
+            if values[idx] == 0:
+                values[idx] = plies + 1
+                frontier.append(idx)
+        buckets[plies] = None
+        if verbose and frontier:
+            print("  {} ply {}: {} positions".format(layout.name, plies, len(frontier)))
+            sys.stdout.flush()
+        won = plies & 1
+        for batch in runTasks(unmoveBatch, batches(layout, frontier), pool):
+            for _, predecessors in batch:
+                for idx in predecessors:
+                    if values[idx] != 0 or not state[idx] & OPEN:
+                        continue
+                    if not won:
+                        schedule(plies + 1, idx)
+                        continue
+                    successors[idx] -= 1
+                    if successors[idx] == 0 and exitWin[idx] == 0 and \
+                            not state[idx] & DRAW_EXIT:
+                        schedule(max(plies + 1, exitLoss[idx]), idx)
+        plies += 1
+
+    # Drawing exits and stalemates stay 0, as do positions never decided.
+    return [v for v in values]
+
+def batches(layout, frontier, size=256):
+    """ The frontier in (name, batch) tasks, by white king square. """
+    bySlot = {}
+    for idx in frontier:
+        bySlot.setdefault(idx // layout.sliceSize, []).append(idx)
+    for slot in sorted(bySlot):
+        positions = bySlot[slot]
+        for i in range(0, len(positions), size):
+            yield layout.name, positions[i:i + size]
+
+
+def verify(name, path, syzygyPath):
+    """ Compares every legal position with the syzygy WDL; returns mismatches. """
+    from syzygy import Tablebase
+    tables = EndgameTables(path)
+    tablebase = Tablebase(syzygyPath)
+    layout = Layout(name)
+    mismatches = 0
+    checked = 0
+    for idx in range(layout.size):
+        squares, white = layout.position(idx)
+        if not layout.isPlacement(squares) or layout.canonical(squares) != squares:
+            continue
+        board = layout.board(squares, white)
+        if not layout.isLegal(board, white):
+            continue
+        wdl = tablebase.probeWdl(board)
+        if wdl is None:
+            continue
+        result, _ = tables.probe(board)
+        checked += 1
+        # The tables ignore the 50 move rule, which the syzygy ones apply.
+        if result != (wdl > 0) - (wdl < 0):
+            mismatches += 1
+            if mismatches <= 10:
+                print("mismatch {} squares {} white {} syzygy {}".format( \
+                    name, squares, white, wdl))
+    print("{}: {} positions checked, {} mismatches".format(name, checked, mismatches))
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, \
+        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("command", choices=["generate", "probe", "verify"])
+    parser.add_argument("args", nargs="+", help="materials, or a fen to probe")
+    parser.add_argument("--out", "--dir", dest="path", default=ENDGAME_PATH)
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--syzygy", default=SYZYGY_PATH)
+    args = parser.parse_args()
+
+    if args.command == "generate":
+        os.makedirs(args.path, exist_ok=True)
+        for name in args.args:
+            generate(name, args.path, args.processes)
+    elif args.command == "probe":
+        board = BitBoard.createFromFen(" ".join(args.args))
+        value = EndgameTables(args.path).probe(board)
+        if value is None:
+            print("no table")
+        else:
+            result, plies = value
+            print({WIN: "win", DRAW: "draw", LOSS: "loss"}[result] + \
+                  (" in {} plies".format(plies) if result != DRAW else ""))
+    else:
+        mismatches = sum(verify(name, args.path, args.syzygy) for name in args.args)
+        sys.exit(1 if mismatches else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,25 @@
+import unittest
+from bitboard import BitBoard, STARTING_FEN
+from retrograde import EndgameTables, Layout, WIN, DRAW, LOSS
+
+# A few small tables ship in books/endgames for these tests.
+ENDGAME_PATH = "../../books/endgames"
+
+class TestRetrograde(unittest.TestCase):
+    def test_retrograde(self):
+        tables = EndgameTables(ENDGAME_PATH)
+        for fen, value in [("8/8/8/4k3/8/8/8/4K2Q w - - 0 1", (WIN, 13)),
+                           ("8/8/8/4k3/8/8/8/4K2Q b - - 0 1", (LOSS, 18)),
+                           ("8/8/8/8/8/1k6/8/KR6 b - - 0 1", (LOSS, 30)),
+                           ("4k3/8/4K3/4P3/8/8/8/8 w - - 0 1", (WIN, 21)),
+                           # The same with the colours swapped.
+                           ("8/8/8/8/4p3/4k3/8/4K3 b - - 0 1", (WIN, 21)),
+                           ("4k3/8/8/8/8/8/4P3/4K3 b - - 0 1", (DRAW, 0))]:
+            self.assertEqual(tables.probe(BitBoard.createFromFen(fen)), value, fen)
+        self.assertIsNone(tables.probe(BitBoard.createFromFen(STARTING_FEN)))
+        layout = Layout("KBNK")
+        idx = layout.index([60, 4, 61, 62], 1)
+        self.assertEqual(layout.index(*layout.position(idx)), idx)
+
+if __name__ == "__main__":
+    unittest.main()
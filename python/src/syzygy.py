@@ -0,0 +1,825 @@
+"""
+Syzygy endgame tablebase probing, in pure Python.
+
+The .rtbw (win/draw/loss) and .rtbz (distance to zeroing) files are memory
+mapped and decoded in place. A table stores one value per position index,
+compressed by recursive pairing (frequent pairs of symbols become a new
+symbol) and then a canonical Huffman code, in fixed size blocks. Decoding a
+block turns it into its list of pair-symbols; those are kept in an LRU cache,
+so probes near each other in the table only pay for a short walk down the
+pairing tree.
+
+    tablebase = Tablebase("../../books/syzygy")
+    tablebase.probeWdl(board)   # -2 loss .. 2 win for the side to move
+    tablebase.probeDtz(board)   # plies to the next capture or pawn move
+
+Both return None when the position has no table (too many pieces, a missing
+file, castling rights). WDL values:
+
+    LOSS (-2), BLESSED_LOSS (-1, lost but drawn by the 50 move rule), DRAW (0),
+    CURSED_WIN (1, won but drawn by the 50 move rule), WIN (2)
+
+Positions are indexed from the piece list the way the generator wrote them:
+the pieces are mirrored so that the leading piece (or pawn) lands in a
+canonical corner of the board, grouped, and each group is numbered as a
+combination of the squares left over by the groups before it.
+"""
+import mmap
+import os
+import struct
+from collections import OrderedDict
+from bitboard import PAWN, MOVE_META, SRC_PIECE, MOVE_PIECE_MASK, CAPTURE
+
+LOSS = -2
+BLESSED_LOSS = -1
+DRAW = 0
+CURSED_WIN = 1
+WIN = 2
+
+WDL_SUFFIX = ".rtbw"
+DTZ_SUFFIX = ".rtbz"
+WDL_MAGIC = b"\x71\xe8\x23\x5d"
+DTZ_MAGIC = b"\xd7\x66\x0c\xa5"
+# The prober supports up to 5 men; bigger tables are ignored.
+MAX_PIECES = 5
+# Decompressed blocks kept across probes.
+BLOCK_CACHE_SIZE = 512
+
+PIECE_LETTERS = "KQRBNP"
+TYPE_LETTERS = " PNBRQK"
+
+# Per subtable flag bits.
+FLAG_STM = 1
+FLAG_MAPPED = 2
+FLAG_WIN_PLIES = 4
+FLAG_LOSS_PLIES = 8
+FLAG_WIDE = 16
+FLAG_SINGLE_VALUE = 128
+
+# Squares here are numbered a1 = 0 .. h8 = 63, the tablebase convention.
+def rankOf(square):
+    return square >> 3
+
+def fileOf(square):
+    return square & 7
+
+def offDiagonal(square):
+    """ Negative below the a1-h8 diagonal, positive above, 0 on it. """
+    return rankOf(square) - fileOf(square)
+
+def squareOf(index):
+    """ BitBoard index (a8 = 0) to a tablebase square. """
+    return index ^ 56
+
+
+def initTables():
+    # Squares below the a1-h8 diagonal, numbered 0..27.
+    mapB1H1H7 = [0] * 64
+    code = 0
+    for s in range(64):
+        if offDiagonal(s) < 0:
+            mapB1H1H7[s] = code
+            code += 1
+
+    # The a1-d1-d4 triangle, numbered 0..9 with the diagonal last.
+    mapA1D1D4 = [0] * 64
+    diagonal = []
+    code = 0
+    for s in range(28):
+        if offDiagonal(s) < 0 and fileOf(s) <= 3:
+            mapA1D1D4[s] = code
+            code += 1
+        elif offDiagonal(s) == 0 and fileOf(s) <= 3:
+            diagonal.append(s)
+    for s in diagonal:
+        mapA1D1D4[s] = code
+        code += 1
+
+    # The 462 placements of two kings with the first in the triangle (and the
+    # second not above the diagonal when the first is on it).
+    mapKK = [[0] * 64 for _ in range(10)]
+    bothOnDiagonal = []
+    code = 0
+    for idx in range(10):
+        for s1 in range(28):
+            if mapA1D1D4[s1] != idx or (idx == 0 and s1 != 1):
+                continue
+            for s2 in range(64):
+                if max(abs(fileOf(s1) - fileOf(s2)), abs(rankOf(s1) - rankOf(s2))) <= 1:
+                    continue
+                if offDiagonal(s1) == 0 and offDiagonal(s2) > 0:
+                    continue
+                if offDiagonal(s1) == 0 and offDiagonal(s2) == 0:
+                    bothOnDiagonal.append((idx, s2))
+                else:
+                    mapKK[idx][s2] = code
+                    code += 1
+    for idx, s2 in bothOnDiagonal:
+        mapKK[idx][s2] = code
+        code += 1
+
+    # binomial[k][n]: ways to choose k of n squares.
+    binomial = [[0] * 64 for _ in range(7)]
+    binomial[0][0] = 1
+    for n in range(1, 64):
+        for k in range(min(6, n) + 1):
+            binomial[k][n] = (binomial[k - 1][n - 1] if k > 0 else 0) + \
+                             (binomial[k][n - 1] if k < n else 0)
+
+    # Pawn squares a2-h7 numbered so that the leading pawn, the one nearest
+    # the edge and then lowest, has the highest number.
+    mapPawns = [0] * 64
+    leadPawnIdx = [[0] * 64 for _ in range(6)]
+    leadPawnsSize = [[0] * 4 for _ in range(6)]
+    available = 47
+    for leadPawns in range(1, 6):
+        for f in range(4):
+            idx = 0
+            for r in range(1, 7):
+                s = r * 8 + f
+                if leadPawns == 1:
+                    mapPawns[s] = available
+                    mapPawns[s ^ 7] = available - 1
+                    available -= 2
+                leadPawnIdx[leadPawns][s] = idx
+                idx += binomial[leadPawns - 1][mapPawns[s]]
+            leadPawnsSize[leadPawns][f] = idx
+    return mapB1H1H7, mapA1D1D4, mapKK, binomial, mapPawns, leadPawnIdx, leadPawnsSize
+
+MAP_B1H1H7, MAP_A1D1D4, MAP_KK, BINOMIAL, MAP_PAWNS, LEAD_PAWN_IDX, LEAD_PAWNS_SIZE = \
+    initTables()
+
+
+def sideName(pieces):
+    """ e.g. "KRP" for [(type, index)] pieces. """
+    return "".join(sorted((TYPE_LETTERS[t] for t, _ in pieces), key=PIECE_LETTERS.index))
+
+def materialName(board):
+    """ e.g. "KRPvK" for white K+R+P against a black K. """
+    white, black = board.activePieces()
+    return sideName(white) + "v" + sideName(black)
+
+NIBBLE_LOW_BITS = int("1" * 64, 16)
+
+def pieceCount(board):
+    """ Number of pieces on the board, kings included. """
+    bits = board._bits & ((1 << 256) - 1)
+    nibbles = (bits | bits >> 1 | bits >> 2 | bits >> 3) & NIBBLE_LOW_BITS
+    return bin(nibbles).count("1")
+
+def isZeroing(move):
+    """ Captures and pawn moves reset the 50 move counter. """
+    return (move >> MOVE_META) & CAPTURE != 0 or \
+        (move >> SRC_PIECE) & MOVE_PIECE_MASK == PAWN
+
+def dtzBeforeZeroing(wdl):
+    return {WIN: 1, CURSED_WIN: 101, DRAW: 0, BLESSED_LOSS: -101, LOSS: -1}[wdl]
+
+def sign(value):
+    return (value > 0) - (value < 0)
+
+
+class PairsData:
+    """ The decoding parameters of one subtable (side to move, pawn file). """
+    def __init__(self):
+        self.pieces = []
+        self.groupLen = []
+        self.groupIdx = []
+        self.flags = 0
+        self.mapIdx = None
+
+
+class Table:
+    """ One .rtbw or .rtbz file, parsed on first use. """
+    def __init__(self, file, name, isWdl):
+        self._file = file
+        self._name = name
+        self._isWdl = isWdl
+        self._data = None
+        white, black = name.split("v")
+        self.key = name
+        self.mirroredKey = black + "v" + white
+        self.symmetric = white == black
+        self.pieceCount = len(white) + len(black)
+        self.hasPawns = "P" in name
+        # The leading colour is the side with the fewer pawns (white on a tie).
+        whitePawns, blackPawns = white.count("P"), black.count("P")
+        leadWhite = blackPawns == 0 or (whitePawns > 0 and blackPawns >= whitePawns)
+        self.pawnCount = (whitePawns, blackPawns) if leadWhite else (blackPawns, whitePawns)
+        self.hasUniquePieces = any(side.count(p) == 1 for side in (white, black) \
+                                   for p in "QRBNP")
+
+    def close(self):
+        if self._data is not None:
+            self._data.close()
+            self._data = None
+
+    def u8(self, offset):
+        return self._data[offset]
+
+    def u16(self, offset):
+        return struct.unpack_from("<H", self._data, offset)[0]
+
+    def u32(self, offset):
+        return struct.unpack_from("<I", self._data, offset)[0]
+
+    def init(self):
+        if self._data is not None:
+            return
+        with open(self._file, "rb") as f:
+            self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        magic = WDL_MAGIC if self._isWdl else DTZ_MAGIC
+        if self._data[:4] != magic:
+            self.close()
+            raise ValueError("{} is not a syzygy table".format(self._file))
+        # WDL tables with different material for the two sides store both
+        # sides to move, DTZ tables only one.
+        self.sides = 2 if self._isWdl and not self.symmetric else 1
+        files = 4 if self.hasPawns else 1
+        self.pairs = [[PairsData() for _ in range(files)] for _ in range(self.sides)]
+        pp = self.hasPawns and self.pawnCount[1] > 0
+
+        offset = 5
+        for f in range(files):
+            order = [[self.u8(offset) & 15, self.u8(offset + 1) & 15 if pp else 15], \
+                     [self.u8(offset) >> 4, self.u8(offset + 1) >> 4 if pp else 15]]
+            offset += 1 + pp
+            for k in range(self.pieceCount):
+                for i in range(self.sides):
+                    piece = self.u8(offset)
+                    self.pairs[i][f].pieces.append(piece >> 4 if i else piece & 15)
+                offset += 1
+            for i in range(self.sides):
+                self.setGroups(self.pairs[i][f], order[i], f)
+        offset += offset & 1
+
+        for f in range(files):
+            for i in range(self.sides):
+                offset = self.setSizes(self.pairs[i][f], offset)
+        if not self._isWdl:
+            offset = self.setDtzMap(offset, files)
+        for f in range(files):
+            for i in range(self.sides):
+                d = self.pairs[i][f]
+                d.sparseIndex = offset
+                offset += d.sparseIndexSize * 6
+        for f in range(files):
+            for i in range(self.sides):
+                d = self.pairs[i][f]
+                d.blockLengths = offset
+                offset += d.blockLengthSize * 2
+        for f in range(files):
+            for i in range(self.sides):
+                d = self.pairs[i][f]
+                offset = (offset + 63) & ~63
+                d.data = offset
+                offset += d.blocksNum * d.blockSize
+
+    def setGroups(self, d, order, f):
+        """
+        Splits the piece sequence into groups, each encoded as a combination,
+        and works out each group's multiplier in the index.
+        """
+        firstLen = 0 if self.hasPawns else 3 if self.hasUniquePieces else 2
+        d.groupLen = [1]
+        for i in range(1, self.pieceCount):
+            firstLen -= 1
+            if firstLen > 0 or d.pieces[i] == d.pieces[i - 1]:
+                d.groupLen[-1] += 1
+            else:
+                d.groupLen.append(1)
+        n = len(d.groupLen)
+        d.groupLen.append(0)
+        d.groupIdx = [0] * (n + 1)
+
+        pp = self.hasPawns and self.pawnCount[1] > 0
+        nextGroup = 2 if pp else 1
+        freeSquares = 64 - d.groupLen[0] - (d.groupLen[1] if pp else 0)
+        idx = 1
+        k = 0
+        while nextGroup < n or k == order[0] or k == order[1]:
+            if k == order[0]:
+                d.groupIdx[0] = idx
+                idx *= LEAD_PAWNS_SIZE[d.groupLen[0]][f] if self.hasPawns else \
+                    31332 if self.hasUniquePieces else 462
+            elif k == order[1]:
+                d.groupIdx[1] = idx
+                idx *= BINOMIAL[d.groupLen[1]][48 - d.groupLen[0]]
+            else:
+                d.groupIdx[nextGroup] = idx
+                idx *= BINOMIAL[d.groupLen[nextGroup]][freeSquares]
+                freeSquares -= d.groupLen[nextGroup]
+                nextGroup += 1
+            k += 1
+        d.groupIdx[n] = idx
+
+    def setSizes(self, d, offset):
+        """ Reads the block layout and the Huffman and pairing tables. """
+        d.flags = self.u8(offset)
+        offset += 1
+        if d.flags & FLAG_SINGLE_VALUE:
+            d.blocksNum = d.blockLengthSize = d.sparseIndexSize = d.blockSize = 0
+            d.singleValue = self.u8(offset)
+            return offset + 1
+        tbSize = d.groupIdx[d.groupLen.index(0)]
+        d.blockSize = 1 << self.u8(offset)
+        d.span = 1 << self.u8(offset + 1)
+        d.sparseIndexSize = (tbSize + d.span - 1) // d.span
+        padding = self.u8(offset + 2)
+        d.blocksNum = self.u32(offset + 3)
+        d.blockLengthSize = d.blocksNum + padding
+        d.maxSymLen = self.u8(offset + 7)
+        d.minSymLen = self.u8(offset + 8)
+        offset += 9
+        count = d.maxSymLen - d.minSymLen + 1
+        d.lowestSym = [self.u16(offset + 2 * i) for i in range(count)]
+        offset += 2 * count
+
+        # Canonical Huffman: longer codes have lower values. base64[i] is the
+        # smallest code of length minSymLen + i, left aligned in 64 bits.
+        base64 = [0] * count
+        for i in range(count - 2, -1, -1):
+            base64[i] = (base64[i + 1] + d.lowestSym[i] - d.lowestSym[i + 1]) // 2
+        d.base64 = [b << (64 - i - d.minSymLen) for i, b in enumerate(base64)]
+
+        # Each symbol is either a value or a pair of two earlier symbols, in
+        # 3 bytes: 12 bits left, 12 bits right (0xfff for a value).
+        symbols = self.u16(offset)
+        offset += 2
+        raw = self._data[offset:offset + 3 * symbols]
+        d.left = [raw[3 * s] | (raw[3 * s + 1] & 15) << 8 for s in range(symbols)]
+        d.right = [raw[3 * s + 2] << 4 | raw[3 * s + 1] >> 4 for s in range(symbols)]
+        # symLen[s] + 1 is the number of values symbol s expands to.
+        d.symLen = [0] * symbols
+        visited = [False] * symbols
+        for s in range(symbols):
+            if not visited[s]:
+                self.setSymLen(d, s, visited)
+        return offset + 3 * symbols + (symbols & 1)
+
+    def setSymLen(self, d, root, visited):
+        stack = [root]
+        while stack:
+            s = stack[-1]
+            if d.right[s] == 0xfff:
+                visited[s] = True
+                stack.pop()
+                continue
+            pending = [c for c in (d.left[s], d.right[s]) if not visited[c]]
+            if pending:
+                stack += pending
+                continue
+            visited[s] = True
+            d.symLen[s] = d.symLen[d.left[s]] + d.symLen[d.right[s]] + 1
+            stack.pop()
+
+    def setDtzMap(self, offset, files):
+        """ DTZ values can go through a per-WDL lookup table. """
+        self.mapOffset = offset
+        for f in range(files):
+            d = self.pairs[0][f]
+            if not d.flags & FLAG_MAPPED:
+                continue
+            d.mapIdx = []
+            if d.flags & FLAG_WIDE:
+                offset += offset & 1
+                for _ in range(4):
+                    d.mapIdx.append((offset - self.mapOffset) // 2 + 1)
+                    offset += 2 * self.u16(offset) + 2
+            else:
+                for _ in range(4):
+                    d.mapIdx.append(offset - self.mapOffset + 1)
+                    offset += self.u8(offset) + 1
+        return offset + (offset & 1)
+
+    """ ====================== Decompression ======================= """
+    def decodeBlock(self, d, block):
+        """
+        The pair-symbols of |block| and, for each, the index within the block
+        of the first value after it.
+        """
+        data = self._data
+        start = d.data + block * d.blockSize
+        end = start + d.blockSize
+        count = self.u16(d.blockLengths + 2 * block) + 1
+        minSymLen = d.minSymLen
+        base64 = d.base64
+        lowestSym = d.lowestSym
+        symLen = d.symLen
+
+        def word(offset):
+            return struct.unpack_from(">I", data, offset)[0] if offset + 4 <= end else 0
+
+        buf = word(start) << 32 | word(start + 4)
+        bufSize = 64
+        ptr = start + 8
+        symbols = []
+        ends = []
+        total = 0
+        while total < count:
+            length = 0
+            while buf < base64[length]:
+                length += 1
+            sym = ((buf - base64[length]) >> (64 - length - minSymLen)) + lowestSym[length]
+            symbols.append(sym)
+            total += symLen[sym] + 1
+            ends.append(total)
+            length += minSymLen
+            buf = (buf << length) & 0xffffffffffffffff
+            bufSize -= length
+            if bufSize <= 32:
+                bufSize += 32
+                buf |= word(ptr) << (64 - bufSize)
+                ptr += 4
+        return symbols, ends
+
+    def decompress(self, d, idx, cache):
+        """ The value stored at position index |idx|. """
+        if d.flags & FLAG_SINGLE_VALUE:
+            return d.singleValue
+        # The sparse index gives the block and offset of every span-th value;
+        # walk from there to the block holding idx.
+        k = idx // d.span
+        entry = d.sparseIndex + 6 * k
+        block = self.u32(entry)
+        offset = self.u16(entry + 4) + idx % d.span - d.span // 2
+        while offset < 0:
+            block -= 1
+            offset += self.u16(d.blockLengths + 2 * block) + 1
+        while offset > self.u16(d.blockLengths + 2 * block):
+            offset -= self.u16(d.blockLengths + 2 * block) + 1
+            block += 1
+
+        key = (self._file, id(d), block)
+        decoded = cache.get(key)
+        if decoded is None:
+            decoded = self.decodeBlock(d, block)
+        cache.put(key, decoded)
+        symbols, ends = decoded
+
+        # Find the symbol covering offset, then walk down its pairs.
+        lo, hi = 0, len(ends) - 1
+        while lo < hi:
+            mid = (lo + hi) // 2
+            if ends[mid] <= offset:
+                lo = mid + 1
+            else:
+                hi = mid
+        sym = symbols[lo]
+        offset -= ends[lo] - d.symLen[sym] - 1
+        while d.symLen[sym]:
+            left = d.left[sym]
+            if offset < d.symLen[left] + 1:
+                sym = left
+            else:
+                offset -= d.symLen[left] + 1
+                sym = d.right[sym]
+        return d.left[sym]
+
+    """ ====================== Probing ======================= """
+    def probe(self, board, wdl, cache):
+        """
+        The stored value for |board|: a WDL score for .rtbw tables, or the
+        DTZ for a position known to have result |wdl|. Returns None if this
+        DTZ table only holds the other side to move.
+        """
+        self.init()
+        white, black = board.activePieces()
+        # Tables are written with the stronger side as white. For the other
+        # colour, or black to move in a symmetric table, swap the colours and
+        # mirror the board.
+        blackStronger = sideName(white) + "v" + sideName(black) != self.key
+        flip = blackStronger or (self.symmetric and not board.whiteToMove())
+        flipColor = 8 if flip else 0
+        flipSquares = 56 if flip else 0
+        stm = int(flip) ^ (0 if board.whiteToMove() else 1)
+
+        # The tablebase piece codes are the type, plus 8 for black.
+        placed = [(t, squareOf(i) ^ flipSquares) for t, i in white] + \
+                 [(t | 8, squareOf(i) ^ flipSquares) for t, i in black]
+        placed = [(piece ^ flipColor, square) for piece, square in placed]
+
+        squares = []
+        pieces = []
+        tbFile = 0
+        if self.hasPawns:
+            leadPawn = self.pairs[0][0].pieces[0]
+            squares = [s for p, s in placed if p == leadPawn]
+            pieces = [leadPawn] * len(squares)
+            leading = max(range(len(squares)), key=lambda i: MAP_PAWNS[squares[i]])
+            squares[0], squares[leading] = squares[leading], squares[0]
+            tbFile = min(fileOf(squares[0]), 7 - fileOf(squares[0]))
+        leadPawnsCnt = len(squares)
+
+        if not self._isWdl:
+            flags = self.pairs[0][tbFile].flags
+            if (flags & FLAG_STM) != stm and not (self.symmetric and not self.hasPawns):
+                return None
+
+        others = sorted((s, p) for p, s in placed if not (self.hasPawns and p == pieces[0]))
+        squares += [s for s, _ in others]
+        pieces += [p for _, p in others]
+        size = len(squares)
+        d = self.pairs[stm % self.sides][tbFile]
+
+        # Put the pieces in the table's order.
+        for i in range(leadPawnsCnt, size - 1):
+            for j in range(i + 1, size):
+                if d.pieces[i] == pieces[j]:
+                    pieces[i], pieces[j] = pieces[j], pieces[i]
+                    squares[i], squares[j] = squares[j], squares[i]
+                    break
+
+        # Mirror so the leading piece is on files a-d.
+        if fileOf(squares[0]) > 3:
+            squares = [s ^ 7 for s in squares]
+
+        if self.hasPawns:
+            idx = LEAD_PAWN_IDX[leadPawnsCnt][squares[0]]
+            squares[1:leadPawnsCnt] = sorted(squares[1:leadPawnsCnt], key=lambda s: MAP_PAWNS[s])
+            for i in range(1, leadPawnsCnt):
+                idx += BINOMIAL[i][MAP_PAWNS[squares[i]]]
+        else:
+            idx = self.encodePieces(squares, d)
+
+        idx *= d.groupIdx[0]
+        groupStart = d.groupLen[0]
+        remainingPawns = self.hasPawns and self.pawnCount[1] > 0
+        nextGroup = 1
+        while d.groupLen[nextGroup]:
+            groupEnd = groupStart + d.groupLen[nextGroup]
+            group = sorted(squares[groupStart:groupEnd])
+            squares[groupStart:groupEnd] = group
+            n = 0
+            for i, s in enumerate(group):
+                # Squares taken by earlier groups don't count.
+                adjust = sum(1 for t in squares[:groupStart] if s > t)
+                n += BINOMIAL[i + 1][s - adjust - (8 if remainingPawns else 0)]
+            remainingPawns = False
+            idx += n * d.groupIdx[nextGroup]
+            groupStart = groupEnd
+            nextGroup += 1
+
+        value = self.decompress(d, idx, cache)
+        if self._isWdl:
+            return value - 2
+        return self.mapDtz(tbFile, value, wdl)
+
+    def encodePieces(self, squares, d):
+        """ The index of the leading group of a pawnless table. """
+        size = len(squares)
+        # Mirror so the leading piece is on ranks 1-4, then below the
+        # diagonal if it (or the first piece off it) is above.
+        if rankOf(squares[0]) > 3:
+            for i in range(size):
+                squares[i] ^= 56
+        for i in range(d.groupLen[0]):
+            if offDiagonal(squares[i]) == 0:
+                continue
+            if offDiagonal(squares[i]) > 0:
+                for j in range(i, size):
+                    squares[j] = ((squares[j] >> 3) | (squares[j] << 3)) & 63
+            break
+
+        if not self.hasUniquePieces:
+            return MAP_KK[MAP_A1D1D4[squares[0]]][squares[1]]
+        s0, s1, s2 = squares[0], squares[1], squares[2]
+        adjust1 = s1 > s0
+        adjust2 = (s2 > s0) + (s2 > s1)
+        if offDiagonal(s0):
+            return (MAP_A1D1D4[s0] * 63 + (s1 - adjust1)) * 62 + s2 - adjust2
+        if offDiagonal(s1):
+            return (6 * 63 + rankOf(s0) * 28 + MAP_B1H1H7[s1]) * 62 + s2 - adjust2
+        if offDiagonal(s2):
+            return 6 * 63 * 62 + 4 * 28 * 62 + rankOf(s0) * 7 * 28 + \
+                (rankOf(s1) - adjust1) * 28 + MAP_B1H1H7[s2]
+        return 6 * 63 * 62 + 4 * 28 * 62 + 4 * 7 * 28 + rankOf(s0) * 7 * 6 + \
+            (rankOf(s1) - adjust1) * 6 + (rankOf(s2) - adjust2)
+
+    def mapDtz(self, tbFile, value, wdl):
+        """ Stored DTZ to plies: through the map, and doubled if in moves. """
+        d = self.pairs[0][tbFile]
+        if d.flags & FLAG_MAPPED:
+            mapIdx = d.mapIdx[{WIN: 0, LOSS: 1, CURSED_WIN: 2, BLESSED_LOSS: 3}[wdl]]
+            if d.flags & FLAG_WIDE:
+                value = self.u16(self.mapOffset + 2 * (mapIdx + value))
+            else:
+                value = self.u8(self.mapOffset + mapIdx + value)
+        if (wdl == WIN and not d.flags & FLAG_WIN_PLIES) or \
+                (wdl == LOSS and not d.flags & FLAG_LOSS_PLIES) or \
+                wdl in (CURSED_WIN, BLESSED_LOSS):
+            value *= 2
+        return value + 1
+
+
+class BlockCache:
+    """ A small LRU of decoded blocks. """
+    def __init__(self, size=BLOCK_CACHE_SIZE):
+        self._size = size
+        self._blocks = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        decoded = self._blocks.get(key)
+        if decoded is None:
+            self.misses += 1
+        else:
+            self.hits += 1
+            self._blocks.move_to_end(key)
+        return decoded
+
+    def put(self, key, decoded):
+        self._blocks[key] = decoded
+        self._blocks.move_to_end(key)
+        if len(self._blocks) > self._size:
+            self._blocks.popitem(last=False)
+
+    def clear(self):
+        self._blocks.clear()
+
+
+class Tablebase:
+    def __init__(self, paths=None, cacheSize=BLOCK_CACHE_SIZE):
+        """
+        |paths| is a directory or a list of them, or an os.pathsep separated
+        string as in the SyzygyPath UCI option.
+        """
+        self._wdl = {}
+        self._dtz = {}
+        self._cache = BlockCache(cacheSize)
+        self.maxPieces = 0
+        if paths:
+            self.addDirectories(paths)
+
+    def addDirectories(self, paths):
+        if isinstance(paths, str):
+            paths = [p for p in paths.split(os.pathsep) if p]
+        for path in paths:
+            for file in sorted(os.listdir(path)):
+                name, suffix = os.path.splitext(file)
+                if suffix not in (WDL_SUFFIX, DTZ_SUFFIX) or not self.isTableName(name):
+                    continue
+                tables = self._wdl if suffix == WDL_SUFFIX else self._dtz
+                table = Table(os.path.join(path, file), name, suffix == WDL_SUFFIX)
+                if table.pieceCount > MAX_PIECES:
+                    continue
+                tables[name] = table
+                tables[table.mirroredKey] = table
+                if suffix == WDL_SUFFIX:
+                    self.maxPieces = max(self.maxPieces, table.pieceCount)
+
+    def isTableName(self, name):
+        sides = name.split("v")
+        return len(sides) == 2 and all(s.startswith("K") and s.count("K") == 1 and \
+            all(c in PIECE_LETTERS for c in s) for s in sides)
+
+    def close(self):
+        for table in list(self._wdl.values()) + list(self._dtz.values()):
+            table.close()
+        self._wdl = {}
+        self._dtz = {}
+        self._cache.clear()
+        self.maxPieces = 0
+
+    def getCache(self):
+        return self._cache
+
+    def canProbe(self, board):
+        return board.getCastles() == 0 and pieceCount(board) <= self.maxPieces
+
+    def probeTable(self, tables, board, wdl=DRAW):
+        white, black = board.activePieces()
+        if len(white) + len(black) == 2:
+            # Bare kings have no file.
+            return DRAW if tables is self._wdl else 0
+        table = tables.get(materialName(board))
+        if table is None:
+            return None
+        return table.probe(board, wdl, self._cache)
+
+    """ ====================== WDL ======================= """
+    def probeWdl(self, board):
+        """
+        The win/draw/loss of |board| for the side to move, or None. The table
+        doesn't know about en passant, so captures are searched first.
+        """
+        if not self.canProbe(board):
+            return None
+        moves = board.getLegalMoves()
+        if len(moves) == 0:
+            return LOSS if board.isCheckMate() else DRAW
+        value, _ = self.searchCaptures(board, False)
+        return value
+
+    def searchCaptures(self, board, checkZeroing):
+        """
+        Returns (wdl, zeroing): the best of the table's value and the results
+        of the captures (and pawn moves if |checkZeroing|), and whether the
+        best is reached through one of those moves.
+        """
+        moves = board.getLegalMoves()
+        best = LOSS
+        searched = 0
+        for move in moves:
+            zeroing = isZeroing(move) if checkZeroing else \
+                (move >> MOVE_META) & CAPTURE != 0
+            if not zeroing:
+                continue
+            searched += 1
+            after = board.makeMove(move)
+            if len(after.getLegalMoves()) == 0:
+                value = WIN if after.isCheckMate() else DRAW
+            else:
+                value, _ = self.searchCaptures(after, False)
+                if value is None:
+                    return None, False
+                value = -value
+            if value > best:
+                best = value
+                if value >= WIN:
+                    return value, True
+        allSearched = searched > 0 and searched == len(moves)
+        if allSearched:
+            value = best
+        else:
+            value = self.probeTable(self._wdl, board)
+            if value is None:
+                return None, False
+        if best >= value:
+            return best, best > DRAW or allSearched
+        return value, False
+
+    """ ====================== DTZ ======================= """
+    def probeDtz(self, board):
+        """
+        Plies to the next capture or pawn move on the way to the result: >0
+        winning, <0 losing, 0 for a draw; 100 plies more for results the 50
+        move rule turns into draws. None without tables.
+        """
+        if not self.canProbe(board):
+            return None
+        if len(board.getLegalMoves()) == 0:
+            return -1 if board.isCheckMate() else 0
+        wdl, zeroing = self.searchCaptures(board, True)
+        if wdl is None:
+            return None
+        if wdl == DRAW:
+            return 0
+        if zeroing:
+            return dtzBeforeZeroing(wdl)
+        table = self._dtz.get(materialName(board))
+        if table is None:
+            return None
+        dtz = table.probe(board, wdl, self._cache)
+        if dtz is not None:
+            return (dtz + (100 if wdl in (CURSED_WIN, BLESSED_LOSS) else 0)) * sign(wdl)
+
+        # The table only holds the other side to move: take the best reply.
+        best = None
+        for move in board.getLegalMoves():
+            after = board.makeMove(move)
+            if isZeroing(move):
+                value = self.probeWdl(after)
+                if value is None:
+                    return None
+                dtz = -dtzBeforeZeroing(value)
+            else:
+                dtz = self.probeDtz(after)
+                if dtz is None:
+                    return None
+                dtz = -dtz
+                if dtz == 1 and after.isCheckMate():
+                    best = 1
+                dtz += sign(dtz)
+            if sign(dtz) == sign(wdl) and (best is None or dtz < best):
+                best = dtz
+        return best if best is not None else -1
+
+    def rankRootMoves(self, board):
+        """
+        [(move, wdl, dtz)] for the legal moves of |board|, from the mover's
+        point of view, best first: winning moves by shortest DTZ, losing
+        moves by longest. None if the position can't be probed.
+        """
+        if not self.canProbe(board):
+            return None
+        ranked = []
+        for move in board.getLegalMoves():
+            after = board.makeMove(move)
+            wdl = self.probeWdl(after)
+            if wdl is None:
+                return None
+            dtz = None
+            if self._dtz:
+                dtz = self.probeDtz(after)
+                if dtz is not None:
+                    dtz = 0 if isZeroing(move) else -dtz
+            ranked.append((move, -wdl, dtz))
+        def order(entry):
+            _, wdl, dtz = entry
+            dtz = dtz if dtz is not None else 0
+            # Win fast, lose slowly: both are the lowest DTZ.
+            return -wdl, dtz
+        ranked.sort(key=order)
+        return ranked
@@ -0,0 +1,30 @@
+import unittest
+from bitboard import BitBoard, STARTING_FEN
+from syzygy import Tablebase
+
+# A few small tables ship in books/syzygy for these tests.
+SYZYGY_PATH = "../../books/syzygy"
+
+class TestSyzygy(unittest.TestCase):
+    def test_syzygy(self):
+        tablebase = Tablebase(SYZYGY_PATH)
+        # (fen, wdl, dtz), checked against python-chess.
+        for fen, wdl, dtz in [("8/8/8/4k3/8/8/8/4K2Q w - - 0 1", 2, 13),
+                              ("8/8/8/4k3/8/8/8/4K2Q b - - 0 1", -2, -18),
+                              ("4k3/8/4K3/4P3/8/8/8/8 w - - 0 1", 2, 3),
+                              ("4k3/8/4K3/4P3/8/8/8/8 b - - 0 1", -2, -4),
+                              ("8/8/8/8/8/1k6/8/KR6 b - - 0 1", -2, -30),
+                              ("8/8/8/8/4k3/8/r7/4K2R w - - 0 1", 0, 0),
+                              ("8/8/8/4k3/8/8/8/3BK3 b - - 0 1", 0, 0)]:
+            board = BitBoard.createFromFen(fen)
+            self.assertEqual(tablebase.probeWdl(board), wdl, fen)
+            self.assertEqual(tablebase.probeDtz(board), dtz, fen)
+        # KBNvK only ships the WDL table.
+        board = BitBoard.createFromFen("8/8/8/4k3/8/8/8/2BNK3 w - - 0 1")
+        self.assertEqual(tablebase.probeWdl(board), 2)
+        self.assertIsNone(tablebase.probeDtz(board))
+        self.assertIsNone(tablebase.probeWdl(BitBoard.createFromFen(STARTING_FEN)))
+        self.assertGreater(tablebase.getCache().hits, 0)
+
+if __name__ == "__main__":
+    unittest.main()
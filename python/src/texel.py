@@ -0,0 +1,343 @@
+"""
+Texel tuning of the material and piece-square tables used by
+AlphaBetaEngine.evaluatePosition.
+
+Games are streamed from the .alg book (one game of long-algebraic moves per
+line) and/or PGN files, replayed on a BitBoard across a process pool, and every
+quiet position is packed into a sparse feature matrix:
+
+    idx  (N x MAX_FEATURES uint16): parameter index of each active feature
+    coef (N x MAX_FEATURES int8):   +1 / -1 (or a piece count for material)
+
+Unused slots point at PAD_INDEX, whose weight is pinned to zero, so the
+evaluation of every position is a single gather + row sum. The weights are then
+fit with vectorized logistic-loss gradient descent (Adam) in NumPy.
+
+The .alg book does not record game results, so those games are labeled from
+their final position: checkmate decides the game, otherwise a material lead of
+at least MATERIAL_WIN_MARGIN is scored as a win (the loser resigned), and
+anything else as a draw. PGN games use their real result.
+
+Usage:
+    python texel.py [--alg books/lichess_alireza.alg] [--pgn games.pgn ...]
+                    [--processes 8] [--epochs 300] [--out tuned_tables.py]
+"""
+import argparse
+import multiprocessing
+import sys
+import time
+
+import numpy as np
+
+import alphabeta_bot
+import bitboard
+from bitboard import BitBoard, CAPTURE, MOVE_META
+from openings import convertPgnToAlgebraic
+from pgn import isStandardGame, streamGames
+
+STARTING_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+ALIREZA = "../../books/lichess_alireza.alg"
+
+# Positions from the first few plies are book theory, not evaluation.
+SKIP_PLIES = 8
+MATERIAL_WIN_MARGIN = 300
+
+# PARAMETER LAYOUT
+# | material P..Q (5) | midgame PST P..K (6 x 64) | endgame PST P, K (2 x 64) | pad |
+# The king's material value cancels out, and the endgame knight, bishop, rook
+# and queen tables are the midgame ones, exactly as in evaluatePosition.
+TUNED_PIECES = [bitboard.PAWN, bitboard.KNIGHT, bitboard.BISHOP, \
+                bitboard.ROOK, bitboard.QUEEN, bitboard.KING]
+MATERIAL_START = 0
+MIDGAME_START = 5
+ENDGAME_START = MIDGAME_START + 6 * 64
+PAD_INDEX = ENDGAME_START + 2 * 64
+NUM_PARAMS = PAD_INDEX + 1
+MAX_FEATURES = 5 + 32
+ENDGAME_PIECES = {bitboard.PAWN: 0, bitboard.KING: 1}
+TABLE_NAMES = {bitboard.PAWN:   "PAWN_VALUES",
+               bitboard.KNIGHT: "KNIGHT_VALUES",
+               bitboard.BISHOP: "BISHOP_VALUES",
+               bitboard.ROOK:   "ROOK_VALUES",
+               bitboard.QUEEN:  "QUEEN_VALUES",
+               bitboard.KING:   "KING_VALUES"}
+ENDGAME_NAMES = {bitboard.PAWN: "PAWN_ENDGAME", bitboard.KING: "KING_ENDGAME"}
+
+
+def mirrorIndex(index):
+    col = index % 8
+    return 56 - (index - col) + col
+
+def pstIndex(piece, square, isEndgame):
+    if isEndgame and piece in ENDGAME_PIECES:
+        return ENDGAME_START + 64 * ENDGAME_PIECES[piece] + square
+    return MIDGAME_START + 64 * (piece - 1) + square
+
+def positionFeatures(board):
+    """
+    Returns the (idx, coef) rows for |board|, from white's point of view, in
+    the same terms as AlphaBetaEngine.evaluatePosition.
+    """
+    whites, blacks = board.activePieces()
+    isEndgame = (len(whites) + len(blacks)) <= 18
+    material = [0] * 5
+    idx = []
+    coef = []
+    for piece, index in whites:
+        if piece != bitboard.KING:
+            material[piece - 1] += 1
+        idx.append(pstIndex(piece, index, isEndgame))
+        coef.append(1)
+    for piece, index in blacks:
+        if piece != bitboard.KING:
+            material[piece - 1] -= 1
+        idx.append(pstIndex(piece, mirrorIndex(index), isEndgame))
+        coef.append(-1)
+    for piece in range(5):
+        idx.append(MATERIAL_START + piece)
+        coef.append(material[piece])
+    padding = MAX_FEATURES - len(idx)
+    return idx + [PAD_INDEX] * padding, coef + [0] * padding
+
+def isQuiet(board):
+    """ Not in check and nothing to capture: the static eval is trustworthy. """
+    moves = board.getLegalMoves()
+    if len(moves) == 0:
+        return False
+    if any(m & (CAPTURE << MOVE_META) for m in moves):
+        return False
+    kingIndex = board.findPiece(board.sideToMove() | bitboard.KING)
+    return not board.isSquareAttacked(kingIndex)
+
+def materialBalance(board):
+    whites, blacks = board.activePieces()
+    values = alphabeta_bot.PIECE_VALUES
+    return sum(values[p] for p, _ in whites) - sum(values[p] for p, _ in blacks)
+
+def resultFromFinalPosition(board):
+    """ White's score (1, 0.5 or 0) for a game that ended in |board|. """
+    if board.isCheckMate():
+        return 0.0 if board.whiteToMove() else 1.0
+    balance = materialBalance(board)
+    if balance >= MATERIAL_WIN_MARGIN:
+        return 1.0
+    if balance <= -MATERIAL_WIN_MARGIN:
+        return 0.0
+    return 0.5
+
+def extractGame(game):
+    """
+    Replays one game and returns the features of its quiet positions along with
+    the game result. |game| is (moves, result): moves is either a list of
+    long-algebraic moves or a PGN movetext string, and result is None if it has
+    to be inferred from the final position. Runs inside the worker processes.
+    """
+    moves, result = game
+    board = BitBoard.createFromFen(STARTING_FEN)
+    rows = []
+    try:
+        if isinstance(moves, str):
+            moves = convertPgnToAlgebraic(moves)
+        for ply, move in enumerate(moves):
+            if ply >= SKIP_PLIES and isQuiet(board):
+                rows.append(positionFeatures(board))
+            board = board.makeMove(move)
+    except Exception:
+        # A corrupt game shouldn't take the whole pool down.
+        return [], [], 0.5
+    if result is None:
+        result = resultFromFinalPosition(board)
+    return [r[0] for r in rows], [r[1] for r in rows], result
+
+
+""" =============== Game streaming ===================== """
+PGN_RESULTS = {"1-0": 1.0, "0-1": 0.0, "1/2-1/2": 0.5}
+
+def streamAlgGames(file, maxGames=None):
+    with open(file) as f:
+        for i, line in enumerate(f):
+            if maxGames is not None and i >= maxGames:
+                return
+            moves = line.split()
+            if len(moves) > 0:
+                yield moves, None
+
+def streamPgnGames(file, maxGames=None):
+    """ Yields (movetext, result) for each PGN game with a known result. """
+    count = 0
+    for headers, movetext in streamGames(file):
+        if maxGames is not None and count >= maxGames:
+            return
+        result = headers.get("Result")
+        if result in PGN_RESULTS and isStandardGame(headers):
+            # SAN is resolved by the workers, it's the expensive part.
+            yield movetext, PGN_RESULTS[result]
+            count += 1
+
+def extractPositions(games, processes=None, chunksize=16):
+    """
+    Fans |games| out to a process pool and packs the quiet positions into the
+    (idx, coef, results) matrices.
+    """
+    idxRows = []
+    coefRows = []
+    results = []
+    numGames = 0
+    with multiprocessing.Pool(processes) as pool:
+        for idx, coef, result in pool.imap_unordered(extractGame, games, chunksize):
+            numGames += 1
+            idxRows += idx
+            coefRows += coef
+            results += [result] * len(idx)
+            if numGames % 500 == 0:
+                print("  {} games, {} positions".format(numGames, len(results)), \
+                    file=sys.stderr, flush=True)
+    return np.array(idxRows, dtype=np.uint16).reshape(-1, MAX_FEATURES), \
+           np.array(coefRows, dtype=np.int8).reshape(-1, MAX_FEATURES), \
+           np.array(results, dtype=np.float32)
+
+
+""" =============== Fitting ===================== """
+def initialWeights():
+    """ The hand-typed tables from alphabeta_bot, as a parameter vector. """
+    weights = np.zeros(NUM_PARAMS, dtype=np.float64)
+    for piece in TUNED_PIECES:
+        if piece != bitboard.KING:
+            weights[MATERIAL_START + piece - 1] = alphabeta_bot.PIECE_VALUES[piece]
+        start = MIDGAME_START + 64 * (piece - 1)
+        weights[start:start + 64] = alphabeta_bot.EVAL_TABLES[piece]
+    for piece, i in ENDGAME_PIECES.items():
+        start = ENDGAME_START + 64 * i
+        weights[start:start + 64] = alphabeta_bot.ENDGAME_TABLE[piece]
+    return weights
+
+def evaluate(weights, idx, coef):
+    return (weights[idx] * coef).sum(axis=1)
+
+def sigmoid(scores, k):
+    return 1.0 / (1.0 + np.power(10.0, -k * scores / 400.0))
+
+def logLoss(weights, idx, coef, results, k):
+    p = np.clip(sigmoid(evaluate(weights, idx, coef), k), 1e-9, 1 - 1e-9)
+    return -np.mean(results * np.log(p) + (1 - results) * np.log(1 - p))
+
+def fitScalingConstant(weights, idx, coef, results, lo=0.1, hi=3.0, iterations=40):
+    """ Ternary search for the K that best maps our centipawns to results. """
+    for _ in range(iterations):
+        m1 = lo + (hi - lo) / 3
+        m2 = hi - (hi - lo) / 3
+        if logLoss(weights, idx, coef, results, m1) < logLoss(weights, idx, coef, results, m2):
+            hi = m2
+        else:
+            lo = m1
+    return (lo + hi) / 2
+
+def fit(weights, idx, coef, results, k, epochs=300, learningRate=1.0, \
+        beta1=0.9, beta2=0.999, epsilon=1e-8, verbose=True):
+    """
+    Full-batch Adam on the logistic loss. The gradient w.r.t. each weight is a
+    bincount over the packed feature matrix, so an epoch is a handful of
+    vectorized passes regardless of the number of parameters.
+    """
+    weights = weights.copy()
+    frozen = np.zeros(NUM_PARAMS, dtype=bool)
+    frozen[PAD_INDEX] = True
+    # Pawns anchor the centipawn scale.
+    frozen[MATERIAL_START + bitboard.PAWN - 1] = True
+    m = np.zeros(NUM_PARAMS)
+    v = np.zeros(NUM_PARAMS)
+    flatIdx = idx.ravel()
+    n = len(results)
+    scale = k * np.log(10.0) / 400.0
+    for epoch in range(1, epochs + 1):
+        residual = (sigmoid(evaluate(weights, idx, coef), k) - results) * scale
+        grad = np.bincount(flatIdx, weights=(residual[:, None] * coef).ravel(), \
+            minlength=NUM_PARAMS) / n
+        grad[frozen] = 0
+        m = beta1 * m + (1 - beta1) * grad
+        v = beta2 * v + (1 - beta2) * grad * grad
+        mHat = m / (1 - beta1 ** epoch)
+        vHat = v / (1 - beta2 ** epoch)
+        weights -= learningRate * mHat / (np.sqrt(vHat) + epsilon)
+        if verbose and (epoch % 50 == 0 or epoch == epochs):
+            print("  epoch {}: loss {:.6f}".format(epoch, \
+                logLoss(weights, idx, coef, results, k)), file=sys.stderr, flush=True)
+    return weights
+
+
+""" =============== Output ===================== """
+def formatTable(name, values):
+    rows = []
+    for r in range(8):
+        rows.append(",".join("{:4d}".format(int(v)) for v in values[8*r:8*r + 8]))
+    indent = " " * (len(name) + 4)
+    return "{} = [{}]".format(name, (",\n" + indent).join(rows))
+
+def formatTables(weights):
+    weights = np.rint(weights).astype(int)
+    lines = ["PIECE_VALUES = {"]
+    for piece in TUNED_PIECES:
+        value = alphabeta_bot.PIECE_VALUES[piece] if piece == bitboard.KING \
+            else weights[MATERIAL_START + piece - 1]
+        lines.append("    bitboard.{}: {},".format(TABLE_NAMES[piece].split("_")[0], value))
+    lines.append("}")
+    for piece in TUNED_PIECES:
+        start = MIDGAME_START + 64 * (piece - 1)
+        lines.append(formatTable(TABLE_NAMES[piece], weights[start:start + 64]))
+    for piece, i in ENDGAME_PIECES.items():
+        start = ENDGAME_START + 64 * i
+        lines.append(formatTable(ENDGAME_NAMES[piece], weights[start:start + 64]))
+    return "\n".join(lines) + "\n"
+
+
+def main(argv):
+    parser = argparse.ArgumentParser(description="Texel-tune the alpha-beta eval tables.")
+    parser.add_argument("--alg", action="append", default=[])
+    parser.add_argument("--pgn", action="append", default=[])
+    parser.add_argument("--max-games", type=int, default=None)
+    parser.add_argument("--processes", type=int, default=None)
+    parser.add_argument("--epochs", type=int, default=300)
+    parser.add_argument("--lr", type=float, default=1.0)
+    parser.add_argument("--out", default=None)
+    args = parser.parse_args(argv)
+    if not args.alg and not args.pgn:
+        args.alg = [ALIREZA]
+
+    def games():
+        for file in args.alg:
+            yield from streamAlgGames(file, args.max_games)
+        for file in args.pgn:
+            yield from streamPgnGames(file, args.max_games)
+
+    start = time.time()
+    idx, coef, results = extractPositions(games(), args.processes)
+    extractTime = time.time() - start
+    n = len(results)
+    print("extracted {} quiet positions in {:.1f}s".format(n, extractTime))
+    if n == 0:
+        return
+
+    weights = initialWeights()
+    k = fitScalingConstant(weights, idx, coef, results)
+    before = logLoss(weights, idx, coef, results, k)
+    print("K = {:.4f}, initial loss {:.6f}".format(k, before))
+
+    start = time.time()
+    weights = fit(weights, idx, coef, results, k, args.epochs, args.lr)
+    fitTime = time.time() - start
+    after = logLoss(weights, idx, coef, results, k)
+    print("final loss {:.6f} ({:+.6f})".format(after, after - before))
+    print("fit: {:.2f}s total, {:.3f}s per epoch per million positions".format( \
+        fitTime, fitTime / args.epochs / n * 1e6))
+
+    tables = formatTables(weights)
+    if args.out is None:
+        print(tables)
+    else:
+        with open(args.out, "w") as f:
+            f.write(tables)
+        print("wrote " + args.out)
+
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,38 @@
+import unittest
+import numpy as np
+import texel
+from alphabeta_bot import AlphaBetaEngine
+from bitboard import BitBoard
+from fuzz_board import START_FENS
+
+def gameBoards():
+    """ The fuzzer's start positions, less those with more than 32 pieces. """
+    boards = [BitBoard.createFromFen(fen) for fen in START_FENS]
+    return [board for board in boards if sum(map(len, board.activePieces())) <= 32]
+
+def featureMatrices(boards):
+    rows = [texel.positionFeatures(board) for board in boards]
+    return np.array([idx for idx, _ in rows]), np.array([coef for _, coef in rows])
+
+class TestTexel(unittest.TestCase):
+    def test_featuresMatchEvaluation(self):
+        boards = gameBoards()
+        idx, coef = featureMatrices(boards)
+        scores = texel.evaluate(texel.initialWeights(), idx, coef)
+        self.assertEqual(scores.tolist(), \
+            [AlphaBetaEngine.evaluatePosition(board) for board in boards])
+
+    def test_fitStep(self):
+        boards = gameBoards()[:8]
+        idx, coef = featureMatrices(boards)
+        results = np.array([1.0, 0.0, 0.5, 1.0, 0.0, 1.0, 0.5, 0.0])
+        weights = texel.initialWeights()
+        loss = texel.logLoss(weights, idx, coef, results, 1.0)
+        fitted = texel.fit(weights, idx, coef, results, 1.0, epochs=1, verbose=False)
+        self.assertLess(texel.logLoss(fitted, idx, coef, results, 1.0), loss)
+        # The padding slot and the pawn value stay put.
+        self.assertEqual(fitted[texel.PAD_INDEX], 0)
+        self.assertEqual(fitted[texel.MATERIAL_START], weights[texel.MATERIAL_START])
+
+if __name__ == "__main__":
+    unittest.main()
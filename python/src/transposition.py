@@ -0,0 +1,64 @@
+"""
+Fixed-size transposition table for the python engines.
+
+Entries live in a flat list indexed by hash(key) % capacity, so the memory
+footprint is set by the Hash option rather than by how many positions a search
+visits. Collisions keep the entry searched to the greater depth.
+"""
+import sys
+
+EXACT = 0
+LOWER_BOUND = 1  # the score is at least this (it failed high)
+UPPER_BOUND = 2  # the score is at most this (it failed low)
+
+# Rough CPython cost of one slot: the slot pointer plus an entry tuple of six
+# small objects, of which the key int and path string dominate.
+ENTRY_BYTES = 8 + sys.getsizeof((0,) * 6) + 64 + 64
+
+
+class TranspositionTable:
+    def __init__(self, sizeMb=16):
+        self._slots = []
+        self._used = 0
+        self.resize(sizeMb)
+
+    def resize(self, sizeMb):
+        """ Reallocates to |sizeMb|, keeping as many entries as still fit. """
+        old = self._slots
+        self._sizeMb = sizeMb
+        self._capacity = max(1, int(sizeMb * 1024 * 1024 / ENTRY_BYTES))
+        self._slots = [None] * self._capacity
+        self._used = 0
+        for entry in old:
+            if entry is not None:
+                self.store(*entry)
+
+    def clear(self):
+        self._slots = [None] * self._capacity
+        self._used = 0
+
+    def getCapacity(self):
+        return self._capacity
+
+    def getSizeMb(self):
+        return self._sizeMb
+
+    def hashfull(self):
+        """ Permille of slots in use, as reported in UCI info lines. """
+        return self._used * 1000 // self._capacity
+
+    def probe(self, key):
+        """ Returns (key, depth, score, mateIn, bound, path) or None. """
+        entry = self._slots[hash(key) % self._capacity]
+        if entry is not None and entry[0] == key:
+            return entry
+        return None
+
+    def store(self, key, depth, score, mateIn, bound, path):
+        index = hash(key) % self._capacity
+        entry = self._slots[index]
+        if entry is None:
+            self._used += 1
+        elif entry[0] != key and entry[1] > depth:
+            return
+        self._slots[index] = (key, depth, score, mateIn, bound, path)
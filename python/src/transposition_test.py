@@ -0,0 +1,30 @@
+import unittest
+from transposition import TranspositionTable, EXACT, LOWER_BOUND
+
+class TestTranspositionTable(unittest.TestCase):
+    def test_resize(self):
+        table = TranspositionTable(1)
+        capacity = table.getCapacity()
+        for key in range(100):
+            table.store(key, 2, key, 0, EXACT, "e2e4")
+        table.resize(2)
+        self.assertGreater(table.getCapacity(), capacity)
+        self.assertEqual(table.probe(42), (42, 2, 42, 0, EXACT, "e2e4"))
+        self.assertEqual(table.hashfull(), 100 * 1000 // table.getCapacity())
+        table.clear()
+        self.assertIsNone(table.probe(42))
+        self.assertEqual(table.hashfull(), 0)
+
+    def test_depthPreferred(self):
+        table = TranspositionTable(1)
+        capacity = table.getCapacity()
+        # Two keys in one slot: the deeper entry stays.
+        table.store(1, 5, 0, 0, EXACT, "")
+        table.store(1 + capacity, 3, 0, 0, LOWER_BOUND, "")
+        self.assertIsNotNone(table.probe(1))
+        self.assertIsNone(table.probe(1 + capacity))
+        table.store(1 + capacity, 6, 0, 0, LOWER_BOUND, "")
+        self.assertIsNotNone(table.probe(1 + capacity))
+
+if __name__ == "__main__":
+    unittest.main()
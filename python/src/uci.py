@@ -0,0 +1,191 @@
+"""
+UCI command loop shared by all the python engines.
+
+The loop reads stdin on the main thread and runs each "go" on a worker thread,
+so "isready", "stop" and "quit" are answered while a search is in progress.
+Engines cooperate through their _stop event (a threading.Event): search checks
+it at every node and unwinds with SearchStopped, and go() still prints the
+best move found so far.
+
+An engine provides:
+    inputUCI(), setOptions(line), isReady(), newGame(), position(line),
+    go(args), printBoard()
+and a _stop threading.Event.
+"""
+import multiprocessing
+import sys
+import time
+from threading import Lock, Thread
+
+STARTING_FEN = "rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1"
+FLUSH_INTERVAL_MS = 100
+
+
+class SearchStopped(Exception):
+    """ Raised inside a search when the engine's _stop event is set. """
+    pass
+
+
+class UciWriter:
+    """
+    Buffers search output and writes it to stdout at most every |intervalMs|,
+    so info lines don't cost a syscall (and a GUI round trip) each. Call
+    flush() before anything the GUI is waiting on, like bestmove.
+    """
+    def __init__(self, intervalMs=FLUSH_INTERVAL_MS):
+        self._intervalMs = intervalMs
+        self._lines = []
+        self._lock = Lock()
+        self._lastFlush = time.time()
+
+    def write(self, line):
+        with self._lock:
+            self._lines.append(line)
+        if (time.time() - self._lastFlush) * 1000 >= self._intervalMs:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            if self._lines:
+                sys.stdout.write("\n".join(self._lines) + "\n")
+                self._lines = []
+            sys.stdout.flush()
+            self._lastFlush = time.time()
+
+
+def parsePosition(line):
+    """
+    Splits a "position [startpos | fen <fen>] [moves <m1> ...]" command into
+    (fen, moves). fen is None if the command is malformed.
+    """
+    words = line.split()
+    assert(words[0] == "position")
+    movesIndex = words.index("moves") if "moves" in words else len(words)
+    moves = words[movesIndex + 1:]
+    if len(words) > 1 and words[1] == "startpos":
+        return STARTING_FEN, moves
+    if len(words) > 2 and words[1] == "fen":
+        return " ".join(words[2:movesIndex]), moves
+    return None, moves
+
+
+def optionLine(name, kind, default, low=None, high=None):
+    """
+    The "option name ..." line advertising an option during "uci". For a
+    combo, |low| is the list of choices.
+    """
+    if kind == "check":
+        default = "true" if default else "false"
+    elif kind == "string" and (default is None or default == ""):
+        default = "<empty>"
+    line = "option name {} type {} default {}".format(name, kind, default)
+    if kind == "spin":
+        line += " min {} max {}".format(low, high)
+    elif kind == "combo":
+        line += "".join(" var " + choice for choice in low)
+    return line
+
+def parseSetOption(line):
+    """
+    Splits "setoption name <id> [value <x>]" into (id, x). Both may contain
+    spaces; x is None for button options.
+    """
+    words = line.split()
+    assert(words[0] == "setoption")
+    if "name" not in words:
+        return None, None
+    start = words.index("name") + 1
+    if "value" not in words:
+        return " ".join(words[start:]), None
+    valueIndex = words.index("value")
+    value = " ".join(words[valueIndex + 1:])
+    if value == "<empty>":
+        value = ""
+    return " ".join(words[start:valueIndex]), value
+
+def parseCheck(value):
+    return value is not None and value.lower() == "true"
+
+def parseSpin(value, low, high):
+    return max(low, min(high, int(value)))
+
+def parseCombo(value, choices):
+    """ The choice |value| names, ignoring case. Raises ValueError if none. """
+    for choice in choices:
+        if value is not None and value.lower() == choice.lower():
+            return choice
+    raise ValueError("expected one of " + ", ".join(choices))
+
+
+def processPool(processes, initializer, initargs):
+    """
+    A multiprocessing pool for a search running on the loop's worker thread.
+    Workers are spawned, not forked: a forked worker closes its copy of stdin
+    on startup, and deadlocks on the lock the main thread holds while it
+    waits for input.
+    """
+    return multiprocessing.get_context("spawn").Pool(processes, initializer, initargs)
+
+
+class UciLoop:
+    def __init__(self, engine, input=input):
+        self._engine = engine
+        self._input = input
+        self._worker = None
+
+    def isSearching(self):
+        return self._worker is not None and self._worker.is_alive()
+
+    def startSearch(self, args):
+        self.waitForSearch()
+        self._engine._stop.clear()
+        self._worker = Thread(target=self.search, args=(args,), daemon=True)
+        self._worker.start()
+
+    def search(self, args):
+        self._engine.go(args)
+        sys.stdout.flush()
+
+    def stopSearch(self):
+        self._engine._stop.set()
+        self.waitForSearch()
+
+    def waitForSearch(self):
+        if self._worker is not None:
+            self._worker.join()
+            self._worker = None
+
+    def run(self):
+        while True:
+            try:
+                line = self._input().strip()
+            except EOFError:
+                line = "quit"
+            if line == "uci":
+                self._engine.inputUCI()
+            elif line.startswith("setoption"):
+                self.waitForSearch()
+                self._engine.setOptions(line)
+            elif line.startswith("isready"):
+                self._engine.isReady()
+            elif line.startswith("ucinewgame"):
+                self.stopSearch()
+                self._engine.newGame()
+            elif line.startswith("position"):
+                self.stopSearch()
+                self._engine.position(line)
+            elif line.startswith("go"):
+                self.startSearch(line.split())
+            elif line.startswith("stop"):
+                self.stopSearch()
+            elif line.startswith("bench") and hasattr(self._engine, "bench"):
+                self.stopSearch()
+                self._engine.bench(line.split()[1:])
+            elif line.startswith("print"):
+                self._engine.printBoard()
+            elif line.startswith("end") or line.startswith("quit"):
+                self.stopSearch()
+                print("goodbye")
+                sys.stdout.flush()
+                break
+            sys.stdout.flush()
@@ -0,0 +1,142 @@
+import contextlib
+import io
+import time
+import unittest
+from threading import Event
+from uci import UciLoop, UciWriter, STARTING_FEN, parsePosition, parseSetOption, parseSpin, \
+    parseCheck, parseCombo, optionLine
+
+class ScriptedEngine:
+    """ Records the loop's calls; go() searches until told to stop. """
+    def __init__(self):
+        self._stop = Event()
+        self.events = []
+        self.loop = None
+
+    def inputUCI(self):
+        self.events.append("uci")
+
+    def setOptions(self, line):
+        self.events.append("setoption searching={}".format(self.loop.isSearching()))
+
+    def isReady(self):
+        self.events.append("readyok searching={}".format(self.loop.isSearching()))
+
+    def newGame(self):
+        self.events.append("ucinewgame")
+
+    def position(self, line):
+        self.events.append("position")
+
+    def go(self, args):
+        self.events.append("go")
+        if "infinite" in args:
+            self._stop.wait(5)
+        self.events.append("bestmove")
+
+    def printBoard(self):
+        pass
+
+
+def runLoop(lines):
+    engine = ScriptedEngine()
+    script = iter(lines)
+    engine.loop = UciLoop(engine, lambda: next(script))
+    engine.loop.run()
+    return engine.events
+
+class TestUciLoop(unittest.TestCase):
+    def test_readyDuringSearch(self):
+        # isready is answered while the search runs; stop waits for bestmove.
+        events = runLoop(["go infinite", "isready", "stop", "isready", "quit"])
+        self.assertEqual(sorted(events[:2]), ["go", "readyok searching=True"])
+        self.assertEqual(events[2:], ["bestmove", "readyok searching=False"])
+
+    def test_setOptionWaitsForSearch(self):
+        events = runLoop(["go depth 1", "setoption name Hash value 1", "quit"])
+        self.assertEqual(events, ["go", "bestmove", "setoption searching=False"])
+
+    def test_quitStopsSearch(self):
+        self.assertEqual(runLoop(["go infinite", "quit"]), ["go", "bestmove"])
+
+    def test_commandsWaitForSearch(self):
+        # position and ucinewgame stop the search first.
+        events = runLoop(["go infinite", "position startpos", "go infinite", "ucinewgame", \
+            "quit"])
+        self.assertEqual(events, ["go", "bestmove", "position", "go", "bestmove", "ucinewgame"])
+
+    def test_endOfInputQuits(self):
+        def lines():
+            yield "uci"
+            yield "go infinite"
+        script = lines()
+        engine = ScriptedEngine()
+        def read():
+            try:
+                return next(script)
+            except StopIteration:
+                raise EOFError
+        engine.loop = UciLoop(engine, read)
+        engine.loop.run()
+        self.assertEqual(engine.events, ["uci", "go", "bestmove"])
+
+class TestUciWriter(unittest.TestCase):
+    def test_buffering(self):
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            writer = UciWriter(intervalMs=60000)
+            writer.write("info depth 1")
+            writer.write("info depth 2")
+            self.assertEqual(output.getvalue(), "")
+            writer.flush()
+            self.assertEqual(output.getvalue(), "info depth 1\ninfo depth 2\n")
+            writer.flush()
+            self.assertEqual(output.getvalue(), "info depth 1\ninfo depth 2\n")
+
+    def test_interval(self):
+        output = io.StringIO()
+        with contextlib.redirect_stdout(output):
+            writer = UciWriter(intervalMs=20)
+            writer.write("info depth 1")
+            self.assertEqual(output.getvalue(), "")
+            time.sleep(0.03)
+            # Past the interval, the next line takes the buffer out with it.
+            writer.write("info depth 2")
+            self.assertEqual(output.getvalue(), "info depth 1\ninfo depth 2\n")
+
+class TestUciParsing(unittest.TestCase):
+    def test_parsePosition(self):
+        self.assertEqual(parsePosition("position startpos"), (STARTING_FEN, []))
+        self.assertEqual(parsePosition("position startpos moves e2e4 e7e5"), \
+            (STARTING_FEN, ["e2e4", "e7e5"]))
+        fen = "8/8/8/4k3/8/8/8/4K2Q w - - 0 1"
+        self.assertEqual(parsePosition("position fen " + fen), (fen, []))
+        self.assertEqual(parsePosition("position fen " + fen + " moves h1h5"), (fen, ["h1h5"]))
+        self.assertEqual(parsePosition("position moves e2e4"), (None, ["e2e4"]))
+
+    def test_parseSetOption(self):
+        self.assertEqual(parseSetOption("setoption name Hash value 64"), ("Hash", "64"))
+        self.assertEqual(parseSetOption("setoption name Book File value /a b/c.bin"), \
+            ("Book File", "/a b/c.bin"))
+        self.assertEqual(parseSetOption("setoption name EvalFile value <empty>"), ("EvalFile", ""))
+        self.assertEqual(parseSetOption("setoption name Clear Hash"), ("Clear Hash", None))
+        self.assertEqual(parseSetOption("setoption value 1"), (None, None))
+
+    def test_parseValues(self):
+        self.assertEqual(parseSpin("64", 1, 4096), 64)
+        self.assertEqual(parseSpin("0", 1, 4096), 1)
+        self.assertEqual(parseSpin("99999", 1, 4096), 4096)
+        self.assertRaises(ValueError, parseSpin, "lots", 1, 4096)
+        self.assertTrue(parseCheck("TRUE"))
+        self.assertFalse(parseCheck(None))
+        self.assertEqual(parseCombo("MAILBOX", ["bitboard", "mailbox"]), "mailbox")
+        self.assertRaises(ValueError, parseCombo, "hex", ["bitboard", "mailbox"])
+        self.assertEqual(optionLine("Hash", "spin", 16, 1, 4096), \
+            "option name Hash type spin default 16 min 1 max 4096")
+        self.assertEqual(optionLine("Board", "combo", "bitboard", ["bitboard", "array"]), \
+            "option name Board type combo default bitboard var bitboard var array")
+        self.assertEqual(optionLine("EvalFile", "string", None), \
+            "option name EvalFile type string default <empty>")
+
+if __name__ == "__main__":
+    unittest.main()